@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the ElevenLabs Scribe API, for benchmarks and load tests.
+
+Serves POST /v1/speech-to-text on localhost; point the app at it with
+ELEVENLABS_BASE_URL. Transcripts:
+
+- Songs registered with their transcript (or with lyrics, which are timed
+  over the song's duration) are found again in an upload (the whole song, a
+  transcoded copy or one of the chunks of a long track) by cross-correlating
+  loudness envelopes; the words in that span come back shifted to the
+  upload's own time, as Scribe returns them.
+- Anything else gets the default lyrics timed over the upload's duration.
+
+Service behaviour, all deterministic for a given --seed and arrival order:
+
+- latency drawn from a distribution (fixed, uniform or lognormal) plus a
+  per-minute-of-audio term;
+- 429/5xx injection: the first N requests and/or a random share, with
+  Retry-After on 429 and 503;
+- a requests-per-minute limit and a concurrency limit, answered with 429
+  like the real service;
+- uploads read at a capped rate (slow client or network).
+
+GET /_fake/stats returns request, status and concurrency counters.
+
+Usage (from the repository root):
+    python benchmarks/fake_scribe.py --port 8765 --latency lognormal:1.5,0.4 --error-rate 0.05
+    python benchmarks/fake_scribe.py --song song.mp3=lyrics.txt --max-concurrent 4 --upload-kbps 2000
+    ELEVENLABS_BASE_URL=http://127.0.0.1:8765/v1 ELEVENLABS_API_KEY=fake python src/worker.py
+"""
+import os
+import sys
+import json
+import math
+import time
+import email
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synth import ffmpeg_binary, synth_lyrics  # noqa: E402
+
+ENVELOPE_RATE = 100  # frames per second
+DECODE_RATE = 8000
+# An upload whose envelope correlates less than this with every registered
+# song gets the default lyrics
+MATCH_MIN_CORRELATION = 0.5
+UPLOAD_CHUNK_BYTES = 64 * 1024
+RETRY_AFTER_STATUSES = {429, 503}
+
+
+# ------------------------------------------------------------------------------
+# Audio matching
+# ------------------------------------------------------------------------------
+def _envelope(pcm: np.ndarray) -> np.ndarray:
+    hop = DECODE_RATE // ENVELOPE_RATE
+    frames = pcm[:len(pcm) // hop * hop].reshape(-1, hop)
+    return np.log(np.sqrt(np.mean(frames ** 2, axis=1)) + 1e-4).astype(np.float32)
+
+
+def _decode(path: str) -> np.ndarray:
+    result = subprocess.run(
+        [ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-i", path,
+         "-ac", "1", "-ar", str(DECODE_RATE), "-f", "f32le", "-"],
+        capture_output=True, timeout=600
+    )
+    if result.returncode != 0 or not result.stdout:
+        raise ValueError(result.stderr.decode(errors="replace")[-200:] or "no audio decoded")
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def locate(track: np.ndarray, clip: np.ndarray) -> float:
+    """Offset (seconds) of `clip` inside `track`, by normalized envelope cross-correlation."""
+    if len(clip) >= len(track) - 1:
+        return 0.0
+    a = track - track.mean()
+    b = (clip - clip.mean()) / (clip.std() + 1e-9)
+    n = 1 << int(np.ceil(np.log2(len(a) + len(b))))
+    correlation = np.fft.irfft(np.fft.rfft(a, n) * np.conj(np.fft.rfft(b, n)), n)[:len(a) - len(b) + 1]
+    return float(np.argmax(correlation)) / ENVELOPE_RATE
+
+
+# ------------------------------------------------------------------------------
+# Transcripts
+# ------------------------------------------------------------------------------
+def lyrics_transcript(lyrics: str, duration: float, language_code: str = "eng", seed: int = 0) -> dict:
+    """
+    A Scribe response for `lyrics` sung over `duration` seconds: lines spread
+    evenly with rests between them, words timed by their length.
+    """
+    rng = random.Random(seed)
+    lines = [line.split() for line in lyrics.split("\n") if line.strip()]
+    if not lines or duration <= 0:
+        return {"language_code": language_code, "language_probability": 0.99, "text": "", "words": []}
+
+    slot = duration / len(lines)
+    words = []
+    for index, line in enumerate(lines):
+        rest = slot * rng.uniform(0.15, 0.3)
+        clock, sung = index * slot + rest / 2, slot - rest
+        weights = [len(word) + 2 for word in line]
+        for word, weight in zip(line, weights):
+            length = sung * weight / sum(weights)
+            end = clock + length * 0.85
+            words.append({"text": word, "start": round(clock, 3), "end": round(end, 3), "type": "word"})
+            words.append({"text": " ", "start": round(end, 3), "end": round(clock + length, 3), "type": "spacing"})
+            clock += length
+    words.pop()
+    return {
+        "language_code": language_code,
+        "language_probability": 0.99,
+        "text": "".join(w["text"] for w in words),
+        "words": words,
+    }
+
+
+def _span(transcript: dict, offset: float, duration: float) -> dict:
+    """The words of `transcript` inside [offset, offset + duration), in the span's own time."""
+    words = []
+    for word in transcript["words"]:
+        middle = (word["start"] + word["end"]) / 2 - offset
+        if 0 <= middle < duration:
+            words.append({**word, "start": round(max(0.0, word["start"] - offset), 3),
+                          "end": round(min(duration, word["end"] - offset), 3)})
+    while words and words[0]["type"] == "spacing":
+        words.pop(0)
+    while words and words[-1]["type"] == "spacing":
+        words.pop()
+    return {**transcript, "text": "".join(w["text"] for w in words), "words": words}
+
+
+# ------------------------------------------------------------------------------
+# Service behaviour
+# ------------------------------------------------------------------------------
+def parse_latency(spec):
+    """
+    A latency sampler rng -> seconds from a number, 'fixed:S',
+    'uniform:LOW,HIGH' or 'lognormal:MEDIAN,SIGMA' (heavy-tailed, like a real API).
+    """
+    if isinstance(spec, (int, float)):
+        return lambda rng: float(spec)
+    kind, _, values = str(spec).partition(":")
+    if not values:
+        kind, values = "fixed", kind
+    args = [float(v) for v in values.split(",")]
+    if kind == "fixed" and len(args) == 1:
+        return lambda rng: args[0]
+    if kind == "uniform" and len(args) == 2:
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "lognormal" and len(args) == 2:
+        return lambda rng: rng.lognormvariate(math.log(args[0]), args[1])
+    raise ValueError(f"Invalid latency spec {spec!r} (use S, fixed:S, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA)")
+
+
+class FakeScribe:
+    def __init__(self, latency="0.5", latency_per_minute: float = 1.0, error_rate: float = 0.0,
+                 error_statuses=(429, 500, 503), fail_first: int = 0, retry_after: float = 1.0,
+                 rate_per_minute: float = 0, max_concurrent: int = 0, upload_kbps: float = 0,
+                 lyrics: str = None, seed: int = 0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = parse_latency(latency)
+        self.latency_per_minute = latency_per_minute
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.fail_first = fail_first
+        self.retry_after = retry_after
+        self.rate_per_minute = rate_per_minute
+        self.max_concurrent = max_concurrent
+        self.upload_kbps = upload_kbps
+        self.lyrics = lyrics or synth_lyrics(120, seed=seed)["lyrics"]
+        self.tracks = []  # (envelope, transcript)
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tokens = float(rate_per_minute)
+        self._refilled = time.monotonic()
+        self.in_flight = 0
+        self.stats = Counter()
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def register(self, audio_path: str, transcript: dict = None, lyrics: str = None):
+        """A song the server will recognize, with its transcript or lyrics to time over it."""
+        pcm = _decode(audio_path)
+        if transcript is None:
+            transcript = lyrics_transcript(lyrics or self.lyrics, len(pcm) / DECODE_RATE)
+        with self._lock:
+            self.tracks.append((_envelope(pcm), transcript))
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "in_flight": self.in_flight}
+
+    # --------------------------------------------------------------------------
+    # Admission (under the lock, so decisions follow arrival order)
+    # --------------------------------------------------------------------------
+    def _admit(self):
+        """(status, Retry-After) to refuse a request with, or None to serve it."""
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.max_concurrent and self.in_flight >= self.max_concurrent:
+                return 429, self.retry_after
+            if self.rate_per_minute:
+                now = time.monotonic()
+                self._tokens = min(self.rate_per_minute,
+                                   self._tokens + (now - self._refilled) * self.rate_per_minute / 60)
+                self._refilled = now
+                if self._tokens < 1:
+                    return 429, (1 - self._tokens) * 60 / self.rate_per_minute
+                self._tokens -= 1
+            if self.stats["requests"] <= self.fail_first or self._rng.random() < self.error_rate:
+                status = self._rng.choice(self.error_statuses)
+                return status, self.retry_after if status in RETRY_AFTER_STATUSES else None
+            self.in_flight += 1
+            self.stats["peak_concurrency"] = max(self.stats["peak_concurrency"], self.in_flight)
+            return None
+
+    def _service_time(self, duration: float) -> float:
+        with self._lock:
+            sample = self.latency(self._rng)
+        return max(0.0, sample) + self.latency_per_minute * duration / 60
+
+    # --------------------------------------------------------------------------
+    # Transcription
+    # --------------------------------------------------------------------------
+    def transcribe(self, audio: bytes, sleep: bool = True) -> dict:
+        # Through a file: MP4/M4A uploads can't be demuxed from a pipe
+        with tempfile.NamedTemporaryFile(suffix=".upload") as upload:
+            upload.write(audio)
+            upload.flush()
+            clip = _decode(upload.name)
+        duration = len(clip) / DECODE_RATE
+        envelope = _envelope(clip)
+
+        best = None
+        for track_envelope, transcript in self.tracks:
+            if len(track_envelope) + 50 < len(envelope):
+                continue
+            offset = locate(track_envelope, envelope)
+            aligned = track_envelope[int(offset * ENVELOPE_RATE):][:len(envelope)]
+            score = float(np.corrcoef(aligned, envelope[:len(aligned)])[0, 1]) if len(aligned) > 1 else 0.0
+            if best is None or score > best[0]:
+                best = (score, offset, transcript)
+
+        if best and best[0] >= MATCH_MIN_CORRELATION:
+            response = _span(best[2], best[1], duration)
+        else:
+            response = lyrics_transcript(self.lyrics, duration)
+        if sleep:
+            time.sleep(self._service_time(duration))
+        return response
+
+    def _handler(self):
+        scribe = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status: int, payload: dict, retry_after=None):
+                with scribe._lock:
+                    scribe.stats[f"status_{status}"] += 1
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if retry_after is not None:
+                    self.send_header("Retry-After", str(max(1, math.ceil(retry_after))))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _read_body(self) -> bytes:
+                """The request body, no faster than the configured upload rate."""
+                remaining = int(self.headers.get("Content-Length", 0))
+                chunks, received, started = [], 0, time.monotonic()
+                while remaining > 0:
+                    chunk = self.rfile.read(min(UPLOAD_CHUNK_BYTES, remaining))
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    received += len(chunk)
+                    remaining -= len(chunk)
+                    if scribe.upload_kbps:
+                        ahead = received * 8 / 1000 / scribe.upload_kbps - (time.monotonic() - started)
+                        if ahead > 0:
+                            time.sleep(ahead)
+                with scribe._lock:
+                    scribe.stats["bytes_received"] += received
+                return b"".join(chunks)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/_fake/stats":
+                    self._reply(200, scribe.snapshot())
+                else:
+                    self._reply(404, {"detail": "Not found"})
+
+            def do_POST(self):
+                body = self._read_body()
+                if self.path.rstrip("/") != "/v1/speech-to-text":
+                    return self._reply(404, {"detail": "Not found"})
+                if not self.headers.get("xi-api-key"):
+                    return self._reply(401, {"detail": {"status": "invalid_api_key"}})
+
+                refused = scribe._admit()
+                if refused:
+                    status, retry_after = refused
+                    reason = "too_many_requests" if status == 429 else "injected_error"
+                    return self._reply(status, {"detail": {"status": reason}}, retry_after)
+                try:
+                    message = email.message_from_bytes(
+                        f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+                    )
+                    audio = next((part.get_payload(decode=True) for part in message.get_payload()
+                                  if part.get_param("name", header="content-disposition") == "file"), None)
+                    if not audio:
+                        self._reply(400, {"detail": "No file uploaded"})
+                    else:
+                        self._reply(200, scribe.transcribe(audio))
+                except Exception as e:
+                    self._reply(400, {"detail": str(e)})
+                finally:
+                    with scribe._lock:
+                        scribe.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local ElevenLabs Scribe stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="0.5", help="S, fixed:S, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--latency-per-minute", type=float, default=1.0, help="extra seconds per minute of audio")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failed on purpose")
+    parser.add_argument("--errors", default="429,500,503", help="statuses injected failures use")
+    parser.add_argument("--fail-first", type=int, default=0, help="fail this many requests first")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429/503")
+    parser.add_argument("--rate-per-minute", type=float, default=0, help="requests per minute before 429 (0: off)")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="requests in flight before 429 (0: off)")
+    parser.add_argument("--upload-kbps", type=float, default=0, help="read uploads at this rate (0: unthrottled)")
+    parser.add_argument("--lyrics", help="text file of the default lyrics")
+    parser.add_argument("--song", action="append", default=[], metavar="AUDIO=LYRICS",
+                        help="a song to recognize and the lyrics file to time over it (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    def read(path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    scribe = FakeScribe(
+        latency=args.latency, latency_per_minute=args.latency_per_minute, error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.errors.split(",")], fail_first=args.fail_first,
+        retry_after=args.retry_after, rate_per_minute=args.rate_per_minute, max_concurrent=args.max_concurrent,
+        upload_kbps=args.upload_kbps, lyrics=read(args.lyrics) if args.lyrics else None, seed=args.seed,
+        host=args.host, port=args.port
+    )
+    for song in args.song:
+        audio_path, _, lyrics_path = song.partition("=")
+        scribe.register(audio_path, lyrics=read(lyrics_path) if lyrics_path else None)
+
+    print(f"Fake Scribe listening: ELEVENLABS_BASE_URL={scribe.base_url}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(json.dumps(scribe.snapshot()))
+        scribe.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Load test for the async job API: submit, poll and download under load.
+
+Each simulated job POSTs /jobs/create-video with synthetic media (a song
+from benchmarks/synth.py and its lyrics), polls GET /jobs/{id} until it
+finishes and downloads /jobs/{id}/download. Per job it records the
+submission latency, the queue wait and processing time (from the job's
+created/started/completed timestamps), the end-to-end turnaround including
+the download, and any error (submit, failed job, timeout, download).
+
+Load is either open-loop (Poisson arrivals at each of --rates jobs per
+minute, one step after the other, to find where the node saturates) or
+closed-loop (--concurrency users, each submitting its next job when the last
+one is downloaded). A step is saturated when it completes under 90% of its
+offered rate, its queue wait p90 exceeds --max-queue-wait or its error rate
+exceeds --max-error-rate; the capacity estimate is the highest rate before
+the first saturated step.
+
+--start-stack runs the API, --workers worker processes and the fake Scribe
+(benchmarks/fake_scribe.py) from a temporary directory; Redis must be
+reachable at --redis-url (a redis-server on PATH is started if it isn't).
+Without it, point --url at a running stack.
+
+Usage (from the repository root):
+    python benchmarks/load_test.py --start-stack --workers 2 --rates 2 4 8 --step-seconds 120
+    python benchmarks/load_test.py --url http://localhost:8001 --concurrency 4 --duration 300 --mode soft
+    python benchmarks/load_test.py --start-stack --rates 1 2 --json --output load.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+SRC_DIR = os.path.join(REPO_ROOT, "src")
+sys.path.insert(0, BENCH_DIR)
+
+from synth import AUDIO_SCALES, IMAGE_SIZES, synth_image, synth_song  # noqa: E402
+
+POLL_INTERVAL = 1.0
+JOB_TIMEOUT = 1800
+STACK_START_TIMEOUT = 60
+PERCENTILES = (50, 90, 99)
+# A step completing less than this share of its offered rate is saturated
+SATURATION_THROUGHPUT = 0.9
+
+
+# ------------------------------------------------------------------------------
+# One job
+# ------------------------------------------------------------------------------
+def _timestamp(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+class JobRun:
+    """Measurements of one submitted job (seconds; None when not reached)."""
+
+    def __init__(self, step: int):
+        self.step = step
+        self.submit_seconds = None
+        self.queue_wait = None
+        self.processing = None
+        self.turnaround = None
+        self.download_seconds = None
+        self.download_bytes = 0
+        self.polls = 0
+        # time.monotonic() at submission and when the download finished
+        self.submitted_at = None
+        self.finished_at = None
+        self.error = None  # 'submit', 'failed', 'timeout' or 'download'
+
+    def as_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+class Media:
+    def __init__(self, scale: str, image: str, language: str, media_dir: str):
+        self.audio_path = os.path.join(media_dir, f"song_{scale}_{language}.mp3")
+        self.song = synth_song(self.audio_path, AUDIO_SCALES[scale], language,
+                               seed=AUDIO_SCALES[scale] + len(language))
+        self.image_path = synth_image(os.path.join(media_dir, f"background_{image}.png"), IMAGE_SIZES[image])
+        self.language = language
+        with open(self.audio_path, "rb") as f:
+            self.audio = f.read()
+        with open(self.image_path, "rb") as f:
+            self.image = f.read()
+
+
+_sessions = threading.local()
+
+
+def _session() -> requests.Session:
+    if not hasattr(_sessions, "session"):
+        _sessions.session = requests.Session()
+    return _sessions.session
+
+
+def run_job(base_url: str, media: Media, mode: str, run: JobRun):
+    session = _session()
+    form = {"lyrics": media.song["lyrics"], "language": media.language, "alignment_mode": "auto"}
+    if mode == "soft":
+        form["output_mode"] = "soft"
+    elif mode == "preview":
+        form["preview"] = "true"
+
+    started = time.perf_counter()
+    run.submitted_at = time.monotonic()
+    try:
+        response = session.post(
+            f"{base_url}/jobs/create-video", data=form, timeout=120,
+            files={"image": ("background.png", media.image, "image/png"),
+                   "audio": ("song.mp3", media.audio, "audio/mpeg")}
+        )
+        run.submit_seconds = time.perf_counter() - started
+        response.raise_for_status()
+        job_id = response.json()["job_id"]
+    except Exception:
+        run.error = "submit"
+        return
+
+    deadline = time.monotonic() + JOB_TIMEOUT
+    while True:
+        time.sleep(POLL_INTERVAL)
+        run.polls += 1
+        try:
+            job = session.get(f"{base_url}/jobs/{job_id}", timeout=30).json()
+        except Exception:
+            job = {}
+        if job.get("status") in ("completed", "failed"):
+            break
+        if time.monotonic() > deadline:
+            run.error = "timeout"
+            return
+
+    created, begun, finished = (_timestamp(job.get(k)) for k in ("created_at", "started_at", "completed_at"))
+    if created and begun:
+        run.queue_wait = (begun - created).total_seconds()
+    if begun and finished:
+        run.processing = (finished - begun).total_seconds()
+    if job["status"] == "failed":
+        run.error = "failed"
+        return
+
+    downloading = time.perf_counter()
+    try:
+        response = session.get(f"{base_url}/jobs/{job_id}/download", timeout=300)
+        response.raise_for_status()
+        run.download_bytes = len(response.content)
+    except Exception:
+        run.error = "download"
+        return
+    run.download_seconds = time.perf_counter() - downloading
+    run.turnaround = time.perf_counter() - started
+    run.finished_at = time.monotonic()
+
+
+# ------------------------------------------------------------------------------
+# Load models
+# ------------------------------------------------------------------------------
+def open_loop(base_url: str, media: Media, mode: str, rates, step_seconds: float, seed: int):
+    """Poisson arrivals at each rate (jobs/minute) for step_seconds; waits for every job."""
+    rng = random.Random(seed)
+    runs, threads = [], []
+    for step, rate in enumerate(rates):
+        step_end = time.monotonic() + step_seconds
+        next_arrival = time.monotonic() + rng.expovariate(rate / 60)
+        print(f"Step {step + 1}/{len(rates)}: {rate:g} jobs/min for {step_seconds:.0f}s", file=sys.stderr)
+        while next_arrival < step_end:
+            time.sleep(max(0.0, next_arrival - time.monotonic()))
+            run = JobRun(step)
+            runs.append(run)
+            thread = threading.Thread(target=run_job, args=(base_url, media, mode, run), daemon=True)
+            thread.start()
+            threads.append(thread)
+            next_arrival += rng.expovariate(rate / 60)
+        time.sleep(max(0.0, step_end - time.monotonic()))
+    for thread in threads:
+        thread.join()
+    return runs
+
+
+def closed_loop(base_url: str, media: Media, mode: str, concurrency: int, duration: float):
+    """`concurrency` users submitting back to back for `duration` seconds."""
+    runs, lock = [], threading.Lock()
+    stop = time.monotonic() + duration
+
+    def user():
+        while time.monotonic() < stop:
+            run = JobRun(0)
+            with lock:
+                runs.append(run)
+            run_job(base_url, media, mode, run)
+
+    users = [threading.Thread(target=user, daemon=True) for _ in range(concurrency)]
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+    return runs
+
+
+# ------------------------------------------------------------------------------
+# Report
+# ------------------------------------------------------------------------------
+def percentiles(values) -> dict:
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return {f"p{p}": None for p in PERCENTILES}
+    return {f"p{p}": round(values[min(len(values) - 1, int(len(values) * p / 100))], 3) for p in PERCENTILES}
+
+
+def summarize(runs, rate=None, max_queue_wait: float = 60, max_error_rate: float = 0.05) -> dict:
+    """
+    Percentiles and error counts of a step. Throughput is completions over
+    the time from the first submission to the last download, so a backlog
+    that drains after the step counts against it.
+    """
+    errors = {}
+    for run in runs:
+        if run.error:
+            errors[run.error] = errors.get(run.error, 0) + 1
+    completed = [r for r in runs if not r.error]
+    error_rate = sum(errors.values()) / len(runs) if runs else 0.0
+    span = (max(r.finished_at for r in completed) - min(r.submitted_at for r in runs)) if completed else 0.0
+    throughput = len(completed) / span * 60 if span > 0 else None
+    summary = {
+        "offered_per_minute": rate,
+        "jobs": len(runs),
+        "completed": len(completed),
+        "completed_per_minute": round(throughput, 2) if throughput is not None else None,
+        "errors": errors,
+        "error_rate": round(error_rate, 3),
+        "submit_seconds": percentiles(r.submit_seconds for r in runs),
+        "queue_wait_seconds": percentiles(r.queue_wait for r in runs),
+        "processing_seconds": percentiles(r.processing for r in runs),
+        "turnaround_seconds": percentiles(r.turnaround for r in runs),
+        "download_seconds": percentiles(r.download_seconds for r in runs),
+        "polls_per_job": round(sum(r.polls for r in runs) / len(runs), 1) if runs else 0,
+    }
+    queue_p90 = summary["queue_wait_seconds"]["p90"]
+    summary["saturated"] = bool(
+        error_rate > max_error_rate
+        or (queue_p90 is not None and queue_p90 > max_queue_wait)
+        or (rate and throughput is not None and throughput < rate * SATURATION_THROUGHPUT)
+    )
+    return summary
+
+
+def _format_percentiles(values: dict) -> str:
+    return "/".join("-" if v is None else f"{v:.2f}" for v in values.values())
+
+
+def print_table(steps):
+    print(f"{'rate/min':>8} {'jobs':>5} {'done/min':>8} {'err%':>5}  {'submit p50/90/99':>18}  "
+          f"{'queue wait':>18}  {'turnaround':>20}")
+    for s in steps:
+        rate = "-" if s["offered_per_minute"] is None else f"{s['offered_per_minute']:g}"
+        print(f"{rate:>8} {s['jobs']:>5} {s['completed_per_minute'] or 0:>8.2f} {s['error_rate'] * 100:>5.1f}  "
+              f"{_format_percentiles(s['submit_seconds']):>18}  {_format_percentiles(s['queue_wait_seconds']):>18}  "
+              f"{_format_percentiles(s['turnaround_seconds']):>20}{'  ⚠️ saturated' if s['saturated'] else ''}")
+
+
+# ------------------------------------------------------------------------------
+# Local stack
+# ------------------------------------------------------------------------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _redis_reachable(url: str) -> bool:
+    import redis
+    try:
+        return bool(redis.from_url(url, socket_connect_timeout=2).ping())
+    except Exception:
+        return False
+
+
+class LocalStack:
+    """API, workers and fake Scribe in a temporary directory (Redis provided or started)."""
+
+    def __init__(self, workers: int, redis_url: str, media: Media, scribe_latency: str):
+        from fake_scribe import FakeScribe
+
+        self.workdir = tempfile.mkdtemp(prefix="load-test-")
+        # The API serves ./static
+        os.symlink(os.path.join(REPO_ROOT, "static"), os.path.join(self.workdir, "static"))
+        self.processes = []
+        if not _redis_reachable(redis_url):
+            if not shutil.which("redis-server"):
+                raise RuntimeError(f"Redis is not reachable at {redis_url} and redis-server is not installed")
+            port = _free_port()
+            self._spawn(["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"], {}, "redis")
+            redis_url = f"redis://127.0.0.1:{port}"
+            self._wait(lambda: _redis_reachable(redis_url), "Redis")
+
+        self.scribe = FakeScribe(latency=scribe_latency)
+        self.scribe.register(media.audio_path, media.song["transcript"])
+        env = {
+            "REDIS_URL": redis_url,
+            "DATABASE_DIR": self.workdir,
+            "ARTIFACTS_DIR": os.path.join(self.workdir, "artifacts"),
+            "CACHE_DIR": os.path.join(self.workdir, "cache"),
+            "PCM_CACHE_DIR": os.path.join(self.workdir, "pcm"),
+            "ELEVENLABS_API_KEY": "load-test",
+            "ELEVENLABS_BASE_URL": self.scribe.base_url,
+            "PYTHONPATH": os.pathsep.join(filter(None, [SRC_DIR, os.environ.get("PYTHONPATH")])),
+        }
+        port = _free_port()
+        self.url = f"http://127.0.0.1:{port}"
+        self._spawn([sys.executable, "-m", "uvicorn", "async_api:app", "--host", "127.0.0.1",
+                     "--port", str(port), "--log-level", "warning"], env, "api")
+        self._wait(lambda: requests.get(f"{self.url}/openapi.json", timeout=2).ok, "the API")
+        for index in range(workers):
+            self._spawn([sys.executable, os.path.join(SRC_DIR, "worker.py")], env, f"worker{index}")
+
+    def _spawn(self, command, env: dict, name: str):
+        log = open(os.path.join(self.workdir, f"{name}.log"), "w")
+        self.processes.append(subprocess.Popen(command, cwd=self.workdir, env={**os.environ, **env},
+                                               stdout=log, stderr=subprocess.STDOUT))
+
+    def _wait(self, ready, what: str):
+        deadline = time.monotonic() + STACK_START_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                if ready():
+                    return
+            except Exception:
+                pass
+            time.sleep(0.5)
+        self.close()
+        raise RuntimeError(f"{what} did not start (logs in {self.workdir})")
+
+    def close(self):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if getattr(self, "scribe", None):
+            self.scribe.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the async job API")
+    parser.add_argument("--url", default="http://localhost:8001", help="API base URL (ignored with --start-stack)")
+    parser.add_argument("--start-stack", action="store_true", help="run API, workers and fake Scribe locally")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes with --start-stack")
+    parser.add_argument("--redis-url", default=os.environ.get("REDIS_URL", "redis://localhost:6379"))
+    parser.add_argument("--scribe-latency", default="lognormal:1.0,0.4", help="fake Scribe latency (see fake_scribe)")
+    parser.add_argument("--rates", nargs="*", type=float, default=[1, 2, 4], help="open-loop jobs per minute, in steps")
+    parser.add_argument("--step-seconds", type=float, default=120, help="length of each open-loop step")
+    parser.add_argument("--concurrency", type=int, help="closed loop with this many users instead of --rates")
+    parser.add_argument("--duration", type=float, default=300, help="closed-loop duration in seconds")
+    parser.add_argument("--mode", choices=["burn", "soft", "preview"], default="burn")
+    parser.add_argument("--scale", choices=list(AUDIO_SCALES), default="15s", help="song length per job")
+    parser.add_argument("--image", choices=list(IMAGE_SIZES), default="1080p")
+    parser.add_argument("--language", choices=["en", "hi"], default="en")
+    parser.add_argument("--max-queue-wait", type=float, default=60, help="queue wait p90 that marks saturation")
+    parser.add_argument("--max-error-rate", type=float, default=0.05, help="error rate that marks saturation")
+    parser.add_argument("--media-dir", default=os.path.join(BENCH_DIR, ".media"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--output", help="write results and every job's measurements to this JSON file")
+    args = parser.parse_args()
+
+    media = Media(args.scale, args.image, args.language, args.media_dir)
+    stack = LocalStack(args.workers, args.redis_url, media, args.scribe_latency) if args.start_stack else None
+    base_url = stack.url if stack else args.url.rstrip("/")
+
+    try:
+        if args.concurrency:
+            runs = closed_loop(base_url, media, args.mode, args.concurrency, args.duration)
+            steps = [summarize(runs, None, args.max_queue_wait, args.max_error_rate)]
+        else:
+            runs = open_loop(base_url, media, args.mode, args.rates, args.step_seconds, args.seed)
+            steps = [summarize([r for r in runs if r.step == i], rate, args.max_queue_wait, args.max_error_rate)
+                     for i, rate in enumerate(args.rates)]
+    finally:
+        if stack:
+            stack.close()
+
+    capacity = None
+    for step in steps:
+        if step["saturated"]:
+            break
+        capacity = step["offered_per_minute"]
+    report = {
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+                 "date": time.strftime("%Y-%m-%d")},
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "output", "media_dir")},
+        "steps": steps,
+        "capacity_per_minute": capacity,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(steps)
+        if not args.concurrency:
+            print(f"Capacity: {capacity:g} jobs/min before saturation" if capacity is not None
+                  else "Capacity: saturated at the first step")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({**report, "jobs": [r.as_dict() for r in runs]}, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
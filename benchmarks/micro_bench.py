@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks and scaling curves for the caption text/timing functions.
+
+Each case runs one function over synthetic lyrics and transcripts
+(benchmarks/synth.py) of increasing size, from 100 to 50,000 words, takes the
+best of several runs per size and fits the exponent k of time ~ n^k on a
+log-log scale: ~1 is linear, ~2 quadratic. One more run per size measures the
+peak memory allocated during the call (tracemalloc, which NumPy reports to),
+fitted the same way. With --compare, a case whose time or memory exponent
+grew by more than EXPONENT_SLACK, that got more than TIME_RATIO slower or
+allocated more than MEMORY_RATIO as much at any size, is reported as a
+regression (exit status 1).
+
+A size whose single run exceeds --budget seconds, or runs out of the
+--max-memory-mb address space, stops that case, so a blowup shows up as a
+truncated curve instead of hanging the suite or getting it OOM-killed.
+
+Usage (from the repository root):
+    python benchmarks/micro_bench.py
+    python benchmarks/micro_bench.py --only align_lyrics_with_words --max-words 10000
+    python benchmarks/micro_bench.py --output benchmarks/baselines/micro.json
+    python benchmarks/micro_bench.py --compare benchmarks/baselines/micro.json
+"""
+import os
+import sys
+import copy
+import json
+import math
+import time
+import logging
+import argparse
+import platform
+import resource
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+sys.path.insert(0, BENCH_DIR)
+
+from synth import synth_lyrics  # noqa: E402
+
+SIZES = [100, 300, 1000, 3000, 10000, 30000, 50000]
+# Keep repeating a size until this much time was spent on it (at least one run)
+MIN_SECONDS_PER_SIZE = 0.3
+MAX_RUNS = 7
+# Timings under these are noise for the fit and for comparisons
+FIT_FLOOR = 0.0001
+NOISE_FLOOR = 0.02
+MEMORY_FIT_FLOOR_KB = 64
+MEMORY_NOISE_FLOOR_KB = 1024
+EXPONENT_SLACK = 0.25
+TIME_RATIO = 1.5
+MEMORY_RATIO = 1.5
+
+
+# ------------------------------------------------------------------------------
+# Cases: name -> (prepare(words) -> args, run(*args)); prepare is not timed and
+# runs before every call, so cases that mutate their input get a fresh copy
+# ------------------------------------------------------------------------------
+_songs = {}
+
+
+def _song(word_count: int, language: str = "en") -> dict:
+    key = (word_count, language)
+    if key not in _songs:
+        _songs[key] = synth_lyrics(word_count, language, seed=word_count)
+    return _songs[key]
+
+
+def _with_markers(lyrics: str) -> str:
+    """Lyrics with section headers every few lines, as users paste them."""
+    lines = lyrics.split("\n")
+    marked = []
+    for i, line in enumerate(lines):
+        if i % 8 == 0:
+            marked.append(["Verse 1", "CHORUS", "Bridge", ""][i // 8 % 4])
+        marked.append(line)
+    return "\n".join(marked)
+
+
+def _captions(word_count: int):
+    from rendering.stt import elevenlabs_to_webvtt
+    return elevenlabs_to_webvtt(_song(word_count)["transcript"], words_per_group=2).captions
+
+
+def _timestamps(word_count: int):
+    song = _song(word_count)
+    return [w["start"] for w in song["transcript"]["words"] if w["type"] == "word"]
+
+
+def _round_trip_timestamps(seconds):
+    from rendering.timing import seconds_to_srt_timestamp, parse_seconds_from_timestamp, parse_time
+    for value in seconds:
+        stamp = seconds_to_srt_timestamp(value)
+        parse_seconds_from_timestamp(stamp)
+        parse_time(stamp)
+
+
+def _cases():
+    from rendering.lyrics import preprocess_lyrics
+    from rendering.alignment import align_lyrics_with_words
+    from rendering.stt import elevenlabs_to_webvtt
+    from rendering.timing import optimize_subtitles_for_timing
+
+    return {
+        "preprocess_lyrics": (
+            lambda n: (_with_markers(_song(n)["lyrics"]),),
+            preprocess_lyrics,
+        ),
+        "align_lyrics_with_words": (
+            lambda n: (_song(n)["lyrics"].split("\n"), _song(n)["transcript"]["words"], _song(n)["duration"]),
+            align_lyrics_with_words,
+        ),
+        "align_lyrics_with_words[hi]": (
+            lambda n: (_song(n, "hi")["lyrics"].split("\n"), _song(n, "hi")["transcript"]["words"],
+                       _song(n, "hi")["duration"]),
+            align_lyrics_with_words,
+        ),
+        "elevenlabs_to_webvtt": (
+            lambda n: (_song(n)["transcript"],),
+            elevenlabs_to_webvtt,
+        ),
+        "optimize_subtitles_for_timing": (
+            lambda n: (copy.deepcopy(_captions(n)),),
+            optimize_subtitles_for_timing,
+        ),
+        "timestamps": (
+            lambda n: (_timestamps(n),),
+            _round_trip_timestamps,
+        ),
+    }
+
+
+# ------------------------------------------------------------------------------
+# Measurement
+# ------------------------------------------------------------------------------
+def time_case(prepare, run, words: int) -> float:
+    """Best wall time of up to MAX_RUNS calls."""
+    best, spent, runs = math.inf, 0.0, 0
+    while runs < MAX_RUNS and (runs == 0 or spent < MIN_SECONDS_PER_SIZE):
+        args = prepare(words)
+        started = time.perf_counter()
+        run(*args)
+        elapsed = time.perf_counter() - started
+        best, spent, runs = min(best, elapsed), spent + elapsed, runs + 1
+    return best
+
+
+def peak_memory_kb(prepare, run, words: int) -> float:
+    """Peak KB allocated while one call runs, above what its inputs already hold."""
+    args = prepare(words)
+    tracemalloc.start()
+    try:
+        run(*args)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def fit_exponent(points: dict, floor: float = FIT_FLOOR):
+    """Least-squares slope of log(value) over log(words), ignoring sizes under the noise floor."""
+    usable = [(math.log(n), math.log(t)) for n, t in points.items() if t >= floor]
+    if len(usable) < 2:
+        return None
+    mean_x = sum(x for x, _ in usable) / len(usable)
+    mean_y = sum(y for _, y in usable) / len(usable)
+    spread = sum((x - mean_x) ** 2 for x, _ in usable)
+    if not spread:
+        return None
+    return round(sum((x - mean_x) * (y - mean_y) for x, y in usable) / spread, 2)
+
+
+def complexity_label(exponent) -> str:
+    if exponent is None:
+        return "n/a"
+    if exponent < 0.3:
+        return "~O(1)"
+    if exponent < 1.25:
+        return "~O(n)"
+    if exponent < 1.75:
+        return f"~O(n^{exponent:.1f})"
+    return "~O(n^2) or worse"
+
+
+def run_case(run_prepare, sizes, budget: float) -> dict:
+    prepare, run = run_prepare
+    points, memory, stopped, reason = {}, {}, None, None
+    for words in sizes:
+        try:
+            seconds = time_case(prepare, run, words)
+            points[words] = seconds
+            if seconds <= budget:
+                memory[words] = peak_memory_kb(prepare, run, words)
+        except MemoryError:
+            stopped, reason = words, "out of memory"
+            break
+        if seconds > budget:
+            stopped, reason = words, "over time budget"
+            break
+    exponent = fit_exponent(points)
+    # Slope between the two largest sizes: blowups often only start late
+    largest = dict(list(points.items())[-2:])
+    return {
+        "seconds": {str(n): round(t, 6) for n, t in points.items()},
+        "exponent": exponent,
+        "tail_exponent": fit_exponent(largest) if len(largest) == 2 else None,
+        "complexity": complexity_label(exponent),
+        "peak_kb": {str(n): round(kb, 1) for n, kb in memory.items()},
+        "memory_exponent": fit_exponent(memory, MEMORY_FIT_FLOOR_KB),
+        "stopped_at": stopped,
+        "stopped_reason": reason,
+    }
+
+
+def compare(results: dict, baseline_path: str) -> int:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["cases"]
+    print(f"\nCompared with {baseline_path}:")
+    regressions = 0
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        problems = []
+        if result["exponent"] is not None and base["exponent"] is not None \
+                and result["exponent"] > base["exponent"] + EXPONENT_SLACK:
+            problems.append(f"exponent {base['exponent']} -> {result['exponent']}")
+        for size, seconds in result["seconds"].items():
+            before = base["seconds"].get(size)
+            if before and max(seconds, before) >= NOISE_FLOOR and seconds > before * TIME_RATIO:
+                problems.append(f"{size} words {before * 1000:.1f} -> {seconds * 1000:.1f} ms")
+        now_memory, base_memory = result.get("memory_exponent"), base.get("memory_exponent")
+        if now_memory is not None and base_memory is not None and now_memory > base_memory + EXPONENT_SLACK:
+            problems.append(f"memory exponent {base_memory} -> {now_memory}")
+        for size, kb in result.get("peak_kb", {}).items():
+            before = base.get("peak_kb", {}).get(size)
+            if before and max(kb, before) >= MEMORY_NOISE_FLOOR_KB and kb > before * MEMORY_RATIO:
+                problems.append(f"{size} words {before / 1024:.1f} -> {kb / 1024:.1f} MB allocated")
+        if result["stopped_at"] and not base.get("stopped_at"):
+            problems.append(f"{result['stopped_reason']} at {result['stopped_at']} words")
+        regressions += bool(problems)
+        print(f"  {name:<30} {'⚠️  ' + '; '.join(problems) if problems else 'ok'}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling curves of the caption text/timing functions")
+    parser.add_argument("--only", nargs="*", help="case names to run")
+    parser.add_argument("--max-words", type=int, default=SIZES[-1], help="largest input size")
+    parser.add_argument("--budget", type=float, default=30.0, help="stop a case after a run this slow (seconds)")
+    parser.add_argument("--max-memory-mb", type=int, default=3072,
+                        help="address space limit; allocations past it stop the case (0: no limit)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--output", help="write results (with host info) to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    args = parser.parse_args()
+
+    # The alignment logs every line; that is not what is being measured
+    logging.disable(logging.CRITICAL)
+    if args.max_memory_mb:
+        limit = args.max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    sizes = [n for n in SIZES if n <= args.max_words]
+
+    results = {}
+    for name, case in _cases().items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = result = run_case(case, sizes, args.budget)
+        if not args.json:
+            curve = "  ".join(f"{n}:{t * 1000:.1f}" for n, t in result["seconds"].items())
+            stopped = ""
+            if result["stopped_at"]:
+                stopped = f"  (stopped: {result['stopped_reason']} at {result['stopped_at']} words)"
+            peaks = "  ".join(f"{n}:{kb / 1024:.1f}" for n, kb in result["peak_kb"].items())
+            print(f"{name:<30} k={result['exponent']} (tail {result['tail_exponent']})  "
+                  f"{result['complexity']:<16} ms  {curve}{stopped}")
+            print(f"{'':<30} memory k={result['memory_exponent']}  MB  {peaks}")
+
+    report = {
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+                 "date": time.strftime("%Y-%m-%d")},
+        "cases": results,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.compare and compare(results, args.compare):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
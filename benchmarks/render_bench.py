@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+End-to-end render benchmark: the worker's full local job path on synthetic media.
+
+Each scenario (song length x lyrics language x background size) runs
+VideoProcessor.process_video_job in a fresh interpreter with its own
+database, artifact and cache directories, against a local Scribe stand-in
+(benchmarks/fake_scribe.py), so transcription, alignment, caption drawing and
+encoding are all exercised without network calls or cached results. Reports
+the per-stage wall times from rendering.stages, frames encoded per second of
+the render stage, peak RSS and the output size.
+
+Media is synthesized once into --media-dir (benchmarks/.media by default).
+The default scenarios finish in a few minutes on a laptop; the 3m, 10m and
+60m songs are opt-in:
+
+Usage (from the repository root):
+    python benchmarks/render_bench.py
+    python benchmarks/render_bench.py --scales 15s 60s 10m --languages en --json
+    python benchmarks/render_bench.py --output benchmarks/baselines/render.json
+    python benchmarks/render_bench.py --compare benchmarks/baselines/render.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+SRC_DIR = os.path.join(REPO_ROOT, "src")
+sys.path.insert(0, BENCH_DIR)
+
+from synth import AUDIO_SCALES, IMAGE_SIZES, ffmpeg_binary, synth_image, synth_song  # noqa: E402
+
+DEFAULT_SCALES = ["15s", "60s"]
+DEFAULT_LANGUAGES = ["en", "hi"]
+DEFAULT_IMAGE = "1080p"
+# A stage this much slower than the baseline is flagged by --compare
+REGRESSION_RATIO = 1.25
+
+# Run inside the scenario's own interpreter: argv = [scenario json]
+CHILD = """
+import os, sys, json, uuid, resource, logging
+sys.path.insert(0, {src!r})
+logging.disable(logging.INFO)
+scenario = json.loads(sys.argv[1])
+os.chdir(scenario["workdir"])
+
+import worker
+from models import SessionLocal, VideoJob, create_tables
+
+create_tables()
+worker.OUTPUT_DIR = os.path.abspath("output")
+os.makedirs(worker.OUTPUT_DIR, exist_ok=True)
+
+job_id = str(uuid.uuid4())
+db = SessionLocal()
+db.add(VideoJob(id=job_id, lyrics=scenario["lyrics"], language=scenario["language"],
+                image_filename=os.path.basename(scenario["image_path"]),
+                audio_filename=os.path.basename(scenario["audio_path"])))
+db.commit()
+db.close()
+
+processor = worker.VideoProcessor()
+ok = processor.process_video_job({{
+    "job_id": job_id, "image_path": scenario["image_path"], "audio_path": scenario["audio_path"],
+    "lyrics": scenario["lyrics"], "language": scenario["language"], "font_size": 45,
+    "font_color": "yellow", "words_per_group": 5, "timing_offset": 0.0, "min_duration": 1.0,
+    "alignment_mode": "auto", "debug_mode": False, "preview": False, "output_mode": "burn",
+}})
+output = os.path.join(worker.OUTPUT_DIR, f"output_{{job_id}}.mp4")
+print(json.dumps({{
+    "ok": ok,
+    "output": output if os.path.exists(output) else None,
+    "timings": processor.last_timings,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "children_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+}}))
+"""
+
+
+def scenarios(scales, languages, images):
+    """Every scale x language on the default image, plus the shortest song on every image size."""
+    result = [(scale, language, DEFAULT_IMAGE) for scale in scales for language in languages]
+    result += [(scales[0], languages[0], image) for image in images if image != DEFAULT_IMAGE]
+    return result
+
+
+def count_frames(path: str) -> int:
+    """Video frames in a constant-frame-rate MP4: copied duration x stream fps (no decode)."""
+    result = subprocess.run(
+        [ffmpeg_binary(), "-hide_banner", "-i", path, "-map", "0:v:0", "-c", "copy",
+         "-f", "null", "-progress", "pipe:1", "-"],
+        capture_output=True, text=True, timeout=600
+    )
+    fps = re.search(r"Video:.*?([\d.]+) fps", result.stderr)
+    out_time = re.findall(r"^out_time_us=(\d+)", result.stdout, re.M)
+    if not fps or not out_time:
+        return 0
+    return round(int(out_time[-1]) / 1e6 * float(fps.group(1)))
+
+
+def song_for(scale: str, language: str, media_dir: str):
+    """(audio path, manifest) of the synthetic song for a scale and language."""
+    path = os.path.join(media_dir, f"song_{scale}_{language}.mp3")
+    return path, synth_song(path, AUDIO_SCALES[scale], language, seed=AUDIO_SCALES[scale] + len(language))
+
+
+def run_scenario(scale: str, language: str, image: str, media_dir: str, scribe_url: str) -> dict:
+    audio_path, song = song_for(scale, language, media_dir)
+    image_path = synth_image(os.path.join(media_dir, f"background_{image}.png"), IMAGE_SIZES[image])
+    workdir = tempfile.mkdtemp(prefix="render-bench-")
+    env = dict(
+        os.environ,
+        DATABASE_DIR=workdir,
+        ARTIFACTS_DIR=os.path.join(workdir, "artifacts"),
+        CACHE_DIR=os.path.join(workdir, "cache"),
+        PCM_CACHE_DIR=os.path.join(workdir, "pcm"),
+        ELEVENLABS_API_KEY="bench",
+        ELEVENLABS_BASE_URL=scribe_url,
+    )
+    scenario = {
+        "workdir": workdir,
+        "image_path": image_path,
+        "audio_path": audio_path,
+        "lyrics": song["lyrics"],
+        "language": language,
+    }
+
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD.format(src=SRC_DIR), json.dumps(scenario)],
+        cwd=workdir, env=env, capture_output=True, text=True, timeout=6 * 3600
+    )
+    wall = time.perf_counter() - started
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        tail = result.stderr.strip().splitlines()[-1:] or ["failed"]
+        raise RuntimeError(tail[0])
+    child = json.loads(lines[-1])
+    if not child["ok"] or not child["output"]:
+        raise RuntimeError("job failed: " + (result.stderr.strip().splitlines()[-1:] or [""])[0])
+
+    timings = child["timings"] or {"total": wall, "stages": {}}
+    frames = count_frames(child["output"])
+    encode_seconds = timings["stages"].get("render") or timings["total"]
+    return {
+        "scale": scale,
+        "language": language,
+        "image": image,
+        "audio_seconds": song["duration"],
+        "wall_seconds": round(wall, 3),
+        "job_seconds": timings["total"],
+        "stages": timings["stages"],
+        "frames": frames,
+        "frames_per_second": round(frames / encode_seconds, 2) if encode_seconds else None,
+        "realtime_factor": round(timings["total"] / song["duration"], 3),
+        "peak_rss_mb": round(child["rss_mb"], 1),
+        "peak_child_rss_mb": round(child["children_rss_mb"], 1),
+        "output_bytes": os.path.getsize(child["output"]),
+    }
+
+
+def host_info() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "date": time.strftime("%Y-%m-%d"),
+    }
+
+
+def compare(results: list, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["scale"], r["language"], r["image"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path}:")
+    regressions = 0
+    for r in results:
+        base = baseline.get((r["scale"], r["language"], r["image"]))
+        if not base:
+            continue
+        for name in ["job_seconds"] + [f"stages.{s}" for s in r["stages"]]:
+            now = r["stages"].get(name[7:]) if name.startswith("stages.") else r[name]
+            before = base["stages"].get(name[7:]) if name.startswith("stages.") else base[name]
+            if not before or now is None or before < 0.05:
+                continue
+            ratio = now / before
+            flag = "  ⚠️" if ratio > REGRESSION_RATIO else ""
+            regressions += bool(flag)
+            print(f"  {r['scale']:>4} {r['language']} {r['image']:<9} {name:<22} {before:8.2f}s -> {now:8.2f}s ({ratio:5.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the full local render path on synthetic media")
+    parser.add_argument("--scales", nargs="*", default=DEFAULT_SCALES, choices=list(AUDIO_SCALES))
+    parser.add_argument("--languages", nargs="*", default=DEFAULT_LANGUAGES, choices=["en", "hi"])
+    parser.add_argument("--images", nargs="*", default=[DEFAULT_IMAGE], choices=list(IMAGE_SIZES),
+                        help="background sizes (extra sizes run with the shortest song)")
+    parser.add_argument("--media-dir", default=os.path.join(BENCH_DIR, ".media"))
+    parser.add_argument("--scribe-latency", type=float, default=0.5, help="fake Scribe seconds per request")
+    parser.add_argument("--scribe-latency-per-minute", type=float, default=1.0,
+                        help="fake Scribe seconds per minute of uploaded audio")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--output", help="write results (with host info) to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare stage times against")
+    args = parser.parse_args()
+
+    from fake_scribe import FakeScribe
+
+    scribe = FakeScribe(args.scribe_latency, args.scribe_latency_per_minute)
+    results = []
+    try:
+        for scale, language, image in scenarios(args.scales, args.languages, args.images):
+            audio_path, song = song_for(scale, language, args.media_dir)
+            scribe.register(audio_path, song["transcript"])
+            try:
+                result = run_scenario(scale, language, image, args.media_dir, scribe.base_url)
+            except Exception as e:
+                print(f"{scale} {language} {image}: FAILED ({e})", file=sys.stderr)
+                continue
+            results.append(result)
+            if not args.json:
+                stages = ", ".join(f"{k} {v:.2f}s" for k, v in result["stages"].items())
+                print(f"{scale:>4} {language} {image:<9} {result['job_seconds']:7.2f}s "
+                      f"{result['frames_per_second'] or 0:7.1f} fps  rss {result['peak_rss_mb']:6.0f} MB "
+                      f"(ffmpeg {result['peak_child_rss_mb']:.0f} MB)  {result['output_bytes'] / 1e6:6.2f} MB  [{stages}]")
+    finally:
+        scribe.close()
+
+    report = {"host": host_info(), "results": results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        regressions = compare(results, args.compare)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
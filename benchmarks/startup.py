@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: import time and memory per entry point.
+
+Every measurement runs in a fresh interpreter, so nothing is shared through
+sys.modules. Reports the median over --runs of the time to import the entry
+point, the peak RSS of the process afterwards, and how many modules it loaded.
+
+Usage (from the repository root):
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 10 --json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(REPO_ROOT, "src")
+
+# name -> statement executed after sys.path is set up
+ENTRY_POINTS = {
+    "async_api": "import async_api",
+    "worker": "import worker",
+    "runpod_dispatcher": "import runpod_dispatcher",
+    # What a RunPod handler does before accepting jobs (the handler modules
+    # themselves start the RunPod event loop on import)
+    "runpod_handler_init": "import warm_start; warm_start.warm_up()",
+    "main (legacy API)": "import main",
+}
+
+HEAVY_MODULES = ["fastapi", "moviepy", "PIL", "pydub", "numpy", "indic_transliteration", "requests_toolbelt", "boto3"]
+
+PROBE = """
+import sys, time, json, resource
+t0 = time.perf_counter()
+sys.path.insert(0, {src!r})
+{statement}
+elapsed = time.perf_counter() - t0
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": rss_kb / 1024,
+    "modules": len(sys.modules),
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure(statement: str, env: dict) -> dict:
+    code = PROBE.format(src=SRC_DIR, statement=statement, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, timeout=300
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and RSS per entry point")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per entry point")
+    parser.add_argument("--only", nargs="*", help="entry point names to measure")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    # Keep the API's SQLite file out of the repository
+    env = dict(os.environ, DATABASE_DIR=tempfile.mkdtemp(prefix="startup-bench-"))
+
+    results = {}
+    for name, statement in ENTRY_POINTS.items():
+        if args.only and name not in args.only:
+            continue
+        try:
+            runs = [measure(statement, env) for _ in range(args.runs)]
+        except Exception as e:
+            results[name] = {"error": str(e)}
+            continue
+        results[name] = {
+            "import_seconds": round(statistics.median(r["seconds"] for r in runs), 3),
+            "import_seconds_min": round(min(r["seconds"] for r in runs), 3),
+            "rss_mb": round(statistics.median(r["rss_mb"] for r in runs), 1),
+            "modules": runs[-1]["modules"],
+            "heavy_modules": runs[-1]["heavy"],
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'entry point':<22} {'import (s)':>10} {'min (s)':>8} {'RSS (MB)':>9} {'modules':>8}  heavy deps loaded")
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{name:<22} error: {r['error']}")
+            continue
+        print(f"{name:<22} {r['import_seconds']:>10.3f} {r['import_seconds_min']:>8.3f} "
+              f"{r['rss_mb']:>9.1f} {r['modules']:>8}  {', '.join(r['heavy_modules']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Synthetic benchmark media: background images at several resolutions and
+"songs" with matching lyrics and a ground-truth Scribe transcript.
+
+A song is a sequence of lyric lines; every word is a sung-like note (a few
+harmonics with vibrato and an envelope), lines are separated by short rests
+and every few lines by a quiet instrumental break, so VAD, fingerprinting and
+alignment see realistic structure. The transcript is exact: the words of the
+lyrics with the times they were synthesized at, in Scribe's response shape.
+Audio is streamed through ffmpeg to MP3 in blocks, so an hour-long track
+never sits in memory. Everything is deterministic per seed and cached under
+the media directory.
+"""
+import os
+import json
+import random
+import subprocess
+
+import numpy as np
+
+SAMPLE_RATE = 22050
+AUDIO_BITRATE = "128k"
+
+IMAGE_SIZES = {
+    "720p": (720, 1280),
+    "1080p": (1080, 1920),
+    "4k": (2160, 3840),
+    "landscape": (1920, 1080),
+}
+AUDIO_SCALES = {"15s": 15, "60s": 60, "3m": 180, "10m": 600, "60m": 3600}
+
+WORDS = {
+    "en": ("love night baby dance fire heart light dream city rain tonight forever "
+           "together running falling golden river shadow morning whisper ocean "
+           "highway summer midnight wonder stars burning holding never always").split(),
+    "hi": ("प्यार दिल रात सपने बारिश चाँद तारे आसमान ज़िंदगी धड़कन साथ हमेशा "
+           "रास्ते मौसम खुशबू नज़र बातें यादें सफ़र दरिया रोशनी मंज़िल").split(),
+}
+LINE_WORDS = (4, 7)
+WORD_SECONDS = (0.22, 0.55)
+WORD_GAP_SECONDS = (0.04, 0.14)
+LINE_REST_SECONDS = (0.4, 1.4)
+BREAK_EVERY_LINES = 8
+BREAK_SECONDS = (3.0, 6.0)
+
+
+def ffmpeg_binary() -> str:
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+
+# ------------------------------------------------------------------------------
+# Images
+# ------------------------------------------------------------------------------
+def synth_image(path: str, size, seed: int = 0) -> str:
+    """A gradient with blobs and grain (photo-like, so PNG/x264 do real work)."""
+    from PIL import Image
+
+    if os.path.exists(path):
+        return path
+    width, height = size
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    image = np.zeros((height, width, 3), dtype=np.float32)
+    for channel in range(3):
+        a, b = rng.uniform(0.2, 1.0, 2)
+        image[..., channel] = 90 + 80 * np.sin(x / width * np.pi * a + channel) * np.cos(y / height * np.pi * b)
+    for _ in range(6):
+        cx, cy, r = rng.uniform(0, width), rng.uniform(0, height), rng.uniform(0.1, 0.3) * min(width, height)
+        image += (np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (2 * r * r))[..., None]
+                  * rng.uniform(-60, 60, 3).astype(np.float32))
+    image += rng.normal(0, 6, image.shape).astype(np.float32)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    Image.fromarray(np.clip(image, 0, 255).astype(np.uint8)).save(path)
+    return path
+
+
+# ------------------------------------------------------------------------------
+# Songs
+# ------------------------------------------------------------------------------
+def _note(seconds: float, frequency: float, rng) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE), dtype=np.float32) / SAMPLE_RATE
+    vibrato = 1 + 0.01 * np.sin(2 * np.pi * rng.uniform(4.5, 6.5) * t)
+    phase = 2 * np.pi * frequency * np.cumsum(vibrato) / SAMPLE_RATE
+    voice = sum(np.sin(h * phase) / h ** 1.3 for h in range(1, 7))
+    attack = np.minimum(1.0, t / 0.03)
+    release = np.minimum(1.0, (seconds - t) / 0.06)
+    return (0.25 * voice * attack * release).astype(np.float32)
+
+
+def _pad(seconds: float, rng) -> np.ndarray:
+    """Quiet low drone for instrumental breaks."""
+    t = np.arange(int(seconds * SAMPLE_RATE), dtype=np.float32) / SAMPLE_RATE
+    frequency = rng.uniform(55, 110)
+    return (0.04 * np.sin(2 * np.pi * frequency * t) + 0.02 * np.sin(2 * np.pi * 1.5 * frequency * t)).astype(np.float32)
+
+
+def synth_song(path: str, seconds: float, language: str = "en", seed: int = 0) -> dict:
+    """
+    Write an MP3 of about `seconds` and return {'lyrics', 'transcript', 'duration'};
+    the manifest is cached next to the audio.
+    """
+    manifest_path = path + ".json"
+    if os.path.exists(path) and os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    rng = random.Random(seed)
+    nrng = np.random.default_rng(seed)
+    vocabulary = WORDS[language]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    encoder = subprocess.Popen(
+        [ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y", "-f", "f32le", "-ar", str(SAMPLE_RATE),
+         "-ac", "1", "-i", "-", "-c:a", "libmp3lame", "-b:a", AUDIO_BITRATE, path],
+        stdin=subprocess.PIPE
+    )
+
+    clock = 0.0
+    words, lines = [], []
+
+    def emit(samples: np.ndarray):
+        nonlocal clock
+        noise = nrng.normal(0, 0.004, len(samples)).astype(np.float32)
+        encoder.stdin.write((samples + noise).tobytes())
+        clock += len(samples) / SAMPLE_RATE
+
+    emit(_pad(rng.uniform(1.0, 2.5), nrng))  # intro
+    while clock < seconds - 3.0:
+        line = [rng.choice(vocabulary) for _ in range(rng.randint(*LINE_WORDS))]
+        root = 220 * 2 ** (rng.randint(-5, 7) / 12)
+        for i, word in enumerate(line):
+            length = rng.uniform(*WORD_SECONDS)
+            start = clock
+            emit(_note(length, root * 2 ** (rng.choice([0, 2, 4, 5, 7, 9]) / 12), nrng))
+            text = word + ("," if i == len(line) - 1 and rng.random() < 0.3 else "")
+            words.append({"text": text, "start": round(start, 3), "end": round(clock, 3), "type": "word"})
+            gap = rng.uniform(*WORD_GAP_SECONDS)
+            words.append({"text": " ", "start": round(clock, 3), "end": round(clock + gap, 3), "type": "spacing"})
+            emit(np.zeros(int(gap * SAMPLE_RATE), dtype=np.float32))
+        lines.append(" ".join(line))
+        emit(np.zeros(int(rng.uniform(*LINE_REST_SECONDS) * SAMPLE_RATE), dtype=np.float32))
+        if len(lines) % BREAK_EVERY_LINES == 0:
+            emit(_pad(rng.uniform(*BREAK_SECONDS), nrng))
+    emit(_pad(max(0.5, seconds - clock), nrng))  # outro
+
+    encoder.stdin.close()
+    if encoder.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed to encode {path}")
+
+    while words and words[-1]["type"] == "spacing":
+        words.pop()
+    manifest = {
+        "duration": round(clock, 3),
+        "language": language,
+        "lyrics": "\n".join(lines),
+        "transcript": {
+            "language_code": {"en": "eng", "hi": "hin"}[language],
+            "language_probability": 0.99,
+            "text": "".join(w["text"] for w in words),
+            "words": words,
+        },
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    return manifest
+
+
+def synth_lyrics(word_count: int, language: str = "en", seed: int = 0) -> dict:
+    """
+    Lyrics and a Scribe transcript of `word_count` words timed like synth_song,
+    without audio, for the text and timing benchmarks. Same manifest shape.
+    """
+    rng = random.Random(seed)
+    vocabulary = WORDS[language]
+    clock = rng.uniform(1.0, 2.5)
+    words, lines = [], []
+    while not lines or len(words) < 2 * word_count:
+        line = [rng.choice(vocabulary) for _ in range(rng.randint(*LINE_WORDS))]
+        for i, word in enumerate(line):
+            length = rng.uniform(*WORD_SECONDS)
+            text = word + ("," if i == len(line) - 1 and rng.random() < 0.3 else "")
+            words.append({"text": text, "start": round(clock, 3), "end": round(clock + length, 3), "type": "word"})
+            gap = rng.uniform(*WORD_GAP_SECONDS)
+            words.append({"text": " ", "start": round(clock + length, 3), "end": round(clock + length + gap, 3),
+                          "type": "spacing"})
+            clock += length + gap
+        lines.append(" ".join(line))
+        clock += rng.uniform(*LINE_REST_SECONDS)
+        if len(lines) % BREAK_EVERY_LINES == 0:
+            clock += rng.uniform(*BREAK_SECONDS)
+    words.pop()
+    return {
+        "duration": round(clock + 1.0, 3),
+        "language": language,
+        "lyrics": "\n".join(lines),
+        "transcript": {
+            "language_code": {"en": "eng", "hi": "hin"}[language],
+            "language_probability": 0.99,
+            "text": "".join(w["text"] for w in words),
+            "words": words,
+        },
+    }
@@ -1,9 +1,11 @@
+import time
+_HANDLER_STARTED = time.perf_counter()
+
 import runpod
 import os
 import json
 import tempfile
 import logging
-import base64
 from typing import Dict, Any
 import requests
 
@@ -17,6 +19,11 @@ sys.path.append('/workspace/src')
 
 from worker import VideoProcessor
 from models import JobStatus
+from transfer import fetch_job_input_file, deliver_output_file
+from warm_start import warm_up, warm_up_error, job_timing
+
+# Preload the renderer, fonts and ffmpeg before the first job arrives
+warm_up(_HANDLER_STARTED)
 
 def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -25,8 +32,11 @@ def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
     Input format:
     {
         "job_id": "uuid",
-        "image_base64": "base64_encoded_image",
-        "audio_base64": "base64_encoded_audio", 
+        "render_plan": {...},  # compiled on the CPU tier; replaces lyrics/alignment fields
+        "image_url": "presigned GET URL" | "image_base64": "base64_encoded_image",
+        "audio_url": "presigned GET URL" | "audio_base64": "base64_encoded_audio",
+        "output_upload_url": "presigned PUT URL (optional)",
+        "output_key": "object key behind output_upload_url (optional)",
         "image_filename": "image.jpg",
         "audio_filename": "audio.mp3",
         "lyrics": "lyrics text",
@@ -41,29 +51,25 @@ def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
         "callback_url": "https://your-api.com/jobs/{job_id}/callback"
     }
     """
+    job_started = time.perf_counter()
     try:
         logger.info(f"Processing RunPod job: {job_input.get('job_id', 'unknown')}")
+        if warm_up_error():
+            raise RuntimeError(f"Handler initialization failed: {warm_up_error()}")
         
         # Create temporary files for processing
         with tempfile.TemporaryDirectory() as temp_dir:
-            # Decode and save image file
-            image_data = base64.b64decode(job_input["image_base64"])
-            image_path = os.path.join(temp_dir, job_input["image_filename"])
-            with open(image_path, "wb") as f:
-                f.write(image_data)
-            
-            # Decode and save audio file  
-            audio_data = base64.b64decode(job_input["audio_base64"])
-            audio_path = os.path.join(temp_dir, job_input["audio_filename"])
-            with open(audio_path, "wb") as f:
-                f.write(audio_data)
+            # Fetch inputs (presigned URL or inline base64), streamed to disk
+            image_path = fetch_job_input_file(job_input, "image", temp_dir)
+            audio_path = fetch_job_input_file(job_input, "audio", temp_dir)
             
             # Prepare job data for processor
             job_data = {
                 "job_id": job_input["job_id"],
                 "image_path": image_path,
                 "audio_path": audio_path,
-                "lyrics": job_input["lyrics"],
+                "render_plan": job_input.get("render_plan"),
+                "lyrics": job_input.get("lyrics"),
                 "language": job_input.get("language"),
                 "font_size": job_input.get("font_size", 45),
                 "font_color": job_input.get("font_color", "yellow"),
@@ -81,25 +87,23 @@ def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
                 job_input["job_id"]
             )
             
-            # Process the video
-            success = processor.process_video_job(job_data)
+            # Render here; routing between local and RunPod only applies on the CPU tier
+            success = processor.process_video_local(job_data)
             
             if success:
-                # Read the output video and encode as base64
+                # Upload the output video (or inline it as base64)
                 output_path = os.path.join("/workspace/output", f"output_{job_input['job_id']}.mp4")
                 if os.path.exists(output_path):
-                    with open(output_path, "rb") as f:
-                        video_data = f.read()
-                    
-                    video_base64 = base64.b64encode(video_data).decode()
+                    delivered = deliver_output_file(job_input, output_path)
                     
                     # Clean up output file
                     os.remove(output_path)
                     
                     return {
                         "status": "completed",
-                        "video_base64": video_base64,
-                        "job_id": job_input["job_id"]
+                        "job_id": job_input["job_id"],
+                        "timing": job_timing(job_started),
+                        **delivered
                     }
                 else:
                     raise Exception("Output video file not found")
@@ -107,6 +111,7 @@ def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
                 return {
                     "status": "failed",
                     "error": "Video processing failed",
+                    "timing": job_timing(job_started),
                     "job_id": job_input["job_id"]
                 }
                 
@@ -118,6 +123,7 @@ def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
         return {
             "status": "failed", 
             "error": str(e),
+            "timing": job_timing(job_started),
             "job_id": job_input.get("job_id", "unknown")
         }
 
@@ -2,12 +2,15 @@
 """
 Simplified RunPod handler for Instagram Reel Creator with robust error handling
 """
+import time
+_HANDLER_STARTED = time.perf_counter()
+
 import runpod
 import os
+import sys
 import json
 import tempfile
 import logging
-import base64
 import traceback
 from typing import Dict, Any
 
@@ -15,6 +18,11 @@ from typing import Dict, Any
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Initialization phase: preload the renderer, fonts and ffmpeg before the first job
+sys.path.append('/workspace/src')
+from warm_start import warm_up, warm_up_error, job_timing
+warm_up(_HANDLER_STARTED)
+
 def test_handler(job_input: Dict[str, Any]) -> Dict[str, Any]:
     """
     Simplified test handler to verify RunPod setup
@@ -37,7 +45,8 @@ def test_handler(job_input: Dict[str, Any]) -> Dict[str, Any]:
             "ELEVENLABS_API_KEY": "SET" if elevenlabs_key else "NOT_SET",
             "Python_Version": os.sys.version,
             "Working_Directory": os.getcwd(),
-            "ALL_ENV_VARS": [k for k in os.environ.keys() if "ELEVEN" in k.upper() or "SECRET" in k.upper()]
+            "ALL_ENV_VARS": [k for k in os.environ.keys() if "ELEVEN" in k.upper() or "SECRET" in k.upper()],
+            "WARM_START": warm_up(),
         }
         
         logger.info(f"Environment: {env_info}")
@@ -64,10 +73,14 @@ def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
     """
     Main video processing handler for RunPod
     """
+    job_started = time.perf_counter()
     try:
         logger.info(f"🎬 Processing video job: {job_input.get('job_id', 'unknown')}")
         logger.info(f"📋 Input keys received: {list(job_input.keys())}")
-        logger.info(f"🔍 Input data preview: {str(job_input)[:500]}...")
+        # Preview values individually: str() of the whole input would copy inline base64 payloads
+        preview = {k: (v[:80] + "..." if isinstance(v, str) and len(v) > 80 else v)
+                   for k, v in job_input.items() if not isinstance(v, dict)}
+        logger.info(f"🔍 Input data preview: {preview}")
         
         # CRITICAL FIX: RunPod wraps input data in 'input' field
         if 'input' in job_input and isinstance(job_input['input'], dict):
@@ -78,10 +91,10 @@ def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
             
         logger.info(f"📋 Actual input keys: {list(actual_input.keys())}")
         
-        # Check ElevenLabs API key availability
+        # Check ElevenLabs API key availability (only needed for inputs without a render plan)
         elevenlabs_key = os.environ.get("ELEVENLABS_API_KEY")
-        if elevenlabs_key:
-            logger.info("✅ ElevenLabs API key found in environment")
+        if elevenlabs_key or "render_plan" in actual_input:
+            logger.info("✅ ElevenLabs API key found or not needed")
         else:
             logger.warning("⚠️ ElevenLabs API key not found - you need to configure it in RunPod template")
             logger.info("📋 Available environment variables containing 'eleven' or 'secret':")
@@ -92,24 +105,22 @@ def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
         # First run a simple test
         if actual_input.get("test_mode", False):
             logger.info("🧪 Running in test mode - skipping actual video processing")
-            return test_handler(actual_input)
+            return {**test_handler(actual_input), "timing": job_timing(job_started)}
         
-        # Import video processing modules
-        import sys
-        sys.path.append('/workspace/src')
+        # Modules were preloaded by warm_up() at import; fail fast if that broke
+        init_error = warm_up_error()
+        if init_error:
+            return {
+                "status": "failed",
+                "error": f"Handler initialization failed: {init_error}",
+                "timing": job_timing(job_started),
+                "job_id": actual_input.get("job_id", "unknown")
+            }
         
         try:
-            # Import main video processing function from original main.py
-            from main import (
-                transcribe_and_align_lyrics, optimize_subtitles_for_timing,
-                parse_time, seconds_to_srt_timestamp, get_available_font,
-                load_audio_with_fallback, preprocess_lyrics, align_lyrics_with_scribe
-            )
-            import webvtt
-            from moviepy.video.io.VideoFileClip import VideoFileClip
-            from moviepy.video.VideoClip import ImageClip, TextClip
-            from moviepy.audio.io.AudioFileClip import AudioFileClip
-            from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+            # Rendering runs from a plan compiled on the CPU tier
+            from rendering.plan import build_render_plan, render_video_from_plan
+            from transfer import fetch_job_input_file, deliver_output_file
             
             logger.info("✅ Successfully imported video processing modules")
             
@@ -121,9 +132,14 @@ def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
                 "job_id": job_input.get("job_id", "unknown")
             }
         
-        # Validate required fields first
-        required_fields = ["image_base64", "audio_base64", "image_filename", "audio_filename", "lyrics"]
+        # Validate required fields first (inputs may arrive as URLs or inline base64)
+        required_fields = ["image_filename", "audio_filename"]
+        if "render_plan" not in actual_input:
+            required_fields.append("lyrics")
         missing_fields = [field for field in required_fields if field not in actual_input]
+        for kind in ("image", "audio"):
+            if f"{kind}_url" not in actual_input and f"{kind}_base64" not in actual_input:
+                missing_fields.append(f"{kind}_url or {kind}_base64")
         
         if missing_fields:
             logger.error(f"❌ Missing required fields: {missing_fields}")
@@ -137,126 +153,51 @@ def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
         
         # Process the video using simplified approach
         with tempfile.TemporaryDirectory() as temp_dir:
-            # Decode and save files
+            # Fetch inputs, streamed straight to disk
             try:
-                image_data = base64.b64decode(actual_input["image_base64"])
-                image_path = os.path.join(temp_dir, actual_input["image_filename"])
-                with open(image_path, "wb") as f:
-                    f.write(image_data)
-                
-                audio_data = base64.b64decode(actual_input["audio_base64"])
-                audio_path = os.path.join(temp_dir, actual_input["audio_filename"])
-                with open(audio_path, "wb") as f:
-                    f.write(audio_data)
+                image_path = fetch_job_input_file(actual_input, "image", temp_dir)
+                audio_path = fetch_job_input_file(actual_input, "audio", temp_dir)
                     
-                logger.info(f"✅ Files decoded and saved: {image_path}, {audio_path}")
+                logger.info(f"✅ Files fetched and saved: {image_path}, {audio_path}")
                 
             except Exception as e:
-                logger.error(f"❌ Failed to decode/save files: {e}")
+                logger.error(f"❌ Failed to fetch/save files: {e}")
                 return {
                     "status": "failed", 
                     "error": f"File decode error: {str(e)}",
                     "job_id": actual_input.get("job_id", "unknown")
                 }
             
-            # Extract parameters
-            lyrics = actual_input["lyrics"]
-            language = actual_input.get("language")
-            font_size = actual_input.get("font_size", 45)
-            font_color = actual_input.get("font_color", "yellow")
-            words_per_group = actual_input.get("words_per_group", 3)
-            timing_offset = actual_input.get("timing_offset", 0.0)
-            min_duration = actual_input.get("min_duration", 1.0)
-            alignment_mode = actual_input.get("alignment_mode", "auto")
-            debug_mode = actual_input.get("debug_mode", False)
-            
-            # Load audio
-            logger.info("🎵 Loading audio...")
-            audio_clip, duration = load_audio_with_fallback(audio_path)
-            logger.info(f"Audio duration: {duration:.2f} seconds")
-            
-            # Create background image (optimized)
-            logger.info("🖼️ Creating background image...")
-            bg_clip = ImageClip(image_path).with_duration(duration).resized(height=1080)  # Standard HD height
-            
-            # Process lyrics
-            logger.info("📝 Processing lyrics...")
-            
-            if alignment_mode == "even":
-                lyrics_lines = preprocess_lyrics(lyrics)
-                aligned_segments = align_lyrics_with_scribe(lyrics_lines, duration)
-                
-                vtt = webvtt.WebVTT()
-                for s in aligned_segments:
-                    start_str = seconds_to_srt_timestamp(s["start"])
-                    end_str = seconds_to_srt_timestamp(s["end"])
-                    vtt.captions.append(webvtt.Caption(start_str, end_str, s["text"]))
+            plan = actual_input.get("render_plan")
+            if plan:
+                logger.info(f"📝 Received render plan with {len(plan['cues'])} captions")
             else:
-                vtt = transcribe_and_align_lyrics(
-                    audio_path, lyrics, language=language, alignment_mode=alignment_mode
-                )
-            
-            logger.info(f"Generated {len(vtt.captions)} subtitle captions")
-            
-            # Create subtitle clips (optimized for GPU)
-            subtitle_clips = []
-            total_captions = len(vtt.captions)
-            logger.info(f"Processing {total_captions} subtitle clips...")
-            
-            # Process in batches for memory efficiency
-            batch_size = 20
-            for i, cap in enumerate(vtt.captions):
-                start_obj = parse_time(cap.start)
-                end_obj = parse_time(cap.end)
-                if not start_obj or not end_obj:
-                    continue
-                
-                start_s = (start_obj.hour * 3600 + start_obj.minute * 60 + 
-                          start_obj.second + start_obj.microsecond / 1e6)
-                end_s = (end_obj.hour * 3600 + end_obj.minute * 60 + 
-                        end_obj.second + end_obj.microsecond / 1e6)
-                
-                sub_duration = end_s - start_s
-                if sub_duration <= 0:
-                    continue
-                
-                # Create optimized text clip
-                txt_clip = TextClip(
-                    text=cap.text,  # Use full text
-                    font=get_available_font(),
-                    font_size=font_size,
-                    color=font_color,
-                    size=(800, 100),  # Larger text area
-                    method='caption'
-                ).with_duration(sub_duration).with_start(start_s).with_position(('center', 0.8), relative=True)
-                
-                # Progress logging and memory cleanup
-                if i % batch_size == 0:
-                    logger.info(f"📝 Processed {i+1}/{total_captions} subtitle clips ({((i+1)/total_captions*100):.1f}%)")
-                
-                subtitle_clips.append(txt_clip)
-            
-            logger.info(f"Created {len(subtitle_clips)} text clips")
-            
-            # Compose final video
-            logger.info("🎬 Composing final video...")
-            final_clip = CompositeVideoClip([bg_clip] + subtitle_clips)
-            final_clip.audio = audio_clip
+                # Legacy input: align here (needs ELEVENLABS_API_KEY on the GPU worker)
+                logger.warning("⚠️ No render plan in input, transcribing and aligning on the GPU worker")
+                plan = build_render_plan({
+                    "job_id": actual_input.get("job_id"),
+                    "audio_path": audio_path,
+                    "lyrics": actual_input["lyrics"],
+                    "language": actual_input.get("language"),
+                    "font_size": actual_input.get("font_size", 45),
+                    "font_color": actual_input.get("font_color", "yellow"),
+                    "words_per_group": actual_input.get("words_per_group", 3),
+                    "timing_offset": actual_input.get("timing_offset", 0.0),
+                    "min_duration": actual_input.get("min_duration", 1.0),
+                    "alignment_mode": actual_input.get("alignment_mode", "auto"),
+                    "debug_mode": actual_input.get("debug_mode", False)
+                })
             
             # Write output
             output_path = os.path.join("/workspace/output", f"output_{actual_input['job_id']}.mp4")
             os.makedirs("/workspace/output", exist_ok=True)
             
-            logger.info(f"🎥 Writing video to {output_path}...")
-            # GPU-optimized parameters for MoviePy  
-            logger.info(f"🚀 Starting GPU-accelerated encoding...")
-            final_clip.write_videofile(
-                output_path,
+            logger.info(f"🚀 Starting GPU-accelerated encoding to {output_path}...")
+            render_video_from_plan(
+                plan, image_path, audio_path, output_path,
                 fps=24,  # Standard fps for efficiency
-                codec="libx264",
-                audio_codec="aac",
+                resize_height=1080,  # Standard HD height
                 temp_audiofile="/tmp/temp-audio.m4a",
-                remove_temp=True,
                 preset="faster",  # Balance speed vs quality
                 threads=16,  # Use more threads on GPU instance
                 ffmpeg_params=[
@@ -267,19 +208,11 @@ def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
                 ]
             )
             
-            # Read and encode output
-            with open(output_path, "rb") as f:
-                video_data = f.read()
-            
-            video_base64 = base64.b64encode(video_data).decode()
+            # Upload output to the presigned URL, or inline it as base64
+            delivered = deliver_output_file(actual_input, output_path)
             
             # Cleanup
             try:
-                audio_clip.close()
-                final_clip.close()
-                bg_clip.close()
-                for clip in subtitle_clips:
-                    clip.close()
                 os.remove(output_path)
             except Exception:
                 pass
@@ -288,8 +221,9 @@ def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
             
             return {
                 "status": "completed",
-                "video_base64": video_base64,
-                "job_id": actual_input["job_id"]
+                "job_id": actual_input["job_id"],
+                "timing": job_timing(job_started),
+                **delivered
             }
             
     except Exception as e:
@@ -300,6 +234,7 @@ def process_video_job(job_input: Dict[str, Any]) -> Dict[str, Any]:
             "status": "failed",
             "error": str(e),
             "traceback": traceback.format_exc()[:1000],  # Limit traceback length
+            "timing": job_timing(job_started),
             "job_id": job_input.get("job_id", "unknown")
         }
 
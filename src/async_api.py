@@ -1,10 +1,13 @@
 import os
+import hmac
 import uuid
 import logging
+import time
 from datetime import datetime
 from typing import Optional
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Depends
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Depends, Request
+from fastapi.responses import FileResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
@@ -17,6 +20,15 @@ from models import (
     VideoJob, JobStatus, JobRequest, JobResponse, 
     create_tables, get_db, SessionLocal
 )
+from runpod_dispatcher import publish_webhook
+from rendering.plan import check_preview_window, build_render_plan
+from rendering.subtitles import SUBTITLE_FORMATS, export_subtitles
+from rendering.mux import OUTPUT_MODES
+from rendering.artifacts import load_plan, inputs_available, delete_job_artifacts
+from rendering.timed_lyrics import parse_timings, decode_timing_file, TIMING_FILE_MAX_BYTES
+from rendering.profiling import PROFILE_FILES, profile_file, stored_profile_kinds
+from rendering.metrics import TRANSFER_BYTES, register_cluster_collector, render_latest
+from routing import RoutingPolicy
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +38,9 @@ logger = logging.getLogger(__name__)
 REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
 redis_client = redis.from_url(REDIS_URL, decode_responses=True)
 
+# Queue depth and worker slots are read from the routing keys at scrape time
+register_cluster_collector(RoutingPolicy(redis_client, remote_available=False))
+
 # Create FastAPI app
 app = FastAPI(title="Instagram Reel Creator - Async API")
 
@@ -46,6 +61,12 @@ app.add_middleware(
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
 
+# Shared secret RunPod must echo back on webhook calls (?token=...); without it
+# the webhook is disabled
+RUNPOD_WEBHOOK_SECRET = os.environ.get("RUNPOD_WEBHOOK_SECRET")
+if os.environ.get("RUNPOD_WEBHOOK_URL") and not RUNPOD_WEBHOOK_SECRET:
+    raise SystemExit("RUNPOD_WEBHOOK_SECRET must be set when RUNPOD_WEBHOOK_URL is")
+
 # File storage paths
 UPLOAD_DIR = os.path.abspath("uploads")
 OUTPUT_DIR = os.path.abspath("output")
@@ -62,41 +83,79 @@ async def save_upload_file(upload_file: UploadFile, destination: str) -> bool:
                 if not chunk:
                     break
                 f.write(chunk)
+                TRANSFER_BYTES.labels("api", "in").inc(len(chunk))
         return True
     except Exception as e:
         logger.error(f"Error saving {upload_file.filename} to {destination}: {e}")
         return False
 
+async def read_timing_upload(timings: Optional[UploadFile]) -> Optional[list]:
+    """Parse an uploaded SRT/VTT/LRC/JSON timing file into cues (400 if invalid)."""
+    if timings is None or not timings.filename:
+        return None
+    try:
+        # One byte past the limit is enough to reject it without reading it all
+        content = await timings.read(TIMING_FILE_MAX_BYTES + 1)
+        TRANSFER_BYTES.labels("api", "in").inc(len(content))
+        return parse_timings(decode_timing_file(content), timings.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/jobs/create-video", response_model=JobResponse)
 async def create_video_job(
     image: UploadFile = File(..., description="Image file (JPEG/PNG)"),
     audio: UploadFile = File(..., description="Audio file (MP3/WAV/FLAC)"),
-    lyrics: str = Form(..., description="Lyrics text for alignment"),
+    lyrics: Optional[str] = Form(None, description="Lyrics text for alignment (optional with a timing file)"),
+    timings: Optional[UploadFile] = File(None, description="Timed lyrics (SRT/VTT/LRC/JSON); skips transcription"),
     language: Optional[str] = Form(None, description="Language code (e.g., 'en', 'hi', etc.)"),
     font_size: Optional[int] = Form(45, description="Font size for subtitles"),
     font_color: Optional[str] = Form("yellow", description="Font color for subtitles"),
     words_per_group: Optional[int] = Form(5, description="Number of words to show together (max 5)"),
     timing_offset: Optional[float] = Form(0.0, description="Global timing offset in seconds"),
     min_duration: Optional[float] = Form(1.0, description="Minimum duration for each subtitle in seconds"),
-    alignment_mode: Optional[str] = Form("auto", description="Alignment mode: 'auto', 'elevenlabs', or 'even'"),
+    alignment_mode: Optional[str] = Form("auto", description="Alignment mode: 'auto', 'elevenlabs', 'even' or 'vad' (offline)"),
     debug_mode: Optional[bool] = Form(False, description="Enable debug mode with timing information"),
+    preview: Optional[bool] = Form(False, description="Render a fast low-resolution draft instead of the final video"),
+    preview_start: Optional[float] = Form(None, description="Preview only: start of the window to render, in seconds"),
+    preview_end: Optional[float] = Form(None, description="Preview only: end of the window to render, in seconds"),
+    output_mode: Optional[str] = Form("burn", description="'burn' (captions drawn into the video) or 'soft' (MP4 subtitle track)"),
+    profile: Optional[bool] = Form(False, description="Capture a CPU and memory profile of the render (GET /admin/profile/{job_id})"),
     db: Session = Depends(get_db)
 ):
     """
     Create a new video processing job.
     Returns immediately with job_id for status polling.
+    
+    With preview=true the job renders a small, low-fps draft (optionally only
+    preview_start..preview_end) using the same alignment as the final render.
+    With output_mode=soft, captions are muxed as a subtitle track next to a
+    still-image video, which renders in seconds.
+    With a timing file, its cues are used as they are: no transcription.
     """
     logger.info("=== Creating new video job ===")
     
     # Validate input parameters
-    if not lyrics or not lyrics.strip():
-        raise HTTPException(status_code=400, detail="Lyrics text is required")
+    timed_cues = await read_timing_upload(timings)
+    if timed_cues:
+        alignment_mode = "provided"
+        if not lyrics or not lyrics.strip():
+            lyrics = "\n".join(c["text"] for c in timed_cues)
+    elif not lyrics or not lyrics.strip():
+        raise HTTPException(status_code=400, detail="Lyrics text or a timing file is required")
     
     # Enforce maximum words per group limit
     if words_per_group > 5:
         words_per_group = 5
         logger.info(f"Limited words_per_group to maximum of 5")
     
+    try:
+        check_preview_window(preview, preview_start, preview_end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if output_mode not in OUTPUT_MODES:
+        raise HTTPException(status_code=400, detail=f"output_mode must be one of: {', '.join(OUTPUT_MODES)}")
+    
     img_ext = os.path.splitext(image.filename)[1].lower()
     if img_ext not in [".jpg", ".jpeg", ".png"]:
         raise HTTPException(status_code=400, detail="Image must be JPG or PNG")
@@ -105,8 +164,11 @@ async def create_video_job(
     if aud_ext not in [".mp3", ".wav", ".flac"]:
         raise HTTPException(status_code=400, detail="Audio must be MP3, WAV, or FLAC")
     
-    # Create job record
+    # Create job record (the ID is set here: the column default only applies
+    # on flush, and the upload file names need it)
+    job_id = str(uuid.uuid4())
     job = VideoJob(
+        id=job_id,
         lyrics=lyrics,
         language=language,
         font_size=font_size,
@@ -116,14 +178,14 @@ async def create_video_job(
         min_duration=min_duration,
         alignment_mode=alignment_mode,
         debug_mode=debug_mode,
-        image_filename=f"{job.id}_image{img_ext}" if 'job' in locals() else None,
-        audio_filename=f"{job.id}_audio{aud_ext}" if 'job' in locals() else None
+        preview=preview,
+        preview_start=preview_start if preview else None,
+        preview_end=preview_end if preview else None,
+        output_mode=output_mode,
+        image_filename=f"{job_id}_image{img_ext}",
+        audio_filename=f"{job_id}_audio{aud_ext}"
     )
     
-    # Generate filenames with job ID
-    job.image_filename = f"{job.id}_image{img_ext}"
-    job.audio_filename = f"{job.id}_audio{aud_ext}"
-    
     db.add(job)
     db.commit()
     db.refresh(job)
@@ -157,8 +219,16 @@ async def create_video_job(
         "timing_offset": timing_offset,
         "min_duration": min_duration,
         "alignment_mode": alignment_mode,
-        "debug_mode": debug_mode
+        "debug_mode": debug_mode,
+        "preview": preview,
+        "preview_start": preview_start,
+        "preview_end": preview_end,
+        "output_mode": output_mode,
+        "profile": profile,
+        "enqueued_at": time.time()
     }
+    if timed_cues:
+        job_data["timed_cues"] = timed_cues
     
     redis_client.lpush("video_jobs", json.dumps(job_data))
     
@@ -166,6 +236,185 @@ async def create_video_job(
     
     return JobResponse.from_video_job(job)
 
+@app.post("/jobs/{job_id}/rerender", response_model=JobResponse)
+async def rerender_job(
+    job_id: str,
+    font_size: Optional[int] = Form(None, description="Font size for subtitles"),
+    font_color: Optional[str] = Form(None, description="Font color for subtitles"),
+    words_per_group: Optional[int] = Form(None, description="Number of words to show together (max 5)"),
+    timing_offset: Optional[float] = Form(None, description="Global timing offset in seconds"),
+    min_duration: Optional[float] = Form(None, description="Minimum duration for each subtitle in seconds"),
+    debug_mode: Optional[bool] = Form(None, description="Enable debug mode with timing information"),
+    lyrics: Optional[str] = Form(None, description="Corrected lyrics (forces a new alignment)"),
+    language: Optional[str] = Form(None, description="Language code (forces a new alignment)"),
+    alignment_mode: Optional[str] = Form(None, description="Alignment mode (forces a new alignment)"),
+    preview: Optional[bool] = Form(False, description="Render a fast low-resolution draft instead of the final video"),
+    preview_start: Optional[float] = Form(None, description="Preview only: start of the window to render, in seconds"),
+    preview_end: Optional[float] = Form(None, description="Preview only: end of the window to render, in seconds"),
+    output_mode: Optional[str] = Form(None, description="'burn' or 'soft'"),
+    profile: Optional[bool] = Form(False, description="Capture a CPU and memory profile of the render (GET /admin/profile/{job_id})"),
+    db: Session = Depends(get_db)
+):
+    """
+    Render an existing job again with changed settings, as a new job.
+    Settings not given are taken from the job. The stored alignment, background
+    and encoded audio of the original job are reused, so a restyle only
+    composites and encodes; changing lyrics, language or alignment_mode realigns.
+    """
+    source = db.query(VideoJob).filter(VideoJob.id == job_id).first()
+    if not source:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    # Re-renders of re-renders all share the original job's artifacts
+    root_id = source.source_job_id or source.id
+    root = source if root_id == source.id else db.query(VideoJob).filter(VideoJob.id == root_id).first()
+    image_path = os.path.join(UPLOAD_DIR, root.image_filename) if root and root.image_filename else None
+    audio_path = os.path.join(UPLOAD_DIR, root.audio_filename) if root and root.audio_filename else None
+    if not inputs_available(root_id, image_path, audio_path):
+        raise HTTPException(status_code=400, detail="The image and audio of this job are no longer available")
+    
+    def pick(value, default):
+        return default if value is None else value
+    
+    lyrics = lyrics if lyrics and lyrics.strip() else source.lyrics
+    words_per_group = min(pick(words_per_group, source.words_per_group), 5)
+    output_mode = pick(output_mode, source.output_mode or "burn")
+    if output_mode not in OUTPUT_MODES:
+        raise HTTPException(status_code=400, detail=f"output_mode must be one of: {', '.join(OUTPUT_MODES)}")
+    try:
+        check_preview_window(preview, preview_start, preview_end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    stored = load_plan(source.id) or load_plan(root_id)
+    alignment_mode = pick(alignment_mode, source.alignment_mode)
+    timed_cues = None
+    if alignment_mode == "provided":
+        # Uploaded timings are kept only in the stored plan
+        timed_cues = ((stored or {}).get("alignment") or {}).get("inputs", {}).get("timed_cues")
+        if not timed_cues:
+            raise HTTPException(status_code=400, detail="The uploaded timings of this job are no longer available")
+    
+    job = VideoJob(
+        lyrics=lyrics,
+        language=pick(language, source.language),
+        font_size=pick(font_size, source.font_size),
+        font_color=pick(font_color, source.font_color),
+        words_per_group=words_per_group,
+        timing_offset=pick(timing_offset, source.timing_offset),
+        min_duration=pick(min_duration, source.min_duration),
+        alignment_mode=alignment_mode,
+        debug_mode=pick(debug_mode, source.debug_mode),
+        preview=preview,
+        preview_start=preview_start if preview else None,
+        preview_end=preview_end if preview else None,
+        output_mode=output_mode,
+        source_job_id=root_id
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    
+    job_data = {
+        "job_id": job.id,
+        "source_job_id": root_id,
+        "image_path": image_path or "",
+        "audio_path": audio_path or "",
+        "audio_duration": stored["duration"] if stored else None,
+        "lyrics": job.lyrics,
+        "language": job.language,
+        "font_size": job.font_size,
+        "font_color": job.font_color,
+        "words_per_group": job.words_per_group,
+        "timing_offset": job.timing_offset,
+        "min_duration": job.min_duration,
+        "alignment_mode": job.alignment_mode,
+        "debug_mode": job.debug_mode,
+        "preview": preview,
+        "preview_start": preview_start,
+        "preview_end": preview_end,
+        "output_mode": output_mode,
+        "profile": profile,
+        "enqueued_at": time.time()
+    }
+    if timed_cues:
+        job_data["timed_cues"] = timed_cues
+    
+    redis_client.lpush("video_jobs", json.dumps(job_data))
+    
+    logger.info(f"✓ Created re-render job {job.id} of {root_id} and added to queue")
+    
+    return JobResponse.from_video_job(job)
+
+@app.post("/subtitles")
+async def export_subtitles_endpoint(
+    audio: UploadFile = File(..., description="Audio file (MP3/WAV/FLAC)"),
+    lyrics: Optional[str] = Form(None, description="Lyrics text for alignment (optional with a timing file)"),
+    timings: Optional[UploadFile] = File(None, description="Timed lyrics (SRT/VTT/LRC/JSON); skips transcription"),
+    format: str = Form("vtt", description="Output format: 'vtt', 'srt', 'ass' or 'json'"),
+    granularity: str = Form("group", description="'group' (as shown in the video) or 'line' (one cue per lyrics line)"),
+    language: Optional[str] = Form(None, description="Language code (e.g., 'en', 'hi', etc.)"),
+    font_size: Optional[int] = Form(45, description="Font size (ASS only)"),
+    font_color: Optional[str] = Form("yellow", description="Font color (ASS only)"),
+    words_per_group: Optional[int] = Form(5, description="Number of words to show together (max 5)"),
+    timing_offset: Optional[float] = Form(0.0, description="Global timing offset in seconds"),
+    min_duration: Optional[float] = Form(1.0, description="Minimum duration for each subtitle in seconds"),
+    alignment_mode: Optional[str] = Form("auto", description="Alignment mode: 'auto', 'elevenlabs', 'even' or 'vad' (offline)")
+):
+    """
+    Align lyrics and return timed subtitles directly, without rendering a video.
+    Uses the same alignment, optimization and timing as a video job, and the
+    shared transcription cache. With a timing file, converts its cues instead.
+    """
+    format = format.lower()
+    if format not in SUBTITLE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(SUBTITLE_FORMATS)}")
+    if granularity not in ("group", "line"):
+        raise HTTPException(status_code=400, detail="granularity must be 'group' or 'line'")
+    timed_cues = await read_timing_upload(timings)
+    if not timed_cues and (not lyrics or not lyrics.strip()):
+        raise HTTPException(status_code=400, detail="Lyrics text or a timing file is required")
+    
+    aud_ext = os.path.splitext(audio.filename)[1].lower()
+    if aud_ext not in [".mp3", ".wav", ".flac"]:
+        raise HTTPException(status_code=400, detail="Audio must be MP3, WAV, or FLAC")
+    
+    request_id = str(uuid.uuid4())
+    audio_path = os.path.join(UPLOAD_DIR, f"{request_id}_subtitles{aud_ext}")
+    if not await save_upload_file(audio, audio_path):
+        raise HTTPException(status_code=500, detail="Failed to save audio file")
+    
+    try:
+        # Transcription and alignment block; keep them off the event loop
+        plan = await run_in_threadpool(build_render_plan, {
+            "job_id": request_id,
+            "audio_path": audio_path,
+            "lyrics": lyrics,
+            "language": language,
+            "font_size": font_size,
+            "font_color": font_color,
+            "words_per_group": min(words_per_group, 5),
+            "timing_offset": timing_offset,
+            "min_duration": min_duration,
+            "alignment_mode": alignment_mode,
+            "timed_cues": timed_cues
+        })
+        content = export_subtitles(plan, format, granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        try:
+            os.remove(audio_path)
+        except OSError:
+            pass
+    
+    logger.info(f"✓ Exported {len(plan['cues'])} captions as {format}")
+    return Response(
+        content=content,
+        media_type=SUBTITLE_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="subtitles.{format}"'}
+    )
+
 @app.get("/jobs/{job_id}", response_model=JobResponse)
 async def get_job_status(job_id: str, db: Session = Depends(get_db)):
     """Get job status and details."""
@@ -204,6 +453,7 @@ async def download_video(job_id: str, db: Session = Depends(get_db)):
             try:
                 # Call the parent to serve the file
                 await super().__call__(scope, receive, send)
+                TRANSFER_BYTES.labels("api", "out").inc(int(self.headers.get("content-length", 0)))
             finally:
                 # Delete the file after serving
                 if self.file_path_to_delete and os.path.exists(self.file_path_to_delete):
@@ -222,7 +472,7 @@ async def download_video(job_id: str, db: Session = Depends(get_db)):
     return AutoDeleteFileResponse(
         output_path,
         media_type="video/mp4",
-        filename=f"video_{job_id}.mp4",
+        filename=f"preview_{job_id}.mp4" if job.preview else f"video_{job_id}.mp4",
         file_path_to_delete=output_path,
         job_to_update=job,
         db_session=db
@@ -252,6 +502,8 @@ async def delete_job(job_id: str, db: Session = Depends(get_db)):
         except Exception as e:
             logger.warning(f"Failed to delete file {file_path}: {e}")
     
+    delete_job_artifacts(job.id)
+    
     # Delete job record
     db.delete(job)
     db.commit()
@@ -275,6 +527,32 @@ async def list_jobs(
     
     return [JobResponse.from_video_job(job) for job in jobs]
 
+@app.post("/runpod/webhook")
+async def runpod_webhook(request: Request, token: Optional[str] = None):
+    """
+    Completion callback for RunPod jobs submitted by the dispatcher.
+    Wakes the dispatcher via Redis so it doesn't wait for its next poll; the
+    dispatcher then reads the result from RunPod, never from this request.
+    """
+    if not RUNPOD_WEBHOOK_SECRET:
+        raise HTTPException(status_code=404, detail="Webhook not configured")
+    if not token or not hmac.compare_digest(token.encode(), RUNPOD_WEBHOOK_SECRET.encode()):
+        raise HTTPException(status_code=403, detail="Invalid webhook token")
+    
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Webhook body is not JSON")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Webhook body is not a JSON object")
+    try:
+        publish_webhook(redis_client, payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    logger.info(f"Received RunPod webhook for {payload.get('id')}: {payload.get('status')}")
+    return {"received": True}
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
@@ -292,6 +570,12 @@ async def health_check():
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: API transfers, queue depth and age, worker slots, process RSS."""
+    body, content_type = await run_in_threadpool(render_latest)
+    return Response(content=body, media_type=content_type)
+
 @app.get("/admin/debug/{job_id}")
 async def debug_job_files(job_id: str, db: Session = Depends(get_db)):
     """Debug endpoint to check job files and status."""
@@ -303,7 +587,8 @@ async def debug_job_files(job_id: str, db: Session = Depends(get_db)):
         "job_id": job.id,
         "status": job.status,
         "output_filename": job.output_filename,
-        "files_check": {}
+        "files_check": {},
+        "profile": stored_profile_kinds(job.id)
     }
     
     # Check if files exist
@@ -356,6 +641,22 @@ async def debug_job_files(job_id: str, db: Session = Depends(get_db)):
     
     return debug_info
 
+@app.get("/admin/profile/{job_id}")
+async def get_job_profile(job_id: str, kind: str = "cpu"):
+    """
+    Stored profile of a job run with profile=true (see rendering.profiling).
+    kind=cpu and kind=memory return folded stacks for flamegraph.pl or
+    speedscope; kind=summary returns stage timings and memory per stage boundary.
+    """
+    if kind not in PROFILE_FILES:
+        raise HTTPException(status_code=400, detail=f"kind must be one of: {', '.join(PROFILE_FILES)}")
+    # The memory flamegraph is folded from a tracemalloc snapshot on first request
+    path = await run_in_threadpool(profile_file, job_id, kind)
+    if not path:
+        raise HTTPException(status_code=404, detail="No profile stored for this job")
+    media_type = "application/json" if kind == "summary" else "text/plain; charset=utf-8"
+    return FileResponse(path, media_type=media_type, filename=f"{job_id}_{PROFILE_FILES[kind]}")
+
 @app.post("/admin/cleanup")
 async def cleanup_old_jobs(max_age_hours: int = 24, db: Session = Depends(get_db)):
     """
@@ -396,6 +697,8 @@ async def cleanup_old_jobs(max_age_hours: int = 24, db: Session = Depends(get_db
             except Exception as e:
                 logger.warning(f"Cleanup: Failed to delete file {file_path}: {e}")
         
+        delete_job_artifacts(job.id)
+        
         # Delete job record
         db.delete(job)
         deleted_count += 1
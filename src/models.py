@@ -2,7 +2,7 @@ import os
 from sqlalchemy import Column, String, DateTime, Float, Integer, Text, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from datetime import datetime
 from enum import Enum
 import uuid
@@ -39,6 +39,17 @@ class VideoJob(Base):
     alignment_mode = Column(String, default="auto")
     debug_mode = Column(Boolean, default=False)
     
+    # Draft preview: small, low fps, optionally only [preview_start, preview_end)
+    preview = Column(Boolean, default=False)
+    preview_start = Column(Float, nullable=True)
+    preview_end = Column(Float, nullable=True)
+    
+    # 'burn' draws captions into the frames, 'soft' muxes them as an MP4 subtitle track
+    output_mode = Column(String, default="burn")
+    
+    # Re-renders: the job whose uploads and artifacts this one reuses (always the original)
+    source_job_id = Column(String, nullable=True)
+    
     # Results
     output_filename = Column(String, nullable=True)
     error_message = Column(Text, nullable=True)
@@ -59,6 +70,10 @@ class JobRequest(BaseModel):
     min_duration: Optional[float] = 1.0
     alignment_mode: Optional[str] = "auto"
     debug_mode: Optional[bool] = False
+    preview: Optional[bool] = False
+    preview_start: Optional[float] = None
+    preview_end: Optional[float] = None
+    output_mode: Optional[str] = "burn"
 
 class JobResponse(BaseModel):
     job_id: str
@@ -70,6 +85,9 @@ class JobResponse(BaseModel):
     error_message: Optional[str] = None
     output_filename: Optional[str] = None
     processing_time_seconds: Optional[float] = None
+    preview: bool = False
+    output_mode: str = "burn"
+    source_job_id: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
     
@@ -85,7 +103,10 @@ class JobResponse(BaseModel):
             progress_percentage=job.progress_percentage,
             error_message=job.error_message,
             output_filename=job.output_filename,
-            processing_time_seconds=job.processing_time_seconds
+            processing_time_seconds=job.processing_time_seconds,
+            preview=bool(job.preview),
+            output_mode=job.output_mode or "burn",
+            source_job_id=job.source_job_id
         )
 
 # Database setup
@@ -97,6 +118,24 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+
+def add_missing_columns():
+    """
+    create_all() doesn't alter existing tables: add columns introduced since
+    the database was created, so older jobs.db files keep working.
+    """
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
 
 def get_db():
     db = SessionLocal()
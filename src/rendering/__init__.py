@@ -0,0 +1,37 @@
+"""
+Video rendering pipeline, importable without the web app.
+
+Planning and rendering:
+    rendering.plan          render plans: build on the CPU tier, render anywhere
+    rendering.media         fonts, audio loading, ffmpeg helpers
+    rendering.mux           ffmpeg-only render paths (soft-subtitle MP4s)
+    rendering.artifacts     per-job plans and outputs kept for cheap re-renders
+    rendering.subtitles     WebVTT, SRT, ASS and JSON export of a plan's captions
+
+Lyrics and timing:
+    rendering.timing        timestamp parsing/formatting, caption timing optimization
+    rendering.lyrics        lyrics preprocessing and transliteration
+    rendering.timed_lyrics  bring-your-own SRT/WebVTT/LRC/JSON timings
+    rendering.alignment     lyrics-to-audio alignment
+    rendering.vad           offline vocal-activity alignment
+    rendering.words         columnar view of Scribe word timings
+
+Transcription:
+    rendering.stt           ElevenLabs Scribe transcription and captions
+    rendering.stt_client    pooled HTTP session with retries and hedging
+    rendering.stt_limiter   cluster-wide Scribe rate limiter over Redis
+    rendering.stt_chunks    chunked, concurrent transcription of long audio
+    rendering.fingerprint   acoustic fingerprints to reuse transcriptions
+    rendering.cache         on-disk cache keyed by audio content
+    rendering.pcm           decoded-PCM scratch cache shared by the stages above
+
+Instrumentation:
+    rendering.stages        per-job stage timings
+    rendering.metrics       Prometheus metrics (no-ops without prometheus_client)
+    rendering.profiling     opt-in per-job profiling
+
+Submodules are not imported here, and heavy dependencies (MoviePy, PIL,
+pydub, numpy, indic_transliteration, requests_toolbelt, redis) are imported
+inside the functions that use them, so each entry point only pays for what
+it calls.
+"""
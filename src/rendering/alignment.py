@@ -0,0 +1,409 @@
+"""
+Lyrics-to-audio alignment: matching provided lyrics against Scribe word
+timings, with offline vocal-activity alignment (rendering.vad) and then even
+distribution as the fallbacks.
+"""
+import logging
+from typing import List, Optional
+
+import numpy as np
+import webvtt
+
+from rendering.timing import seconds_to_srt_timestamp
+from rendering.lyrics import preprocess_lyrics
+from rendering.media import probe_audio_duration, load_audio_with_fallback
+from rendering.stt import ELEVENLABS_API_KEY, transcribe_audio_with_elevenlabs, elevenlabs_to_webvtt
+from rendering.vad import align_lyrics_with_vad
+from rendering.words import WordTable, word_table, normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+def filter_section_markers(lyrics_lines: List[str]) -> List[str]:
+    """Filter out organization markers like 'Verse 1', 'Chorus', etc."""
+    filtered_lyrics = []
+    for line in lyrics_lines:
+        if (line.upper().startswith("VERSE") or 
+            line.upper().startswith("CHORUS") or 
+            line.upper().startswith("BRIDGE") or
+            (line.isupper() and len(line) < 15)):
+            continue
+        filtered_lyrics.append(line)
+    return filtered_lyrics
+
+
+def align_lyrics_with_vad_or_even(lyrics_lines: List[str], audio_path: str, audio_duration: float) -> List[dict]:
+    """Offline alignment: vocal-activity regions, or even distribution if none are found."""
+    aligned_segments = align_lyrics_with_vad(filter_section_markers(lyrics_lines), audio_path)
+    if aligned_segments:
+        logger.info(f"✓ Aligned {len(aligned_segments)} lyrics lines to vocal activity (offline)")
+        return aligned_segments
+    logger.warning("⚠️ No vocal activity detected, distributing lyrics evenly")
+    return align_lyrics_with_scribe(lyrics_lines, audio_duration)
+
+
+def align_lyrics_with_scribe(
+    lyrics_lines: List[str],
+    audio_duration: float
+) -> List[dict]:
+    """
+    Evenly distribute lyrics across the audio duration when only lyrics are provided.
+    
+    Args:
+        lyrics_lines: List of lyrics lines
+        audio_duration: Total duration of the audio in seconds
+        
+    Returns:
+        List of dicts with 'start', 'end', 'text' using provided lyrics
+    """
+    if not lyrics_lines or audio_duration <= 0:
+        return []
+    
+    filtered_lyrics = filter_section_markers(lyrics_lines)
+    
+    # Evenly distribute the lyrics across the audio duration
+    time_per_line = audio_duration / len(filtered_lyrics)
+    aligned_segments = []
+    
+    for i, line in enumerate(filtered_lyrics):
+        start_time = i * time_per_line
+        end_time = (i + 1) * time_per_line
+        
+        aligned_segments.append({
+            'start': start_time,
+            'end': end_time,
+            'text': line
+        })
+    
+    return aligned_segments
+
+
+def align_lyrics_with_words(
+    lyrics_lines: List[str], 
+    word_timings,
+    audio_duration: float
+) -> List[dict]:
+    """
+    Perform fine-grained word-level alignment between provided lyrics and transcribed words.
+    Uses a more robust approach to match words.
+    
+    Args:
+        lyrics_lines: List of lyrics lines to align
+        word_timings: WordTable of the Scribe response (or a list of its word objects)
+        audio_duration: Duration of the audio in seconds
+        
+    Returns:
+        List of dicts with 'start', 'end', 'text' for each aligned segment
+        Returns an empty list if no matches were found (to trigger using ElevenLabs transcription)
+    """
+    table = word_table(word_timings)
+    if not lyrics_lines or not len(table) or audio_duration <= 0:
+        return []
+    
+    logger.info(f"Starting improved alignment with {len(lyrics_lines)} lines and {len(table)} transcribed words")
+    
+    # Normalize both lyrics and transcribed words for better matching
+    normalized_lyrics_lines = []
+    for line in lyrics_lines:
+        # Normalize: lowercase, remove punctuation, excess whitespace
+        norm_line = normalize_text(line)
+        if norm_line:  # Skip empty lines
+            normalized_lyrics_lines.append({
+                'text': norm_line,
+                'original': line
+            })
+    
+    # Group transcribed words into sentences for better matching with lyrics lines
+    segment, segment_starts, segment_ends = table.sentence_segments(audio_duration)
+    
+    logger.info(f"Normalized to {len(normalized_lyrics_lines)} lyrics lines and {len(segment_starts)} transcribed segments")
+    
+    # If we have very few transcribed segments, use more granular approach
+    if len(segment_starts) < len(normalized_lyrics_lines) / 2:
+        logger.warning("Too few transcribed segments. Using word-by-word approach.")
+        segment, segment_starts, segment_ends = table.word_segments()
+    
+    # Token-set overlap (intersection over union) of each line with every segment
+    similarities = table.line_similarities([l['text'] for l in normalized_lyrics_lines], segment, len(segment_starts))
+    
+    # First try to match entire lines
+    aligned_segments = []
+    used = np.zeros(len(segment_starts), dtype=bool)
+    match_count = 0
+    
+    # For each lyrics line, take the best unused segment (the first one on ties)
+    for lyrics_idx, (lyrics_line, similarity) in enumerate(zip(normalized_lyrics_lines, similarities)):
+        scores = np.where(used, -1.0, similarity)
+        best_match_idx = int(np.argmax(scores)) if len(scores) else -1
+        best_match_score = float(scores[best_match_idx]) if best_match_idx >= 0 else 0.0
+        
+        if best_match_idx >= 0 and best_match_score > 0.3:  # Minimum threshold
+            # Add this match
+            aligned_segments.append({
+                'start': float(segment_starts[best_match_idx]),
+                'end': float(segment_ends[best_match_idx]),
+                'text': lyrics_line['original'],
+                'match_score': best_match_score
+            })
+            used[best_match_idx] = True
+            match_count += 1
+            logger.info(f"Matched line {lyrics_idx+1}: '{lyrics_line['original'][:30]}...' with score {best_match_score:.2f}")
+        else:
+            logger.warning(f"No match found for line {lyrics_idx+1}: '{lyrics_line['original'][:30]}...'")
+    
+    # Log match success rate
+    success_rate = (match_count / len(normalized_lyrics_lines)) * 100 if normalized_lyrics_lines else 0
+    logger.info(f"Match success rate: {success_rate:.1f}% ({match_count}/{len(normalized_lyrics_lines)} lines matched)")
+    
+    # If almost no matches were found, return empty list to trigger using ElevenLabs transcription directly
+    if success_rate < 10 and len(normalized_lyrics_lines) > 5:
+        logger.warning("⚠️ Very low match rate detected. Will use ElevenLabs transcription directly.")
+        return []
+    
+    # Only continue with gap filling if we have at least some matches
+    if match_count > 0:
+        # For unmatched lyrics lines, distribute among the gaps
+        matched_indices = {lyrics_lines.index(s['text']) for s in aligned_segments if s['text'] in lyrics_lines}
+        unmatched_indices = [i for i in range(len(normalized_lyrics_lines)) if i not in matched_indices]
+        
+        if unmatched_indices and aligned_segments:
+            logger.info(f"Distributing {len(unmatched_indices)} unmatched lines")
+            
+            # Sort aligned segments by start time
+            aligned_segments.sort(key=lambda x: x['start'])
+            
+            # Find gaps
+            gaps = []
+            # Gap at the beginning?
+            if aligned_segments[0]['start'] > 1.0:
+                gaps.append({
+                    'start': 0,
+                    'end': aligned_segments[0]['start'],
+                    'duration': aligned_segments[0]['start']
+                })
+            
+            # Gaps between segments
+            for i in range(1, len(aligned_segments)):
+                gap_start = aligned_segments[i-1]['end']
+                gap_end = aligned_segments[i]['start']
+                duration = gap_end - gap_start
+                
+                if duration > 0.5:  # Only consider gaps over 0.5 seconds
+                    gaps.append({
+                        'start': gap_start,
+                        'end': gap_end,
+                        'duration': duration
+                    })
+            
+            # Gap at the end?
+            if aligned_segments[-1]['end'] < audio_duration - 1.0:
+                gaps.append({
+                    'start': aligned_segments[-1]['end'],
+                    'end': audio_duration,
+                    'duration': audio_duration - aligned_segments[-1]['end']
+                })
+            
+            # If we have gaps, distribute unmatched lines
+            if gaps:
+                # Sort gaps by duration (largest first)
+                gaps.sort(key=lambda x: x['duration'], reverse=True)
+                
+                # Distribute unmatched lines across gaps, prioritizing larger gaps
+                remaining_lines = [normalized_lyrics_lines[i]['original'] for i in unmatched_indices]
+                
+                # Optimized distribution algorithm
+                if len(remaining_lines) <= len(gaps):
+                    # One line per gap, starting with largest gaps
+                    for i, line in enumerate(remaining_lines):
+                        if i < len(gaps):
+                            gap = gaps[i]
+                            aligned_segments.append({
+                                'start': gap['start'],
+                                'end': gap['end'],
+                                'text': line,
+                                'match_score': 0  # Indicate this was gap-filled
+                            })
+                else:
+                    # Multiple lines per gap
+                    total_gap_duration = sum(g['duration'] for g in gaps)
+                    time_per_line = total_gap_duration / len(remaining_lines)
+                    
+                    line_index = 0
+                    for gap in gaps:
+                        # How many lines can fit in this gap?
+                        lines_in_gap = max(1, int(gap['duration'] / time_per_line))
+                        lines_in_gap = min(lines_in_gap, len(remaining_lines) - line_index)
+                        
+                        if lines_in_gap <= 0:
+                            continue
+                        
+                        time_per_line_in_gap = gap['duration'] / lines_in_gap
+                        
+                        for i in range(lines_in_gap):
+                            if line_index < len(remaining_lines):
+                                start_time = gap['start'] + i * time_per_line_in_gap
+                                end_time = start_time + time_per_line_in_gap
+                            
+                                aligned_segments.append({
+                                    'start': start_time,
+                                    'end': end_time,
+                                    'text': remaining_lines[line_index],
+                                    'match_score': 0  # Indicate this was gap-filled
+                                })
+                                line_index += 1
+    
+    # If we still have no aligned segments at all, return empty list to trigger using ElevenLabs transcription
+    if not aligned_segments:
+        logger.warning("No successful matches found. Will use ElevenLabs transcription directly.")
+        return []
+    
+    # Final sort by start time
+    aligned_segments.sort(key=lambda x: x['start'])
+    
+    # Remove any overlaps
+    for i in range(1, len(aligned_segments)):
+        if aligned_segments[i]['start'] < aligned_segments[i-1]['end']:
+            aligned_segments[i]['start'] = aligned_segments[i-1]['end']
+            
+    # Log final alignment for debugging
+    logger.info(f"Final alignment: {len(aligned_segments)} segments")
+    for i, segment in enumerate(aligned_segments[:5]):  # Log first 5 segments
+        logger.info(f"  {i+1}. {segment['start']:.2f}s - {segment['end']:.2f}s: '{segment['text'][:30]}...'")
+    if len(aligned_segments) > 5:
+        logger.info(f"  ... and {len(aligned_segments)-5} more segments")
+    
+    return aligned_segments
+
+
+def transcribe_and_align_lyrics(
+    audio_path: str,
+    lyrics_text: str,
+    language: Optional[str] = None,
+    alignment_mode: str = 'auto',
+    words_per_group: int = 5,
+    with_words: bool = False
+):
+    """
+    1) If ElevenLabs API key is available:
+       - Use ElevenLabs Scribe to get timing information
+       - If mode is 'elevenlabs', use ElevenLabs transcription directly
+       - If mode is 'auto', attempt to align with provided lyrics
+       - If alignment fails or match rate is low, use ElevenLabs transcription directly
+    2) If no ElevenLabs API key or transcription fails (or mode is 'vad'):
+       - Align lyrics lines to vocal-active regions of the audio (offline)
+       - Only if none are found, evenly distribute lyrics across audio duration
+    
+    Args:
+        audio_path: Path to the audio file
+        lyrics_text: Raw lyrics text
+        language: Optional language code
+        alignment_mode: 'auto', 'elevenlabs', 'even' or 'vad' (offline, no ElevenLabs call)
+        with_words: also return the WordTable of the transcription
+        
+    Returns:
+        WebVTT object with aligned lyrics; with `with_words`, (vtt, WordTable),
+        the table being None when the timing did not come from Scribe
+    """
+    def result(vtt, words=None):
+        return (vtt, words) if with_words else vtt
+    
+    # Process lyrics into lines
+    lyrics_lines = preprocess_lyrics(lyrics_text)
+    if not lyrics_lines:
+        logger.warning("⚠️ No valid lyrics provided. Cannot create subtitles.")
+        raise ValueError("Valid lyrics are required. Please provide lyrics text.")
+    
+    logger.info(f"✓ Processed lyrics text into {len(lyrics_lines)} lines")
+    
+    # Get audio duration for alignment (header probe first, decoding only as a fallback)
+    try:
+        audio_duration = probe_audio_duration(audio_path)
+        if audio_duration is None:
+            temp_audio_clip, audio_duration = load_audio_with_fallback(audio_path)
+            temp_audio_clip.close()
+        logger.info(f"✓ Audio duration: {audio_duration:.2f} seconds")
+    except ValueError as e:
+        logger.error(f"❌ Error getting audio duration: {e}")
+        raise ValueError(f"Could not determine audio duration: {str(e)}")
+    
+    if alignment_mode == 'vad':
+        logger.info("Using offline vocal-activity alignment as specified by alignment_mode='vad'")
+        return result(segments_to_webvtt(align_lyrics_with_vad_or_even(lyrics_lines, audio_path, audio_duration)))
+    
+    try:
+        # First try using ElevenLabs Scribe for precise timing
+        if ELEVENLABS_API_KEY:
+            logger.info("Attempting to use ElevenLabs Scribe for transcription and alignment...")
+            
+            elevenlabs_response = transcribe_audio_with_elevenlabs(audio_path, language)
+            
+            if elevenlabs_response and 'words' in elevenlabs_response:
+                # If mode is 'elevenlabs', use ElevenLabs transcription directly
+                if alignment_mode == 'elevenlabs':
+                    logger.info("Using ElevenLabs transcription directly as specified by alignment_mode='elevenlabs'")
+                    vtt = elevenlabs_to_webvtt(elevenlabs_response, transliterate=False, words_per_group=words_per_group)
+                    logger.info(f"✓ Created WebVTT with {len(vtt.captions)} captions using ElevenLabs transcription")
+                    return result(vtt, WordTable.from_response(elevenlabs_response) if with_words else None)
+                
+                # Parse the words once; alignment and the caption fallback share it
+                words = WordTable.from_response(elevenlabs_response)
+                
+                logger.info(f"✓ Using fine-grained word alignment with {len(words)} transcribed words")
+                
+                # Log a sample of words for debugging
+                if len(words):
+                    logger.info("Sample words with timing (first 3):")
+                    for i in range(min(3, len(words))):
+                        logger.info(f"  {i+1}. '{words.texts[i]}' at {words.starts[i]:.2f}s - {words.ends[i]:.2f}s")
+                
+                # Try to align provided lyrics with the transcribed words
+                aligned_segments = align_lyrics_with_words(lyrics_lines, words, audio_duration)
+                
+                # If alignment failed or returned empty list (low match rate), use ElevenLabs directly
+                if not aligned_segments:
+                    logger.warning("⚠️ No successful matches between provided lyrics and transcription.")
+                    logger.warning("⚠️ Using ElevenLabs transcription text directly for better timing.")
+                    
+                    # Convert ElevenLabs response directly to WebVTT
+                    vtt = elevenlabs_to_webvtt(words, transliterate=False)
+                    logger.info(f"✓ Created WebVTT with {len(vtt.captions)} captions using ElevenLabs transcription")
+                    return result(vtt, words)
+                else:
+                    logger.info(f"✓ Successfully aligned {len(aligned_segments)} lyrics segments using ElevenLabs timing")
+                    
+                    # Convert to WebVTT
+                    vtt = webvtt.WebVTT()
+                    for s in aligned_segments:
+                        start_str = seconds_to_srt_timestamp(s["start"])
+                        end_str = seconds_to_srt_timestamp(s["end"])
+                        vtt.captions.append(webvtt.Caption(start_str, end_str, s["text"]))
+                    
+                    logger.info(f"✓ Created WebVTT with {len(vtt.captions)} captions")
+                    return result(vtt, words)
+        else:
+            logger.warning("⚠️ No ElevenLabs API key available, skipping Scribe transcription")
+    
+    except Exception as e:
+        logger.error(f"❌ Error using ElevenLabs Scribe for alignment: {str(e)}")
+        logger.info("Falling back to simple timing distribution")
+    
+    # Fallback: offline alignment to vocal activity, or evenly across the audio duration
+    if alignment_mode == 'even':
+        logger.info("Using even distribution as specified by alignment_mode='even'")
+        aligned_segments = align_lyrics_with_scribe(lyrics_lines, audio_duration)
+        logger.info(f"✓ Created {len(aligned_segments)} evenly distributed lyrics segments")
+    else:
+        logger.warning("⚠️ FALLBACK: ElevenLabs unavailable, aligning lyrics to detected vocal activity offline")
+        logger.warning("⚠️ This may result in poorer sync than transcription-based alignment")
+        aligned_segments = align_lyrics_with_vad_or_even(lyrics_lines, audio_path, audio_duration)
+
+    return result(segments_to_webvtt(aligned_segments))
+
+
+def segments_to_webvtt(aligned_segments: List[dict]) -> webvtt.WebVTT:
+    vtt = webvtt.WebVTT()
+    for s in aligned_segments:
+        start_str = seconds_to_srt_timestamp(s["start"])
+        end_str = seconds_to_srt_timestamp(s["end"])
+        vtt.captions.append(webvtt.Caption(start_str, end_str, s["text"]))
+    return vtt
@@ -0,0 +1,139 @@
+"""
+Per-job render artifacts, kept so a job can be re-rendered cheaply.
+
+For every rendered job ARTIFACTS_DIR/<job_id>/ holds:
+    plan.json       the full-track render plan, including the aligned captions
+    background.png  the background image decoded, flattened to RGB, even-sized
+    audio.m4a       the audio track encoded once to AAC, muxed by stream copy
+
+A restyle (POST /jobs/{job_id}/rerender) reuses all three, so it skips
+transcription, alignment, image normalization and audio encoding. Workers and
+the API must share ARTIFACTS_DIR.
+"""
+import os
+import json
+import shutil
+import logging
+import tempfile
+from typing import Optional
+
+from rendering.metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+ARTIFACTS_DIR = os.path.abspath(os.environ.get("ARTIFACTS_DIR", "artifacts"))
+
+PLAN_FILE = "plan.json"
+BACKGROUND_FILE = "background.png"
+AUDIO_FILE = "audio.m4a"
+AUDIO_BITRATE = "192k"
+
+
+def job_artifact_dir(job_id: str) -> str:
+    return os.path.join(ARTIFACTS_DIR, job_id)
+
+
+def artifact_path(job_id: str, name: str) -> str:
+    return os.path.join(job_artifact_dir(job_id), name)
+
+
+def _publish(tmp_path: str, path: str):
+    # Rename into place, so a concurrent rerender never reads a partial file
+    os.replace(tmp_path, path)
+
+
+def save_plan(job_id: str, plan: dict):
+    """Store the full-track plan (never a windowed preview plan)."""
+    path = artifact_path(job_id, PLAN_FILE)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in plan.items() if k != "window"}, f)
+        _publish(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Failed to store render plan for job {job_id}: {e}")
+
+
+def load_plan(job_id: str) -> Optional[dict]:
+    path = artifact_path(job_id, PLAN_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable render plan {path}: {e}")
+        return None
+
+
+def normalized_background(job_id: str, image_path: Optional[str]) -> str:
+    """
+    Path of the job's normalized background, creating it from `image_path` on
+    first use. Transparent areas are flattened onto black, as in the video.
+    """
+    path = artifact_path(job_id, BACKGROUND_FILE)
+    hit = os.path.exists(path)
+    cache_lookup("artifacts", hit)
+    if hit:
+        return path
+    if not image_path or not os.path.exists(image_path):
+        raise FileNotFoundError(f"Image file not found: {image_path}")
+
+    from PIL import Image
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with Image.open(image_path) as img:
+        img = img.convert("RGBA")
+        background = Image.new("RGBA", img.size, (0, 0, 0, 255))
+        background.alpha_composite(img)
+        # x264 with yuv420p needs even dimensions
+        width, height = background.width // 2 * 2, background.height // 2 * 2
+        background = background.crop((0, 0, width, height)).convert("RGB")
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".png")
+        os.close(fd)
+        background.save(tmp_path, format="PNG")
+    _publish(tmp_path, path)
+    logger.info(f"Stored normalized background for job {job_id} ({width}x{height})")
+    return path
+
+
+def encoded_audio(job_id: str, audio_path: Optional[str]) -> str:
+    """Path of the job's AAC audio track, encoding it from `audio_path` on first use."""
+    path = artifact_path(job_id, AUDIO_FILE)
+    hit = os.path.exists(path)
+    cache_lookup("artifacts", hit)
+    if hit:
+        return path
+    if not audio_path or not os.path.exists(audio_path):
+        raise FileNotFoundError(f"Audio file not found: {audio_path}")
+
+    from rendering.mux import run_ffmpeg
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".m4a")
+    os.close(fd)
+    try:
+        run_ffmpeg(["-i", audio_path, "-vn", "-c:a", "aac", "-b:a", AUDIO_BITRATE, tmp_path])
+        _publish(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info(f"Stored encoded audio for job {job_id}")
+    return path
+
+
+def inputs_available(job_id: str, image_path: Optional[str], audio_path: Optional[str]) -> bool:
+    """Whether a job's background and audio can still be had, stored or from its uploads."""
+    def available(name, upload):
+        return os.path.exists(artifact_path(job_id, name)) or bool(upload and os.path.exists(upload))
+    return available(BACKGROUND_FILE, image_path) and available(AUDIO_FILE, audio_path)
+
+
+def delete_job_artifacts(job_id: str) -> bool:
+    path = job_artifact_dir(job_id)
+    if not os.path.isdir(path):
+        return False
+    shutil.rmtree(path, ignore_errors=True)
+    logger.info(f"Deleted artifacts: {path}")
+    return True
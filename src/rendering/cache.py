@@ -0,0 +1,70 @@
+"""
+On-disk cache shared by workers and the API (mount CACHE_DIR on a shared volume).
+
+Entries are keyed by the content of the audio file, never by its upload name,
+so the same track uploaded twice (a preview and then the final render, or a
+subtitle export) hits the same entry.
+"""
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from typing import Optional
+
+from rendering.metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.abspath(os.environ.get("CACHE_DIR", "cache"))
+CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "true").lower() == "true"
+
+HASH_CHUNK = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    """sha256 of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path(namespace: str, key: str, suffix: str = ".json") -> str:
+    # Two-level fan-out keeps directories small
+    return os.path.join(CACHE_DIR, namespace, key[:2], f"{key}{suffix}")
+
+
+def read_json(namespace: str, key: str) -> Optional[dict]:
+    if not CACHE_ENABLED:
+        return None
+    path = cache_path(namespace, key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            value = json.load(f)
+    except FileNotFoundError:
+        value = None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cache entry {path}: {e}")
+        value = None
+    cache_lookup(namespace, value is not None)
+    return value
+
+
+def write_json(namespace: str, key: str, value: dict):
+    """Write atomically, so a concurrent reader never sees a partial entry."""
+    if not CACHE_ENABLED:
+        return
+    path = cache_path(namespace, key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Failed to write cache entry {path}: {e}")
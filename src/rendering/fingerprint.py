@@ -0,0 +1,262 @@
+"""
+Acoustic fingerprints, so a re-encoded, re-exported or trimmed copy of a song
+reuses the Scribe transcription of the original.
+
+The audio is decoded to mono 8 kHz and reduced to spectral-peak landmarks:
+the strongest local maxima of the log spectrogram, paired with peaks shortly
+after them. Each pair hashes (frequency 1, frequency 2, time delta) into 24
+bits, which survives lossy re-encoding, bitrate and gain changes. Hashes of
+every transcribed track (its first FP_INDEX_SECONDS) go into a SQLite index
+next to the cache. A new upload matches a track when many of the hashes of
+its first FP_QUERY_SECONDS agree on the same time offset and they span most
+of that window; the offset says where the upload starts in the original, so
+cached word timings can be shifted onto it. Only that much audio is ever
+decoded for a fingerprint, and nothing at all while the index is empty.
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import List, NamedTuple, Optional
+
+from rendering import cache
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_DB = os.path.join(cache.CACHE_DIR, "fingerprints.db")
+FP_SAMPLE_RATE = 8000
+FP_FFT_SIZE = 512
+FP_HOP = 256  # 32 ms per frame
+FP_HOP_SECONDS = FP_HOP / FP_SAMPLE_RATE
+# Peak neighbourhood (frames, bins) and density
+FP_PEAK_FRAMES = 7
+FP_PEAK_BINS = 21
+FP_PEAKS_PER_FRAME = 3
+# Each anchor is paired with its next FP_FAN_OUT peaks within FP_MAX_DT frames
+FP_FAN_OUT = 6
+FP_MAX_DT = 63
+# A match needs this many hashes agreeing on one offset ...
+FP_MIN_MATCHES = int(os.environ.get("FP_MIN_MATCHES", "30"))
+# ... this share of the upload's hashes ...
+FP_MIN_MATCH_RATIO = float(os.environ.get("FP_MIN_MATCH_RATIO", "0.05"))
+# ... and aligned matches spread over this share of the upload
+FP_MIN_COVERAGE = 0.8
+FP_COVERAGE_BUCKET_SECONDS = 5.0
+# How far the upload may run past either end of the indexed track
+FP_EDGE_TOLERANCE_SECONDS = 1.0
+# Audio analysed per lookup and per indexed track, so the cost is bounded
+FP_QUERY_SECONDS = float(os.environ.get("FP_QUERY_SECONDS", "60"))
+FP_INDEX_SECONDS = float(os.environ.get("FP_INDEX_SECONDS", "900"))
+
+_db_lock = threading.Lock()
+
+
+class Fingerprint(NamedTuple):
+    hashes: "object"  # int64 array
+    times: "object"  # int32 array, anchor frame of each hash
+    duration: float  # seconds analysed
+
+
+class FingerprintMatch(NamedTuple):
+    digest: str
+    offset: float  # seconds into the indexed track where the upload starts
+    matches: int
+    ratio: float
+    duration: float
+
+
+# ------------------------------------------------------------------------------
+# Fingerprinting
+# ------------------------------------------------------------------------------
+def _max_filter(values, size: int, axis: int):
+    """Running maximum over `size` entries along `axis`, same shape as `values`."""
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (size // 2, size // 2)
+    padded = np.pad(values, pad, mode="constant", constant_values=-np.inf)
+    return sliding_window_view(padded, size, axis=axis).max(axis=-1)
+
+
+def spectral_peaks(samples):
+    """(frame, bin) arrays of the strongest local maxima of the log spectrogram, sorted by frame."""
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    if len(samples) < FP_FFT_SIZE:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+    frames = sliding_window_view(samples, FP_FFT_SIZE)[::FP_HOP]
+    window = np.hanning(FP_FFT_SIZE).astype(np.float32)
+    spectrum = np.log(np.abs(np.fft.rfft(frames * window, axis=1)) + 1e-6).astype(np.float32)
+
+    # The max filter is separable: frequency first, then time
+    local_max = _max_filter(_max_filter(spectrum, FP_PEAK_BINS, axis=1), FP_PEAK_FRAMES, axis=0)
+    # Relative to each frame, so quiet passages still yield peaks, but never in near-silence
+    floor = np.maximum(np.median(spectrum, axis=1, keepdims=True) + 2.0, np.percentile(spectrum, 20) + 2.0)
+    is_peak = (spectrum == local_max) & (spectrum > floor)
+    is_peak[:, :2] = False  # DC
+
+    peak_frames, peak_bins = np.nonzero(is_peak)
+    strength = spectrum[peak_frames, peak_bins]
+    # Strongest FP_PEAKS_PER_FRAME per frame
+    order = np.lexsort((-strength, peak_frames))
+    peak_frames, peak_bins = peak_frames[order], peak_bins[order]
+    rank = np.arange(len(peak_frames)) - np.searchsorted(peak_frames, peak_frames, side="left")
+    keep = rank < FP_PEAKS_PER_FRAME
+    return peak_frames[keep].astype(np.int32), peak_bins[keep].astype(np.int32)
+
+
+def landmark_hashes(peak_frames, peak_bins):
+    """Pair each peak with the next FP_FAN_OUT peaks; returns (hashes, anchor frames)."""
+    import numpy as np
+
+    hashes, times = [], []
+    for k in range(1, FP_FAN_OUT + 1):
+        f1, b1 = peak_frames[:-k], peak_bins[:-k]
+        f2, b2 = peak_frames[k:], peak_bins[k:]
+        dt = f2 - f1
+        ok = (dt >= 1) & (dt <= FP_MAX_DT)
+        hashes.append((b1[ok].astype(np.int64) << 15) | (b2[ok].astype(np.int64) << 6) | dt[ok])
+        times.append(f1[ok])
+    if not hashes:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+    return np.concatenate(hashes), np.concatenate(times).astype(np.int32)
+
+
+def audio_fingerprint(audio_path: str, max_seconds: float = FP_INDEX_SECONDS) -> Fingerprint:
+    """Fingerprint of the first `max_seconds` of the audio."""
+    from rendering.pcm import decoded_pcm_prefix
+
+    samples = decoded_pcm_prefix(audio_path, FP_SAMPLE_RATE, max_seconds)
+    hashes, times = landmark_hashes(*spectral_peaks(samples))
+    return Fingerprint(hashes, times, len(samples) / FP_SAMPLE_RATE)
+
+
+# ------------------------------------------------------------------------------
+# Index
+# ------------------------------------------------------------------------------
+@contextmanager
+def _index():
+    """A connection to the index, in a transaction, closed afterwards."""
+    with _db_lock:
+        conn = _connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(FINGERPRINT_DB), exist_ok=True)
+    conn = sqlite3.connect(FINGERPRINT_DB, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS fp_tracks ("
+                 "id INTEGER PRIMARY KEY, digest TEXT UNIQUE NOT NULL, duration REAL NOT NULL, "
+                 "hashes INTEGER NOT NULL, created_at REAL NOT NULL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS fp_hashes (hash INTEGER NOT NULL, track_id INTEGER NOT NULL, t INTEGER NOT NULL)")
+    conn.execute("CREATE INDEX IF NOT EXISTS fp_hashes_hash ON fp_hashes (hash)")
+    return conn
+
+
+def has_indexed_tracks() -> bool:
+    """Whether any track is indexed yet (lookups are pointless until one is)."""
+    if not os.path.exists(FINGERPRINT_DB):
+        return False
+    with _index() as conn:
+        return conn.execute("SELECT 1 FROM fp_tracks LIMIT 1").fetchone() is not None
+
+
+def index_fingerprint(digest: str, fingerprint: Fingerprint, duration: Optional[float] = None):
+    """
+    Add a transcribed track to the index (no-op if it is already there).
+    `duration` is the whole track's, when only a prefix was fingerprinted.
+    """
+    if not len(fingerprint.hashes):
+        return
+    duration = max(duration or 0.0, fingerprint.duration)
+    with _index() as conn:
+        if conn.execute("SELECT 1 FROM fp_tracks WHERE digest = ?", (digest,)).fetchone():
+            return
+        track_id = conn.execute(
+            "INSERT INTO fp_tracks (digest, duration, hashes, created_at) VALUES (?, ?, ?, ?)",
+            (digest, duration, len(fingerprint.hashes), time.time())
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO fp_hashes (hash, track_id, t) VALUES (?, ?, ?)",
+            zip(fingerprint.hashes.tolist(), [track_id] * len(fingerprint.hashes), fingerprint.times.tolist())
+        )
+    logger.info(f"Indexed fingerprint of {digest[:12]} ({len(fingerprint.hashes)} hashes, {duration:.1f}s)")
+
+
+def find_matches(fingerprint: Fingerprint, exclude_digest: Optional[str] = None,
+                 duration: Optional[float] = None) -> List[FingerprintMatch]:
+    """
+    Indexed tracks containing the fingerprinted audio, best first. `duration`
+    is the whole upload's, when only a prefix was fingerprinted; all of it
+    must fit inside the track.
+    """
+    import numpy as np
+
+    if len(fingerprint.hashes) < FP_MIN_MATCHES or not os.path.exists(FINGERPRINT_DB):
+        return []
+    with _index() as conn:
+        conn.execute("CREATE TEMP TABLE fp_query (hash INTEGER, t INTEGER)")
+        conn.executemany("INSERT INTO fp_query VALUES (?, ?)",
+                         zip(fingerprint.hashes.tolist(), fingerprint.times.tolist()))
+        rows = conn.execute("SELECT h.track_id, h.t - q.t, q.t FROM fp_query q JOIN fp_hashes h ON h.hash = q.hash").fetchall()
+        tracks = {row[0]: row[1:] for row in conn.execute("SELECT id, digest, duration FROM fp_tracks")}
+    if not rows:
+        return []
+
+    hits = np.array(rows, dtype=np.int64)
+    # Matches that agree on (track, offset) are the same alignment
+    pairs, inverse, counts = np.unique(hits[:, :2], axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    query_span = max(fingerprint.duration, FP_COVERAGE_BUCKET_SECONDS)
+    buckets_needed = max(1, int(query_span // FP_COVERAGE_BUCKET_SECONDS))
+    upload_duration = max(duration or 0.0, fingerprint.duration)
+
+    matches = {}
+    for index in np.argsort(-counts):
+        count = int(counts[index])
+        if count < FP_MIN_MATCHES:
+            break
+        track_id, delta = (int(v) for v in pairs[index])
+        digest, track_duration = tracks.get(track_id, (None, 0.0))
+        if digest is None or digest == exclude_digest or digest in matches:
+            continue
+        ratio = count / len(fingerprint.hashes)
+        offset = delta * FP_HOP_SECONDS
+        # Aligned hashes must be spread over the upload, not just a shared intro
+        query_times = hits[inverse == index, 2] * FP_HOP_SECONDS
+        covered = len(np.unique((query_times // FP_COVERAGE_BUCKET_SECONDS).astype(np.int64)))
+        fits = (offset >= -FP_EDGE_TOLERANCE_SECONDS
+                and offset + upload_duration <= track_duration + FP_EDGE_TOLERANCE_SECONDS)
+        if ratio >= FP_MIN_MATCH_RATIO and covered >= FP_MIN_COVERAGE * buckets_needed and fits:
+            matches[digest] = FingerprintMatch(digest, offset, count, ratio, track_duration)
+    return sorted(matches.values(), key=lambda m: -m.matches)
+
+
+def shift_transcription(response: dict, offset: float, duration: float) -> dict:
+    """A cached Scribe response re-timed for audio that starts `offset` seconds into the original."""
+    from rendering.stt import shift_word
+
+    words = []
+    for item in response.get("words", []):
+        item = shift_word(item, -offset)
+        start = item.get("start", 0.0)
+        end = item.get("end", start)
+        # Words cut by a trim belong to whichever side holds most of them
+        if not 0 <= (start + end) / 2 < duration:
+            continue
+        item["start"], item["end"] = max(0.0, start), min(duration, end)
+        words.append(item)
+    while words and words[0].get("type") == "spacing":
+        words.pop(0)
+    while words and words[-1].get("type") == "spacing":
+        words.pop()
+    return {**response, "text": "".join(w.get("text", "") for w in words), "words": words}
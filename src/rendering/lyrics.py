@@ -0,0 +1,59 @@
+"""
+Lyrics text preparation: line splitting and transliteration.
+"""
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------------------------
+# Local Transliteration from Devanagari to Latin (ITRANS scheme)
+# ------------------------------------------------------------------------------
+def transliterate_hindi_to_latin(text: str) -> str:
+    """
+    Attempt to transliterate from Devanagari script to a Latin-based scheme (ITRANS).
+    If text is already in Latin or contains no Devanagari, it should remain unaffected.
+    """
+    # Attempt a broad approach: everything recognized as Devanagari -> ITRANS
+    # `indic_transliterate(...)` is somewhat naive if the text is partially English.
+    # But for code simplicity, we pass the entire string.
+    from indic_transliteration import sanscript
+    from indic_transliteration.sanscript import transliterate as indic_transliterate
+
+    try:
+        return indic_transliterate(text, sanscript.DEVANAGARI, sanscript.ITRANS)
+    except Exception as e:
+        logger.warning(f"Transliteration error, returning original text: {e}")
+        return text
+
+
+# ------------------------------------------------------------------------------
+# Lyrics Processing Functions
+# ------------------------------------------------------------------------------
+def preprocess_lyrics(lyrics_text: str) -> List[str]:
+    """
+    Split raw lyrics text into lines/phrases for alignment.
+    Removes empty lines and trims whitespace.
+    Also filters out organization markers like 'Verse 1', 'Chorus', etc.
+    """
+    if not lyrics_text:
+        return []
+    
+    # Split by newlines and filter empty lines
+    lines = []
+    for line in lyrics_text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+            
+        # Skip organization markers
+        if (line.upper().startswith("VERSE") or 
+            line.upper().startswith("CHORUS") or 
+            line.upper().startswith("BRIDGE") or
+            (line.isupper() and len(line) < 15)):
+            continue
+            
+        lines.append(line)
+    
+    return lines
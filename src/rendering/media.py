@@ -0,0 +1,147 @@
+"""
+Media helpers shared by every renderer: fonts, audio loading and ffmpeg.
+
+Nothing here imports the web app, and MoviePy / PIL are only imported when a
+helper that needs them is called, so workers and RunPod handlers can load this
+module cheaply and warm up the expensive parts explicitly (see warm_start.py).
+"""
+import os
+import re
+import logging
+import subprocess
+from typing import Optional, Dict, Set, Iterable
+
+logger = logging.getLogger(__name__)
+
+FONT_PATHS = [
+    "/usr/share/fonts/truetype/freefont/FreeSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/System/Library/Fonts/Arial.ttf",  # macOS
+]
+
+# Resolved once per process; every caption clip used to repeat the lookup
+_resolved_font: Optional[str] = None
+_font_faces: Dict[int, object] = {}
+
+
+# ------------------------------------------------------------------------------
+# Fonts
+# ------------------------------------------------------------------------------
+def get_available_font():
+    """Get the first available font from the system"""
+    global _resolved_font
+    if _resolved_font is not None:
+        return _resolved_font
+    for font_path in FONT_PATHS:
+        if os.path.exists(font_path):
+            logger.info(f"Using font: {font_path}")
+            _resolved_font = font_path
+            return font_path
+    logger.warning("No specific font found, using system default: Arial")
+    _resolved_font = "Arial"  # system default
+    return _resolved_font
+
+
+def preload_font_faces(sizes: Iterable[int]) -> Dict[int, object]:
+    """
+    Open the resolved font at the given sizes so the file is parsed (and in the
+    page cache) before the first caption is drawn. Raises if the font is unusable.
+    """
+    from PIL import ImageFont
+
+    font = get_available_font()
+    for size in sizes:
+        if size not in _font_faces:
+            _font_faces[size] = ImageFont.truetype(font, size)
+    return _font_faces
+
+
+# ------------------------------------------------------------------------------
+# Audio
+# ------------------------------------------------------------------------------
+def load_audio_with_fallback(audio_path: str) -> tuple:
+    """
+    Load audio file with handling for metadata issues.
+    Always uses the original file, but gets duration from the decoded samples if MoviePy fails.
+    Returns (audio_clip, duration)
+    """
+    from moviepy.audio.io.AudioFileClip import AudioFileClip
+
+    try:
+        audio_clip = AudioFileClip(audio_path)
+        duration = audio_clip.duration
+        return audio_clip, duration
+    except (KeyError, AttributeError) as e:
+        logger.warning(f"⚠️ Failed to get duration from MoviePy directly: {str(e)}")
+        logger.info("Getting duration from the decoded samples and manually setting it...")
+
+        # Decode once into the shared PCM cache (later stages reuse it), but still use original file
+        from rendering.pcm import pcm_duration
+        try:
+            duration = pcm_duration(audio_path)
+
+            # Create AudioFileClip without relying on its duration detection
+            audio_clip = AudioFileClip(audio_path)
+
+            # Manually set the duration since MoviePy couldn't detect it
+            audio_clip.duration = duration
+
+            logger.info(f"✓ Successfully loaded original audio file with duration: {duration:.2f} seconds")
+            return audio_clip, duration
+
+        except Exception as decode_error:
+            logger.error(f"❌ Failed to get duration from the decoded audio: {str(decode_error)}")
+            raise ValueError(f"Audio file appears to be corrupted or has invalid metadata. Please use a different audio file or convert it to MP3 format first.")
+
+
+# ------------------------------------------------------------------------------
+# ffmpeg
+# ------------------------------------------------------------------------------
+def get_ffmpeg_binary() -> str:
+    """Resolve the ffmpeg executable the same way MoviePy does."""
+    binary = os.environ.get("FFMPEG_BINARY")
+    if binary and binary != "ffmpeg-imageio":
+        return binary
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+
+def probe_audio_duration(audio_path: str) -> Optional[float]:
+    """
+    Read the duration from the container header via `ffmpeg -i` without decoding.
+    Returns None if it can't be determined (use load_audio_with_fallback then).
+    """
+    try:
+        result = subprocess.run(
+            [get_ffmpeg_binary(), "-hide_banner", "-i", audio_path],
+            capture_output=True, text=True, timeout=30
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"⚠️ Could not probe audio duration: {e}")
+        return None
+    match = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def probe_encoders() -> Set[str]:
+    """Return the names of the encoders the resolved ffmpeg binary was built with."""
+    result = subprocess.run(
+        [get_ffmpeg_binary(), "-hide_banner", "-encoders"],
+        capture_output=True, text=True, timeout=30
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg -encoders failed: {result.stderr.strip()[:200]}")
+    # Lines look like " V....D libx264              libx264 H.264 / AVC ..."
+    encoders = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS":
+            encoders.add(parts[1])
+    return encoders
@@ -0,0 +1,148 @@
+"""
+Prometheus metrics shared by the API and the workers.
+
+The API serves them at /metrics; each worker process runs its own exporter on
+WORKER_METRICS_PORT (the next free port if several workers share a host).
+Besides the metrics below, prometheus_client's default collectors export the
+process RSS, CPU time and open file descriptors of each process.
+
+prometheus_client is optional: without it, or with METRICS_ENABLED=false,
+every metric here is a no-op, so instrumented code never has to check.
+"""
+import os
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+# Worker exporter port (0 disables); taken ports are skipped up to WORKER_METRICS_PORT_RANGE
+WORKER_METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", "9101"))
+WORKER_METRICS_PORT_RANGE = 20
+
+# Stages run from milliseconds (mux, cached STT) to many minutes (encoding a long song)
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200, 2400)
+JOB_BUCKETS = (1, 5, 10, 20, 30, 60, 120, 300, 600, 1200, 2400, 4800)
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+    if METRICS_ENABLED:
+        logger.info("prometheus_client is not installed; metrics are disabled. "
+                    "Install it with 'pip install prometheus-client'.")
+
+_enabled = METRICS_ENABLED and prometheus_client is not None
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+    def set(self, value: float):
+        pass
+
+
+_NOOP = _NoopMetric()
+
+
+def _metric(kind: str, name: str, documentation: str, labelnames=(), **kwargs):
+    if not _enabled:
+        return _NOOP
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+
+# ------------------------------------------------------------------------------
+# Metrics
+# ------------------------------------------------------------------------------
+STAGE_SECONDS = _metric(
+    "Histogram", "reel_stage_seconds", "Wall time of a render stage (see rendering.stages)",
+    ["stage"], buckets=STAGE_BUCKETS)
+JOB_SECONDS = _metric(
+    "Histogram", "reel_job_seconds", "Wall time of a job on this worker, by where it rendered",
+    ["target"], buckets=JOB_BUCKETS)
+JOBS = _metric(
+    "Counter", "reel_jobs", "Jobs finished by this worker", ["target", "status"])
+WORKER_BUSY = _metric(
+    "Gauge", "reel_worker_busy", "1 while this worker's slot is rendering a job")
+WORKER_BUSY_SECONDS = _metric(
+    "Counter", "reel_worker_busy_seconds", "Seconds this worker's slot spent rendering (rate = utilization)")
+CACHE_REQUESTS = _metric(
+    "Counter", "reel_cache_requests", "Cache lookups by cache and result (hit/miss)", ["cache", "result"])
+STT_RESPONSES = _metric(
+    "Counter", "reel_stt_responses", "ElevenLabs Scribe responses by HTTP status ('network' for no response)",
+    ["status"])
+STT_RETRIES = _metric(
+    "Counter", "reel_stt_retries", "Scribe requests retried after a transient failure")
+TRANSFER_BYTES = _metric(
+    "Counter", "reel_transfer_bytes",
+    "Bytes moved: API uploads received and downloads served, STT uploads, object store transfers",
+    ["channel", "direction"])
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+# ------------------------------------------------------------------------------
+# Queue and slot state (read from Redis at scrape time, API process only)
+# ------------------------------------------------------------------------------
+class _ClusterCollector:
+    """Queue depth, oldest-job age and local slots from the routing policy's Redis keys."""
+
+    def __init__(self, router):
+        self.router = router
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+
+        try:
+            depth, oldest_age = self.router.backlog()
+            busy, total = self.router.local_slots()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read queue state for metrics: {e}")
+            return
+        yield GaugeMetricFamily("reel_queue_depth", "Jobs waiting in the video_jobs queue", value=depth)
+        yield GaugeMetricFamily("reel_queue_oldest_age_seconds", "How long the oldest queued job has waited",
+                                value=oldest_age)
+        slots = GaugeMetricFamily("reel_worker_slots", "Local worker slots with a fresh heartbeat",
+                                  labels=["state"])
+        slots.add_metric(["busy"], busy)
+        slots.add_metric(["total"], total)
+        yield slots
+
+
+def register_cluster_collector(router):
+    if _enabled:
+        prometheus_client.REGISTRY.register(_ClusterCollector(router))
+
+
+# ------------------------------------------------------------------------------
+# Exposition
+# ------------------------------------------------------------------------------
+def render_latest() -> tuple:
+    """(body, content type) of the current metrics, for an HTTP endpoint."""
+    if not _enabled:
+        return b"# metrics disabled\n", "text/plain; charset=utf-8"
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def start_exporter(port: int = WORKER_METRICS_PORT) -> Optional[int]:
+    """Serve metrics over HTTP from a background thread; returns the port, or None."""
+    if not _enabled or not port:
+        return None
+    for candidate in range(port, port + WORKER_METRICS_PORT_RANGE):
+        try:
+            prometheus_client.start_http_server(candidate)
+        except OSError:
+            continue
+        logger.info(f"📈 Metrics exporter listening on port {candidate}")
+        return candidate
+    logger.warning(f"⚠️ No free port for the metrics exporter in {port}-{port + WORKER_METRICS_PORT_RANGE - 1}")
+    return None
@@ -0,0 +1,112 @@
+"""
+ffmpeg-only rendering paths that skip MoviePy compositing.
+
+Soft subtitles: instead of burning captions into every frame, the caption
+timeline is muxed as an MP4 timed-text (mov_text / tx3g) track next to a
+still-image video and the original audio. Encoding one static frame at 1 fps
+plus stream copies takes seconds, and the captions stay editable downstream.
+Players that don't show MP4 subtitle tracks (e.g. Instagram) need burn-in.
+"""
+import os
+import logging
+import subprocess
+import tempfile
+from typing import Optional
+
+from rendering.media import get_ffmpeg_binary
+from rendering.plan import PREVIEW_HEIGHT
+from rendering.subtitles import export_entries, to_ass
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_MODES = ("burn", "soft")
+
+SOFT_SUBTITLE_FPS = 1
+# Audio codecs MP4 carries as-is; anything else is encoded to AAC
+MP4_COPY_AUDIO_EXTENSIONS = (".mp3", ".m4a", ".aac")
+
+
+def run_ffmpeg(args: list, timeout: int = 600):
+    """Run ffmpeg, raising with the tail of its log on failure."""
+    cmd = [get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y"] + args
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()[-500:]}")
+
+
+def audio_codec_args(audio_path: str, window: Optional[dict] = None) -> list:
+    ext = os.path.splitext(audio_path)[1].lower()
+    # A window cut has to land on exact times, so only copy the whole track
+    if ext in MP4_COPY_AUDIO_EXTENSIONS and not window:
+        return ["-c:a", "copy"]
+    return ["-c:a", "aac", "-b:a", "192k"]
+
+
+def render_soft_subtitled_video(plan: dict, image_path: str, audio_path: str, output_path: str,
+                                preview: bool = False) -> str:
+    """
+    Write `output_path` as still image + original audio + a mov_text caption
+    track built from the plan. Caption color and size travel via an ASS
+    intermediate, which ffmpeg's mov_text encoder maps onto tx3g styles.
+    """
+    window = plan.get("window")
+    duration = plan["duration"]
+
+    # Same cues and timing the burn-in renderer would draw
+    ass_text = to_ass(export_entries(plan), plan["style"])
+    scale = f"scale=-2:'min({PREVIEW_HEIGHT},ih)'" if preview else "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+
+    with tempfile.NamedTemporaryFile("w", suffix=".ass", delete=False, encoding="utf-8") as f:
+        f.write(ass_text)
+        subtitle_path = f.name
+
+    audio_input = ["-i", audio_path]
+    if window:
+        audio_input = ["-ss", f"{window['start']:.3f}", "-t", f"{duration:.3f}"] + audio_input
+
+    logger.info(f"Muxing soft subtitles into {output_path} ({len(ass_text.splitlines())} lines of ASS)...")
+    try:
+        run_ffmpeg([
+            "-loop", "1", "-framerate", str(SOFT_SUBTITLE_FPS), "-i", image_path,
+            *audio_input,
+            "-i", subtitle_path,
+            "-map", "0:v", "-map", "1:a", "-map", "2:s",
+            "-vf", scale,
+            "-c:v", "libx264", "-preset", "ultrafast" if preview else "veryfast",
+            "-tune", "stillimage", "-pix_fmt", "yuv420p", "-r", str(SOFT_SUBTITLE_FPS),
+            *audio_codec_args(audio_path, window),
+            "-c:s", "mov_text", "-metadata:s:s:0", "language=und",
+            "-t", f"{duration:.3f}",
+            "-movflags", "+faststart",
+            output_path
+        ])
+    finally:
+        try:
+            os.remove(subtitle_path)
+        except OSError:
+            pass
+
+    return output_path
+
+
+def mux_audio(video_path: str, audio_path: str, output_path: str, duration: float,
+              window: Optional[dict] = None) -> str:
+    """
+    Add an audio track to a video-only file. The video is stream-copied and so
+    is the audio when it is an MP4-compatible whole track, so this costs no encode.
+    """
+    audio_input = ["-i", audio_path]
+    if window:
+        audio_input = ["-ss", f"{window['start']:.3f}", "-t", f"{duration:.3f}"] + audio_input
+
+    run_ffmpeg([
+        "-i", video_path,
+        *audio_input,
+        "-map", "0:v", "-map", "1:a",
+        "-c:v", "copy",
+        *audio_codec_args(audio_path, window),
+        "-t", f"{duration:.3f}",
+        "-movflags", "+faststart",
+        output_path
+    ])
+    return output_path
@@ -0,0 +1,182 @@
+"""
+Decoded-PCM scratch cache: each audio file is decoded once, by ffmpeg straight
+to a raw mono float32 file on scratch disk, and handed out as a read-only
+numpy.memmap.
+
+Every stage that needs samples (VAD alignment, fingerprinting, STT split
+points, the duration fallback) shares that decode instead of running its own
+ffmpeg or pydub pass. Lower sample rates are derived lazily from the base
+decode with a windowed-sinc decimator, processed in blocks and cached as
+their own raw files, so memory stays flat however long the track is. Entries
+are keyed by path, size and mtime and pruned oldest-first past PCM_CACHE_MAX_MB.
+"""
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+
+from rendering.media import get_ffmpeg_binary
+from rendering.metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+PCM_CACHE_DIR = os.environ.get("PCM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "reel_pcm"))
+PCM_CACHE_MAX_MB = int(os.environ.get("PCM_CACHE_MAX_MB", "2048"))
+PCM_BASE_RATE = 16000
+PCM_DECODE_TIMEOUT = 300
+# Decimation filter: taps per output sample and cutoff as a share of the new Nyquist
+PCM_TAPS_PER_FACTOR = 32
+PCM_CUTOFF = 0.9
+PCM_BLOCK_SAMPLES = 1 << 20
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _entry_path(audio_path: str, sample_rate: int) -> str:
+    stat = os.stat(audio_path)
+    source = f"{os.path.realpath(audio_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    key = hashlib.sha1(source.encode()).hexdigest()
+    return os.path.join(PCM_CACHE_DIR, f"{key}-{sample_rate}.f32")
+
+
+def _lock_for(path: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+
+def _open(path: str):
+    import numpy as np
+
+    os.utime(path)  # Recently used entries survive pruning
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode="r")
+
+
+def _decode(audio_path: str, output_path: str, sample_rate: int):
+    result = subprocess.run(
+        [get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y", "-i", audio_path,
+         "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "f32le", output_path],
+        capture_output=True, timeout=PCM_DECODE_TIMEOUT
+    )
+    if result.returncode != 0:
+        raise ValueError(f"Could not decode audio: {result.stderr.decode(errors='replace').strip()[-300:]}")
+
+
+def _decimate(samples, factor: int, output_path: str):
+    """Low-pass and keep every `factor`-th sample, block by block, into a raw file."""
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    half = PCM_TAPS_PER_FACTOR * factor // 2
+    n = np.arange(-half, half + 1)
+    cutoff = PCM_CUTOFF / factor
+    taps = (cutoff * np.sinc(cutoff * n) * np.hamming(len(n))).astype(np.float32)
+
+    out_len = (len(samples) + factor - 1) // factor
+    if out_len == 0:
+        open(output_path, "wb").close()
+        return
+    out = np.memmap(output_path, dtype=np.float32, mode="w+", shape=(out_len,))
+    step = PCM_BLOCK_SAMPLES // factor * factor
+    for begin in range(0, len(samples), step):
+        end = min(len(samples), begin + step)
+        # Input needed for outputs begin/factor .. end/factor, with filter context
+        lo, hi = begin - half, end + half
+        block = np.asarray(samples[max(0, lo):min(len(samples), hi)], dtype=np.float32)
+        block = np.pad(block, (max(0, -lo), max(0, hi - len(samples))))
+        windows = sliding_window_view(block, len(taps))[:end - begin:factor]
+        out[begin // factor:begin // factor + len(windows)] = windows @ taps
+    out.flush()
+    del out
+
+
+def decoded_pcm(audio_path: str, sample_rate: int = PCM_BASE_RATE):
+    """
+    Mono float32 samples of `audio_path` at `sample_rate` as a read-only
+    memmap, decoding at most once per file. Rates dividing PCM_BASE_RATE are
+    derived from the base decode; any other rate gets its own ffmpeg decode.
+    Raises ValueError if the audio can't be decoded.
+    """
+    path = _entry_path(audio_path, sample_rate)
+    with _lock_for(path):
+        hit = os.path.exists(path)
+        cache_lookup("pcm", hit)
+        if hit:
+            return _open(path)
+
+        os.makedirs(PCM_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=PCM_CACHE_DIR, suffix=".tmp")
+        os.close(fd)
+        try:
+            if sample_rate != PCM_BASE_RATE and PCM_BASE_RATE % sample_rate == 0:
+                _decimate(decoded_pcm(audio_path, PCM_BASE_RATE), PCM_BASE_RATE // sample_rate, tmp_path)
+            else:
+                _decode(audio_path, tmp_path, sample_rate)
+                logger.info(f"Decoded {os.path.basename(audio_path)} to PCM "
+                            f"({os.path.getsize(tmp_path) / 4 / sample_rate:.1f}s at {sample_rate} Hz)")
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    prune_pcm_cache(keep=path)
+    return _open(path)
+
+
+def decoded_pcm_prefix(audio_path: str, sample_rate: int, seconds: float):
+    """
+    The first `seconds` of `audio_path` at `sample_rate`: sliced from the cache
+    if the whole file is already decoded, otherwise decoded by ffmpeg up to that
+    point only, straight into memory and not cached.
+    Raises ValueError if the audio can't be decoded.
+    """
+    import numpy as np
+
+    path = _entry_path(audio_path, sample_rate)
+    if os.path.exists(path):
+        return _open(path)[:int(seconds * sample_rate)]
+    result = subprocess.run(
+        [get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-i", audio_path, "-t", f"{seconds:.3f}",
+         "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "f32le", "pipe:1"],
+        capture_output=True, timeout=PCM_DECODE_TIMEOUT
+    )
+    if result.returncode != 0:
+        raise ValueError(f"Could not decode audio: {result.stderr.decode(errors='replace').strip()[-300:]}")
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def pcm_duration(audio_path: str) -> float:
+    """Duration in seconds from the decoded samples (for files whose header lies or is missing)."""
+    return len(decoded_pcm(audio_path)) / PCM_BASE_RATE
+
+
+def prune_pcm_cache(keep: str = None):
+    """Remove least recently used entries until the cache fits in PCM_CACHE_MAX_MB."""
+    try:
+        entries = []
+        for name in os.listdir(PCM_CACHE_DIR):
+            if name.endswith(".f32"):
+                path = os.path.join(PCM_CACHE_DIR, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+    except OSError:
+        return
+
+    total = sum(size for _, size, _ in entries)
+    limit = PCM_CACHE_MAX_MB * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        if path == keep:
+            continue
+        try:
+            # Open memmaps elsewhere keep working; the data goes when they close
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
@@ -0,0 +1,402 @@
+"""
+Render plans: the hand-off between the CPU tier and the renderer.
+
+`build_render_plan` runs everything that needs the network or lyrics logic
+(ElevenLabs transcription, alignment, caption optimization) and produces a
+small JSON-serializable plan. `render_video_from_plan` only composites and
+encodes, so a GPU worker given a plan never waits on STT and never needs the
+ElevenLabs key.
+
+Plan format:
+{
+    "version": 1,
+    "job_id": "uuid",
+    "duration": 183.4,
+    "cues": [{"start": 0.5, "end": 2.1, "text": "...",
+              "words": [{"text": "...", "start": 0.5, "end": 0.8}, ...]}, ...],
+                      # words: optional, only for Scribe-timed captions (see
+                      # WordTable.caption_words); unmatched ones are 'interpolated'
+    "style": {"font_size": 45, "font_color": "yellow", "words_per_group": 3,
+              "timing_offset": 0.0, "debug_mode": false},
+    "window": {"start": 30.0, "end": 45.0},  # optional, see window_render_plan
+    "alignment": {"inputs": {...}, "captions": [...]}  # optimized captions before
+                                                      # min_duration, for reuse
+}
+
+Previews render the same plan small, at low fps and with the fastest x264
+preset, optionally for a window of the track only (cue times are always
+aligned against the full audio, so a window shows exactly what the final
+render will show at that point).
+"""
+import os
+import logging
+from typing import Optional, List
+
+import webvtt
+
+from rendering.media import get_available_font, load_audio_with_fallback, probe_audio_duration
+from rendering.timing import parse_seconds_from_timestamp, seconds_to_srt_timestamp, optimize_subtitles_for_timing
+from rendering.lyrics import preprocess_lyrics
+from rendering.timed_lyrics import validate_cues
+from rendering.stages import stage
+
+logger = logging.getLogger(__name__)
+
+RENDER_PLAN_VERSION = 1
+
+# Draft preview output
+PREVIEW_HEIGHT = int(os.environ.get("PREVIEW_HEIGHT", "480"))
+PREVIEW_FPS = int(os.environ.get("PREVIEW_FPS", "12"))
+PREVIEW_PRESET = os.environ.get("PREVIEW_PRESET", "ultrafast")
+
+
+def apply_min_duration(captions: List[dict], min_duration: float) -> List[dict]:
+    """
+    Stretch captions shorter than `min_duration` and resolve the overlaps that
+    creates. Takes and returns cues as {'start', 'end', 'text'} dicts in seconds;
+    the input list is not modified.
+    """
+    cues = [dict(c) for c in captions]
+
+    for i, cue in enumerate(cues):
+        if cue["end"] - cue["start"] < min_duration:
+            cue["end"] = cue["start"] + min_duration
+
+        # Fix overlaps with the next cue
+        if i < len(cues) - 1:
+            next_start = cues[i + 1]["start"]
+            if cue["end"] > next_start:
+                # If this would make the cue too short, push the next one instead
+                if next_start - cue["start"] >= min_duration:
+                    cue["end"] = next_start
+                else:
+                    cues[i + 1]["start"] = cue["end"]
+
+    return cues
+
+
+def alignment_inputs(job_data: dict) -> dict:
+    """Everything the aligned captions depend on. Jobs that agree on these can share them."""
+    if job_data.get("timed_cues"):
+        return {"alignment_mode": "provided", "timed_cues": job_data["timed_cues"]}
+
+    alignment_mode = job_data.get("alignment_mode", "auto")
+    inputs = {
+        "lyrics": job_data["lyrics"],
+        "language": job_data.get("language"),
+        "alignment_mode": alignment_mode
+    }
+    # Only the 'elevenlabs' mode groups transcribed words into captions itself
+    if alignment_mode == "elevenlabs":
+        inputs["words_per_group"] = job_data.get("words_per_group", 3)
+    return inputs
+
+
+def align_captions(job_data: dict, audio_duration: float) -> List[dict]:
+    """
+    Transcribe, align and optimize captions. Returns {'start', 'end', 'text'} dicts,
+    with the 'words' Scribe timed when the captions were aligned to a transcription.
+    Jobs with uploaded timings ('timed_cues') skip straight to optimization.
+    """
+    # STT client and aligner load only here; renderers given a plan never import them
+    from rendering.alignment import transcribe_and_align_lyrics, align_lyrics_with_scribe
+
+    audio_path = job_data["audio_path"]
+    lyrics = job_data.get("lyrics")
+    alignment_mode = job_data.get("alignment_mode", "auto")
+
+    logger.info("Processing lyrics and creating subtitles...")
+    words = None
+    if job_data.get("timed_cues"):
+        logger.info("Using provided caption timings, skipping transcription")
+        vtt = webvtt.WebVTT()
+        for c in validate_cues(job_data["timed_cues"], audio_duration):
+            vtt.captions.append(webvtt.Caption(seconds_to_srt_timestamp(c["start"]),
+                                               seconds_to_srt_timestamp(c["end"]), c["text"]))
+    elif alignment_mode == "even":
+        lyrics_lines = preprocess_lyrics(lyrics)
+        aligned_segments = align_lyrics_with_scribe(lyrics_lines, audio_duration)
+
+        vtt = webvtt.WebVTT()
+        for s in aligned_segments:
+            start_str = seconds_to_srt_timestamp(s["start"])
+            end_str = seconds_to_srt_timestamp(s["end"])
+            vtt.captions.append(webvtt.Caption(start_str, end_str, s["text"]))
+    else:
+        vtt, words = transcribe_and_align_lyrics(
+            audio_path,
+            lyrics,
+            language=job_data.get("language"),
+            alignment_mode=alignment_mode,
+            words_per_group=job_data.get("words_per_group", 3),
+            with_words=True
+        )
+    logger.info(f"Generated {len(vtt.captions)} subtitle captions")
+
+    logger.info("Optimizing subtitles...")
+    captions = [
+        {
+            "start": parse_seconds_from_timestamp(c.start),
+            "end": parse_seconds_from_timestamp(c.end),
+            "text": c.text
+        }
+        for c in optimize_subtitles_for_timing(vtt.captions)
+    ]
+    if words is not None:
+        # Word times come from the final captions, whatever optimization merged or split
+        for caption in captions:
+            caption_words = words.caption_words(caption["start"], caption["end"], caption["text"])
+            if caption_words:
+                caption["words"] = caption_words
+    return captions
+
+
+def build_render_plan(job_data: dict, audio_duration: Optional[float] = None,
+                      alignment: Optional[dict] = None) -> dict:
+    """
+    Build the render plan for a job (CPU tier). `alignment` is the 'alignment'
+    entry of an earlier plan for the same audio; it is reused when its inputs
+    match, so restyles skip transcription and alignment entirely.
+    """
+    if audio_duration is None:
+        audio_duration = probe_audio_duration(job_data["audio_path"])
+    if audio_duration is None:
+        temp_audio_clip, audio_duration = load_audio_with_fallback(job_data["audio_path"])
+        temp_audio_clip.close()
+
+    inputs = alignment_inputs(job_data)
+    if alignment and alignment.get("inputs") == inputs:
+        logger.info(f"Reusing stored alignment ({len(alignment['captions'])} captions)")
+        captions = alignment["captions"]
+    else:
+        with stage("align"):
+            captions = align_captions(job_data, audio_duration)
+
+    cues = apply_min_duration(captions, job_data.get("min_duration", 1.0))
+
+    return {
+        "version": RENDER_PLAN_VERSION,
+        "job_id": job_data.get("job_id"),
+        "duration": audio_duration,
+        "cues": cues,
+        "style": {
+            "font_size": job_data.get("font_size", 45),
+            "font_color": job_data.get("font_color", "yellow"),
+            "words_per_group": job_data.get("words_per_group", 3),
+            "timing_offset": job_data.get("timing_offset", 0.0),
+            "debug_mode": job_data.get("debug_mode", False)
+        },
+        "alignment": {"inputs": inputs, "captions": captions}
+    }
+
+
+def check_preview_window(preview: bool, start: Optional[float], end: Optional[float]):
+    """Reject preview windows that can't be rendered (the end is clamped to the audio later)."""
+    if not preview and (start is not None or end is not None):
+        raise ValueError("preview_start/preview_end require preview=true")
+    if start is not None and start < 0:
+        raise ValueError("preview_start must be >= 0")
+    if end is not None and end <= (start or 0):
+        raise ValueError("preview_end must be greater than preview_start")
+
+
+def _shift_cue(cue: dict, seconds: float) -> dict:
+    shifted = {**cue, "start": cue["start"] + seconds, "end": cue["end"] + seconds}
+    if cue.get("words"):
+        shifted["words"] = [{**w, "start": w["start"] + seconds, "end": w["end"] + seconds} for w in cue["words"]]
+    return shifted
+
+
+def window_render_plan(plan: dict, start: Optional[float] = None, end: Optional[float] = None) -> dict:
+    """
+    Restrict a plan to [start, end) seconds of the audio. Cues keep the timing
+    of the full-track alignment and are shifted so the window starts at 0.
+    """
+    start = max(0.0, start or 0.0)
+    end = plan["duration"] if end is None else min(end, plan["duration"])
+    if end <= start:
+        raise ValueError(f"Preview window is empty: {start:.2f}s - {end:.2f}s (audio is {plan['duration']:.2f}s)")
+
+    offset = plan["style"].get("timing_offset", 0.0)
+    cues = [
+        _shift_cue(cue, -start)
+        for cue in plan["cues"]
+        # Filter on displayed times, i.e. with the timing offset applied
+        if cue["end"] + offset > start and cue["start"] + offset < end
+    ]
+    return {**plan, "duration": end - start, "cues": cues, "window": {"start": start, "end": end}}
+
+
+def display_cues(plan: dict, duration: Optional[float] = None) -> List[dict]:
+    """
+    The captions exactly as the renderer shows them: timing offset applied,
+    clamped to the audio, each cue split into word groups that share its time
+    evenly. Returns [{'start', 'end', 'text', 'groups': [{'start', 'end', 'text'}]}],
+    plus the cue's 'words' (offset and clamped the same way) when it has them.
+    """
+    style = plan["style"]
+    words_per_group = style.get("words_per_group", 3)
+    timing_offset = style.get("timing_offset", 0.0)
+    if duration is None:
+        duration = plan["duration"]
+
+    cues = []
+    for cue in plan["cues"]:
+        # Apply timing offset and clamp to the video
+        start_s = max(0, cue["start"] + timing_offset)
+        end_s = min(duration, cue["end"] + timing_offset)
+
+        sub_duration = end_s - start_s
+        if sub_duration <= 0:
+            continue
+
+        # Split into word groups
+        words = cue["text"].split()
+        word_groups = [" ".join(words[i:i + words_per_group]) for i in range(0, len(words), words_per_group)]
+        if not word_groups:
+            continue
+
+        time_per_group = sub_duration / len(word_groups)
+        groups = [
+            {"start": start_s + i * time_per_group, "end": start_s + (i + 1) * time_per_group, "text": text}
+            for i, text in enumerate(word_groups)
+        ]
+        display = {"start": start_s, "end": end_s, "text": cue["text"], "groups": groups}
+        if cue.get("words"):
+            display["words"] = [
+                {**w, "start": min(max(w["start"] + timing_offset, start_s), end_s),
+                 "end": min(max(w["end"] + timing_offset, start_s), end_s)}
+                for w in cue["words"]
+            ]
+        cues.append(display)
+
+    return cues
+
+
+def caption_clips_from_plan(plan: dict, duration: float, scale: float = 1.0) -> list:
+    """
+    Create the timed TextClips for every cue, split into word groups.
+    `scale` shrinks font and caption box along with a downscaled background
+    (previews), so captions keep their size relative to the frame.
+    """
+    from moviepy.video.VideoClip import TextClip
+
+    style = plan["style"]
+    font = get_available_font()
+
+    subtitle_clips = []
+    for cue in display_cues(plan, duration):
+        for group in cue["groups"]:
+            group_text = group["text"]
+            if style.get("debug_mode"):
+                group_text = f"[{group['start']:.1f}s] {group_text}"
+
+            txt_clip = TextClip(
+                text=group_text,
+                font=font,
+                font_size=max(8, int(style.get("font_size", 45) * scale)),
+                color=style.get("font_color", "yellow"),
+                bg_color=(0, 0, 0, 120),
+                size=(int(700 * scale), int(100 * scale)),
+                stroke_color='black',
+                stroke_width=2,
+                method='caption'
+            ).with_duration(group["end"] - group["start"]).with_start(group["start"]).with_position(("center", 0.8), relative=True)
+
+            subtitle_clips.append(txt_clip)
+
+    return subtitle_clips
+
+
+def render_video_from_plan(plan: dict, image_path: str, audio_path: str, output_path: str,
+                           fps: int = 25, resize_height: Optional[int] = None, preview: bool = False,
+                           audio_track: Optional[str] = None, **write_options) -> str:
+    """
+    Composite the background, captions and audio described by a plan and encode it.
+    With `preview`, render a fast low-resolution draft instead. A plan with a
+    `window` renders only that part of the audio. With `audio_track` (an
+    already encoded AAC file, see rendering.artifacts) only the video is encoded
+    and the audio is muxed in by stream copy. Extra keyword arguments are
+    passed to MoviePy's write_videofile.
+    """
+    from moviepy.video.VideoClip import ImageClip
+    from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+
+    window = plan.get("window")
+    if window:
+        logger.info(f"Rendering window {window['start']:.2f}s - {window['end']:.2f}s")
+
+    full_audio_clip = audio_clip = None
+    if audio_track:
+        duration = plan["duration"]
+    else:
+        logger.info("Loading audio file...")
+        full_audio_clip, duration = load_audio_with_fallback(audio_path)
+        audio_clip = full_audio_clip
+        if window:
+            audio_clip = full_audio_clip.subclipped(window["start"], min(window["end"], duration))
+            duration = audio_clip.duration
+
+    logger.info("Creating background image clip...")
+    bg_clip = ImageClip(image_path).with_duration(duration)
+    caption_scale = 1.0
+    if preview:
+        fps = PREVIEW_FPS
+        caption_scale = min(PREVIEW_HEIGHT, bg_clip.h) / bg_clip.h
+        # x264 needs even dimensions
+        preview_size = (int(bg_clip.w * caption_scale) // 2 * 2, int(bg_clip.h * caption_scale) // 2 * 2)
+        bg_clip = bg_clip.resized(new_size=preview_size)
+        write_options.setdefault("preset", PREVIEW_PRESET)
+        write_options.setdefault("audio_bitrate", "96k")
+    elif resize_height:
+        bg_clip = bg_clip.resized(height=resize_height)
+
+    logger.info("Creating subtitle text clips...")
+    with stage("captions"):
+        subtitle_clips = caption_clips_from_plan(plan, duration, scale=caption_scale)
+    logger.info(f"Created {len(subtitle_clips)} text clips")
+
+    logger.info("Compositing final video...")
+    final_clip = CompositeVideoClip([bg_clip] + subtitle_clips)
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    stem = os.path.splitext(os.path.basename(output_path))[0]
+    if audio_track:
+        video_path = os.path.join(output_dir, f"temp-video_{stem}.mp4")
+        write_options.pop("temp_audiofile", None)
+        write_options.pop("audio_bitrate", None)
+    else:
+        final_clip.audio = audio_clip
+        video_path = output_path
+        write_options.setdefault("temp_audiofile", os.path.join(output_dir, f"temp-audio_{stem}.m4a"))
+
+    logger.info(f"Writing video to {output_path}...")
+    try:
+        with stage("encode"):
+            final_clip.write_videofile(
+                video_path,
+                fps=fps,
+                codec="libx264",
+                audio=not audio_track,
+                audio_codec="aac",
+                remove_temp=True,
+                **write_options
+            )
+        if audio_track:
+            from rendering.mux import mux_audio
+            with stage("mux"):
+                mux_audio(video_path, audio_track, output_path, duration, window)
+    finally:
+        if audio_track and os.path.exists(video_path):
+            os.remove(video_path)
+        try:
+            if full_audio_clip:
+                full_audio_clip.close()
+            final_clip.close()
+            bg_clip.close()
+            for clip in subtitle_clips:
+                clip.close()
+        except Exception:
+            pass
+
+    return output_path
@@ -0,0 +1,258 @@
+"""
+Opt-in per-job profiling.
+
+A profiled job (`profile=true` on the request, or a random JOB_PROFILE_SAMPLE_RATE
+share of jobs) runs with a JobProfiler:
+
+    cpu.folded       wall-clock stack samples of the job's thread, every
+                     JOB_PROFILE_INTERVAL_MS, rooted at the current stage
+                     ("[stage] plan;[stage] stt;...")
+    profile.json     stage timings, and traced and peak tracemalloc bytes at
+                     every stage boundary
+    memory.snapshot  the tracemalloc snapshot of the boundary with the most
+                     memory traced, folded into memory.folded (live bytes by
+                     allocation stack) the first time it is requested
+
+Both .folded files are in Brendan Gregg's folded-stack format, readable by
+flamegraph.pl, speedscope and inferno. They are stored with the job's
+artifacts under profile/ and served by GET /admin/profile/{job_id}.
+Sampling and tracemalloc slow a render down noticeably; profiled jobs are
+kept out of the routing latency model.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import tempfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from rendering.artifacts import artifact_path
+
+logger = logging.getLogger(__name__)
+
+JOB_PROFILE_SAMPLE_RATE = float(os.environ.get("JOB_PROFILE_SAMPLE_RATE", "0"))
+JOB_PROFILE_INTERVAL_MS = float(os.environ.get("JOB_PROFILE_INTERVAL_MS", "10"))
+JOB_PROFILE_MEMORY = os.environ.get("JOB_PROFILE_MEMORY", "true").lower() == "true"
+# Frames kept per allocation traceback; deeper stacks cost memory per traced block
+PROFILE_TRACEMALLOC_FRAMES = 16
+# Snapshot again only once traced memory grew by this factor since the last one
+PROFILE_SNAPSHOT_GROWTH = 1.2
+
+PROFILE_DIR = "profile"
+PROFILE_FILES = {"cpu": "cpu.folded", "memory": "memory.folded", "summary": "profile.json"}
+MEMORY_SNAPSHOT_FILE = "memory.snapshot"
+
+_current: ContextVar[Optional["JobProfiler"]] = ContextVar("job_profiler", default=None)
+
+
+def wants_profile(job_data: dict) -> bool:
+    """True if the job asked for a profile or was sampled for one."""
+    if job_data.get("profile"):
+        return True
+    return JOB_PROFILE_SAMPLE_RATE > 0 and random.random() < JOB_PROFILE_SAMPLE_RATE
+
+
+def current_profiler() -> Optional["JobProfiler"]:
+    return _current.get()
+
+
+def _short_path(filename: str) -> str:
+    # Package and module: 'rendering/plan.py', 'numpy/__init__.py'
+    return "/".join(filename.replace(os.sep, "/").split("/")[-2:])
+
+
+def _frame_label(code) -> str:
+    # ';' separates frames in the folded format
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class JobProfiler:
+    """Samples one thread's stack on a timer and snapshots tracemalloc at stage boundaries."""
+
+    def __init__(self, interval: float = JOB_PROFILE_INTERVAL_MS / 1000, memory: bool = JOB_PROFILE_MEMORY):
+        self.interval = interval
+        self.memory = memory
+        self.samples = Counter()
+        self.boundaries = []
+        # Stage timings of the job, stored with the profile when set
+        self.timings = None
+        self._stages = ()
+        self._started = None
+        self._duration = None
+        self._thread_id = None
+        self._sampler = None
+        self._stop = threading.Event()
+        self._owns_tracemalloc = False
+        # (traced bytes, boundary, snapshot) of the high-water mark
+        self._snapshot = None
+
+    # --------------------------------------------------------------------------
+    # Lifecycle (called from the job's thread)
+    # --------------------------------------------------------------------------
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread_id = threading.get_ident()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            self._owns_tracemalloc = True
+        self.boundary("job", "start")
+        self._sampler = threading.Thread(target=self._sample_loop, name="job-profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        self._duration = time.perf_counter() - self._started
+        self.boundary("job", "end")
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+
+    def enter_stage(self, name: str):
+        self.boundary(name, "start")
+        self._stages = self._stages + (f"[stage] {name}",)
+
+    def exit_stage(self, name: str):
+        self._stages = self._stages[:-1]
+        self.boundary(name, "end")
+
+    # --------------------------------------------------------------------------
+    # CPU sampling
+    # --------------------------------------------------------------------------
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(self._stages + tuple(reversed(stack)))] += 1
+
+    # --------------------------------------------------------------------------
+    # Memory
+    # --------------------------------------------------------------------------
+    def boundary(self, stage: str, edge: str):
+        entry = {"stage": stage, "edge": edge, "seconds": round(time.perf_counter() - self._started, 3)}
+        if self.memory and tracemalloc.is_tracing():
+            traced, peak = tracemalloc.get_traced_memory()
+            # Peak since the previous boundary, not since tracing started
+            tracemalloc.reset_peak()
+            entry.update({"traced_bytes": traced, "peak_bytes": peak})
+            # Taking a snapshot is cheap, analysing one is not: keep the raw
+            # snapshot of the high-water mark and fold it when it is requested
+            if self._snapshot is None or traced > self._snapshot[0] * PROFILE_SNAPSHOT_GROWTH:
+                self._snapshot = (traced, f"{stage} {edge}", tracemalloc.take_snapshot())
+                entry["snapshot"] = True
+        self.boundaries.append(entry)
+
+    # --------------------------------------------------------------------------
+    # Output
+    # --------------------------------------------------------------------------
+    def cpu_folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self, job_id: str) -> dict:
+        return {
+            "job_id": job_id,
+            "interval_ms": round(self.interval * 1000, 3),
+            "samples": sum(self.samples.values()),
+            "seconds": round(self._duration or 0.0, 3),
+            "stage_timings": self.timings,
+            "memory_snapshot_at": self._snapshot[1] if self._snapshot else None,
+            "boundaries": self.boundaries,
+        }
+
+    def save(self, directory: str, job_id: str):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, PROFILE_FILES["cpu"]), "w", encoding="utf-8") as f:
+            f.write(self.cpu_folded())
+        with open(os.path.join(directory, PROFILE_FILES["summary"]), "w", encoding="utf-8") as f:
+            json.dump(self.summary(job_id), f, indent=2)
+            f.write("\n")
+        if self._snapshot is not None:
+            self._snapshot[2].dump(os.path.join(directory, MEMORY_SNAPSHOT_FILE))
+
+
+def fold_snapshot(snapshot: tracemalloc.Snapshot, label: str) -> str:
+    """Live allocations of a tracemalloc snapshot as folded stacks weighted by bytes."""
+    # Leave out the profiler's own samples
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, __file__, all_frames=True)])
+    lines = []
+    for stat in snapshot.statistics("traceback"):
+        # Oldest frame first, as folded stacks expect; ';' separates frames
+        frames = [f"{_short_path(f.filename)}:{f.lineno}".replace(";", ":") for f in stat.traceback]
+        lines.append(f"[{label}];{';'.join(frames)} {stat.size}")
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------------------------------------------------------
+# Stored profiles
+# ------------------------------------------------------------------------------
+def profile_dir(job_id: str) -> str:
+    return artifact_path(job_id, PROFILE_DIR)
+
+
+def stored_profile_kinds(job_id: str) -> list:
+    directory = profile_dir(job_id)
+    kinds = [kind for kind, name in PROFILE_FILES.items() if os.path.exists(os.path.join(directory, name))]
+    if "memory" not in kinds and os.path.exists(os.path.join(directory, MEMORY_SNAPSHOT_FILE)):
+        kinds.append("memory")
+    return kinds
+
+
+def memory_folded_file(directory: str) -> Optional[str]:
+    """memory.folded in a profile directory, folded from its snapshot on first use; or None."""
+    path = os.path.join(directory, PROFILE_FILES["memory"])
+    snapshot_path = os.path.join(directory, MEMORY_SNAPSHOT_FILE)
+    if os.path.exists(path) or not os.path.exists(snapshot_path):
+        return path if os.path.exists(path) else None
+    try:
+        with open(os.path.join(directory, PROFILE_FILES["summary"]), encoding="utf-8") as f:
+            label = json.load(f).get("memory_snapshot_at") or "snapshot"
+    except (OSError, ValueError):
+        label = "snapshot"
+    folded = fold_snapshot(tracemalloc.Snapshot.load(snapshot_path), label)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(folded)
+    os.replace(tmp_path, path)
+    return path
+
+
+def profile_file(job_id: str, kind: str) -> Optional[str]:
+    """Path of a stored profile file of a job ('cpu', 'memory' or 'summary'), or None."""
+    if kind == "memory":
+        return memory_folded_file(profile_dir(job_id))
+    path = os.path.join(profile_dir(job_id), PROFILE_FILES[kind])
+    return path if os.path.exists(path) else None
+
+
+@contextmanager
+def profiled_job(job_id: str, directory: Optional[str] = None):
+    """
+    Profile everything the current thread runs inside the block and store it
+    in `directory` (the job's artifacts by default), even if the job fails.
+    The block can set `profiler.timings` to store the job's stage timings too.
+    """
+    profiler = JobProfiler()
+    token = _current.set(profiler)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _current.reset(token)
+        target = directory or profile_dir(job_id)
+        try:
+            profiler.save(target, job_id)
+            logger.info(f"🔬 Saved profile of job {job_id} ({sum(profiler.samples.values())} samples) to {target}")
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save the profile of job {job_id}: {e}")
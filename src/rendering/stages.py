@@ -0,0 +1,68 @@
+"""
+Per-job stage timings.
+
+The worker opens a StageTimings for each job with `job_timings()`; any code
+running in that job's thread can wrap a step in `stage(name)` and its wall
+time is added under that name. Stages nest, so 'stt' is also counted inside
+'plan'. The worker logs the result with the job and the benchmarks read it
+from VideoProcessor.last_timings. Every stage, inside a job or not, is also
+observed in the reel_stage_seconds histogram (rendering.metrics), and marks
+a stage boundary for the job's profiler, if any (rendering.profiling).
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from rendering.metrics import STAGE_SECONDS
+from rendering.profiling import current_profiler
+
+_current: ContextVar[Optional["StageTimings"]] = ContextVar("stage_timings", default=None)
+
+
+class StageTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_dict(self) -> dict:
+        return {
+            "total": round(time.perf_counter() - self.started, 3),
+            "stages": {name: round(seconds, 3) for name, seconds in self.stages.items()},
+        }
+
+    def summary(self) -> str:
+        parts = [f"{name} {seconds:.2f}s" for name, seconds in self.stages.items()]
+        return f"{time.perf_counter() - self.started:.2f}s total: " + ", ".join(parts)
+
+
+@contextmanager
+def job_timings():
+    """Collect the stages of everything run inside the block."""
+    timings = StageTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    timings = _current.get()
+    profiler = current_profiler()
+    if profiler is not None:
+        profiler.enter_stage(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.labels(name).observe(seconds)
+        if timings is not None:
+            timings.add(name, seconds)
+        if profiler is not None:
+            profiler.exit_stage(name)
@@ -0,0 +1,315 @@
+"""
+ElevenLabs Speech-to-Text (Scribe) client and conversion of its word timings
+to WebVTT captions.
+"""
+import os
+import logging
+import subprocess
+import tempfile
+from typing import Optional, Tuple
+
+import webvtt
+
+from rendering.timing import seconds_to_srt_timestamp, parse_seconds_from_timestamp
+from rendering.lyrics import transliterate_hindi_to_latin
+from rendering.media import get_ffmpeg_binary, probe_audio_duration
+from rendering import cache
+from rendering.stt_client import get_scribe_client
+from rendering.words import word_table
+from rendering.stages import stage
+
+logger = logging.getLogger(__name__)
+
+# Set your ElevenLabs API key here (or load from environment variable)
+ELEVENLABS_API_KEY = os.environ.get("ELEVENLABS_API_KEY", "")
+# Point at a local stand-in for benchmarks and load tests (see benchmarks/fake_scribe.py)
+ELEVENLABS_BASE_URL = os.environ.get("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io/v1")
+
+TRANSCRIPTION_CACHE = "transcriptions"
+
+# What Scribe gets instead of the upload: 'opus', 'mp3' or 'original' (send as-is)
+STT_AUDIO_FORMAT = os.environ.get("STT_AUDIO_FORMAT", "opus").lower()
+STT_AUDIO_BITRATE = os.environ.get("STT_AUDIO_BITRATE", "32k")
+STT_AUDIO_CACHE = "stt_audio"
+# Uploads smaller than this are sent as they are
+STT_TRANSCODE_MIN_BYTES = int(os.environ.get("STT_TRANSCODE_MIN_BYTES", str(1024 * 1024)))
+
+# Match re-encoded/trimmed copies of transcribed songs by acoustic fingerprint
+STT_FINGERPRINT = os.environ.get("STT_FINGERPRINT", "true").lower() == "true"
+
+# Audio longer than STT_CHUNK_SECONDS * STT_CHUNK_MIN_FACTOR is transcribed in
+# chunks of about STT_CHUNK_SECONDS, STT_CHUNK_FANOUT at a time (0 disables)
+STT_CHUNK_SECONDS = float(os.environ.get("STT_CHUNK_SECONDS", "300"))
+STT_CHUNK_MIN_FACTOR = 1.5
+STT_CHUNK_FANOUT = int(os.environ.get("STT_CHUNK_FANOUT", "4"))
+
+# format -> (ffmpeg arguments, file suffix, MIME type)
+STT_AUDIO_ENCODINGS = {
+    "opus": (["-c:a", "libopus", "-application", "voip", "-f", "ogg"], ".ogg", "audio/ogg"),
+    "mp3": (["-c:a", "libmp3lame", "-f", "mp3"], ".mp3", "audio/mpeg"),
+}
+AUDIO_MIME_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".flac": "audio/flac",
+    ".m4a": "audio/mp4",
+    ".aac": "audio/aac",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+}
+
+
+# ------------------------------------------------------------------------------
+# STT audio preparation
+# ------------------------------------------------------------------------------
+def audio_mime_type(audio_path: str) -> str:
+    return AUDIO_MIME_TYPES.get(os.path.splitext(audio_path)[1].lower(), "application/octet-stream")
+
+
+def _transcode_for_stt(audio_path: str, output_path: str, fmt: str,
+                       start: Optional[float] = None, length: Optional[float] = None):
+    codec_args, _, _ = STT_AUDIO_ENCODINGS[fmt]
+    cut = []
+    if start is not None:
+        cut = ["-ss", f"{start:.3f}", "-t", f"{length:.3f}"]
+    result = subprocess.run(
+        [get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y", *cut, "-i", audio_path,
+         "-vn", "-ac", "1", "-ar", "16000", *codec_args, "-b:a", STT_AUDIO_BITRATE, output_path],
+        capture_output=True, text=True, timeout=300
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip()[-300:])
+
+
+def prepare_stt_audio(audio_path: str, digest: str) -> Tuple[str, str, bool]:
+    """
+    Return (path, MIME type, is_temporary) of the audio to send to Scribe: mono
+    16 kHz Opus (or MP3) at a speech bitrate, cached by the source's content
+    hash. Falls back to the original file if transcoding fails or doesn't help.
+    """
+    original = (audio_path, audio_mime_type(audio_path), False)
+    if STT_AUDIO_FORMAT not in STT_AUDIO_ENCODINGS or os.path.getsize(audio_path) < STT_TRANSCODE_MIN_BYTES:
+        return original
+
+    _, suffix, mime = STT_AUDIO_ENCODINGS[STT_AUDIO_FORMAT]
+    key = f"{digest}-{STT_AUDIO_BITRATE}"
+    if cache.CACHE_ENABLED:
+        path = cache.cache_path(STT_AUDIO_CACHE, key, suffix)
+        if os.path.exists(path):
+            logger.info(f"✓ Using cached STT audio ({os.path.getsize(path) / 1024:.0f} KB)")
+            return path, mime, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=suffix)
+    else:
+        fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+
+    try:
+        _transcode_for_stt(audio_path, tmp_path, STT_AUDIO_FORMAT)
+    except (RuntimeError, OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"⚠️ Could not transcode audio for STT, sending the original: {e}")
+        os.remove(tmp_path)
+        return original
+
+    original_size, prepared_size = os.path.getsize(audio_path), os.path.getsize(tmp_path)
+    if prepared_size >= original_size:
+        os.remove(tmp_path)
+        return original
+    logger.info(f"✓ Prepared STT audio: {original_size / 1048576:.2f} MB -> {prepared_size / 1048576:.2f} MB "
+                f"({STT_AUDIO_FORMAT}, mono 16 kHz, {STT_AUDIO_BITRATE})")
+
+    if not cache.CACHE_ENABLED:
+        return tmp_path, mime, True
+    os.replace(tmp_path, path)
+    return path, mime, False
+
+
+# ------------------------------------------------------------------------------
+# ElevenLabs Speech-to-Text (Scribe) Integration
+# ------------------------------------------------------------------------------
+def transcribe_audio_with_elevenlabs(
+    audio_path: str,
+    language: Optional[str] = None,
+    model_id: Optional[str] = "scribe_v1"  # Change to scribe_v1, the only available STT model
+) -> dict:
+    """
+    Transcribe audio using ElevenLabs Scribe API.
+    
+    Args:
+        audio_path: Path to the audio file
+        language: Optional language code (ISO 639-1)
+        model_id: Model ID to use (defaults to "scribe_v1")
+        
+    Returns:
+        Complete response from ElevenLabs API containing text, words with timestamps, etc.
+        Responses are cached by audio content, language and model.
+    """
+    digest = cache.file_digest(audio_path)
+    cache_key = transcription_cache_key(audio_path, language, model_id, digest)
+    cached = cache.read_json(TRANSCRIPTION_CACHE, cache_key)
+    if cached is not None:
+        logger.info(f"✓ Using cached transcription for {os.path.basename(audio_path)} ({len(cached.get('words', []))} words)")
+        return cached
+
+    # A re-encoded or trimmed copy of an already transcribed song
+    with stage("fingerprint"):
+        reused = reuse_transcription_by_fingerprint(audio_path, digest, language, model_id)
+    if reused is not None:
+        cache.write_json(TRANSCRIPTION_CACHE, cache_key, reused)
+        return reused
+    
+    # Check if API key is available
+    if not ELEVENLABS_API_KEY:
+        logger.error("⚠️ ElevenLabs API key not found or empty. Cannot use ElevenLabs Scribe.")
+        logger.error("Please set ELEVENLABS_API_KEY environment variable or update the value in the code.")
+        raise ValueError("ElevenLabs API key is required for transcription. Please set ELEVENLABS_API_KEY.")
+    else:
+        logger.info(f"✓ ElevenLabs API key found (length: {len(ELEVENLABS_API_KEY)})")
+    
+    # Long audio goes up as overlapping chunks transcribed concurrently
+    duration = probe_audio_duration(audio_path) if STT_CHUNK_SECONDS > 0 else None
+    if duration and duration > STT_CHUNK_SECONDS * STT_CHUNK_MIN_FACTOR:
+        from rendering.stt_chunks import transcribe_in_chunks
+        with stage("stt"):
+            result = transcribe_in_chunks(audio_path, duration, digest, language, model_id)
+    else:
+        with stage("stt_transcode"):
+            upload_path, mime_type, remove_upload = prepare_stt_audio(audio_path, digest)
+        try:
+            with stage("stt"):
+                result = request_transcription(upload_path, mime_type, language, model_id,
+                                               label=os.path.basename(audio_path))
+        finally:
+            if remove_upload:
+                os.remove(upload_path)
+    
+    cache.write_json(TRANSCRIPTION_CACHE, cache_key, result)
+    if STT_FINGERPRINT and cache.CACHE_ENABLED:
+        with stage("fingerprint_index"):
+            index_transcribed_audio(audio_path, digest, duration)
+    return result
+
+
+def index_transcribed_audio(audio_path: str, digest: str, duration: Optional[float] = None):
+    """Add the start of a freshly transcribed track to the fingerprint index."""
+    try:
+        from rendering.fingerprint import audio_fingerprint, index_fingerprint
+        index_fingerprint(digest, audio_fingerprint(audio_path), duration or probe_audio_duration(audio_path))
+    except Exception as e:
+        logger.warning(f"⚠️ Could not index audio fingerprint: {e}")
+
+
+def reuse_transcription_by_fingerprint(audio_path: str, digest: str, language: Optional[str],
+                                       model_id: Optional[str]) -> Optional[dict]:
+    """The cached transcription of an indexed track containing this audio, re-timed; or None."""
+    if not (STT_FINGERPRINT and cache.CACHE_ENABLED):
+        return None
+    try:
+        from rendering.fingerprint import (FP_QUERY_SECONDS, audio_fingerprint, find_matches,
+                                           has_indexed_tracks, shift_transcription)
+        # Nothing to match on a fresh deploy, so nothing to decode either
+        if not has_indexed_tracks():
+            return None
+        # Only the start is fingerprinted; re-timing needs the whole length
+        duration = probe_audio_duration(audio_path)
+        if duration is None:
+            return None
+        fingerprint = audio_fingerprint(audio_path, FP_QUERY_SECONDS)
+        for match in find_matches(fingerprint, exclude_digest=digest, duration=duration):
+            source = cache.read_json(TRANSCRIPTION_CACHE, transcription_cache_key("", language, model_id, match.digest))
+            if source is None:
+                continue
+            logger.info(f"✓ Audio matches transcribed track {match.digest[:12]} at {match.offset:+.2f}s "
+                        f"({match.matches} landmarks, {match.ratio:.0%}); reusing its transcription")
+            return shift_transcription(source, match.offset, duration)
+    except Exception as e:
+        logger.warning(f"⚠️ Fingerprint lookup failed: {e}")
+    return None
+
+
+def request_transcription(upload_path: str, mime_type: str, language: Optional[str] = None,
+                          model_id: Optional[str] = "scribe_v1", label: Optional[str] = None) -> dict:
+    """Send one file to the Scribe API and return its response (no caching)."""
+    url = f"{ELEVENLABS_BASE_URL}/speech-to-text"
+    file_size = os.path.getsize(upload_path) / (1024 * 1024)  # Size in MB
+    
+    logger.info(f"Preparing to transcribe audio with ElevenLabs Scribe API:")
+    logger.info(f"  - File: {label or os.path.basename(upload_path)} ({file_size:.2f} MB as {mime_type})")
+    logger.info(f"  - Language: {language if language else 'auto-detect'}")
+    logger.info(f"  - Model ID: {model_id}")
+    
+    fields = {'model_id': model_id}  # Always include model_id as it's required
+    if language:
+        fields['language'] = language
+
+    logger.info(f"🚀 Sending request to ElevenLabs Scribe API...")
+    result = get_scribe_client(ELEVENLABS_API_KEY).transcribe(url, upload_path, mime_type, fields)
+    logger.info(f"✓ ElevenLabs Scribe API request successful!")
+
+    # Log some info about the result
+    if 'text' in result:
+        text_preview = result['text'][:100] + '...' if len(result['text']) > 100 else result['text']
+        logger.info(f"✓ Transcription received: \"{text_preview}\"")
+
+    if 'words' in result:
+        logger.info(f"✓ Received timing information for {len(result['words'])} words/tokens")
+    else:
+        logger.warning("⚠️ No word-level timing information in the response")
+
+    return result
+
+
+def transcription_cache_key(audio_path: str, language: Optional[str], model_id: Optional[str],
+                            digest: Optional[str] = None) -> str:
+    return f"{digest or cache.file_digest(audio_path)}-{language or 'auto'}-{model_id}"
+
+
+def shift_word(item: dict, offset: float) -> dict:
+    """Copy of a Scribe word/token (and its characters) moved by `offset` seconds."""
+    shifted = dict(item)
+    for field in ("start", "end"):
+        if shifted.get(field) is not None:
+            shifted[field] = round(shifted[field] + offset, 3)
+    if shifted.get("characters"):
+        shifted["characters"] = [shift_word(c, offset) for c in shifted["characters"]]
+    return shifted
+
+
+def elevenlabs_to_webvtt(elevenlabs_response, transliterate: bool = False, words_per_group: int = 5) -> webvtt.WebVTT:
+    """
+    Convert ElevenLabs Scribe API response to WebVTT format.
+    
+    Args:
+        elevenlabs_response: Response from ElevenLabs Scribe API (or its WordTable)
+        transliterate: Whether to transliterate non-Latin scripts to Latin (disabled by default)
+        words_per_group: Maximum number of words per caption (default 5)
+        
+    Returns:
+        WebVTT object with all captions
+    """
+    vtt = webvtt.WebVTT()
+    
+    # All words (except spacing) with their timestamps, grouped words_per_group at a time
+    for start_time, end_time, text in word_table(elevenlabs_response).fixed_groups(words_per_group):
+        # Skip transliteration to preserve original script (Hindi/Devanagari)
+        # Modern video players support Unicode rendering
+        if transliterate and any(ord(c) > 127 for c in text):
+            try:
+                text = transliterate_hindi_to_latin(text)
+            except Exception as e:
+                logger.warning(f"Transliteration failed, keeping original text: {e}")
+        
+        # Create the caption
+        start_str = seconds_to_srt_timestamp(start_time)
+        end_str = seconds_to_srt_timestamp(end_time)
+        
+        # Ensure minimum duration (0.5 seconds for shorter groups)
+        start_seconds = parse_seconds_from_timestamp(start_str)
+        end_seconds = parse_seconds_from_timestamp(end_str)
+        if end_seconds - start_seconds < 0.5:
+            end_seconds = start_seconds + 0.5
+            end_str = seconds_to_srt_timestamp(end_seconds)
+        
+        vtt.captions.append(webvtt.Caption(start_str, end_str, text))
+    
+    return vtt
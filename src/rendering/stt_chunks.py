@@ -0,0 +1,175 @@
+"""
+Chunked, concurrent Scribe transcription for long audio.
+
+The track is cut at its quietest points near every STT_CHUNK_SECONDS into
+chunks that overlap by STT_CHUNK_OVERLAP_SECONDS on each side. Chunks are
+transcribed STT_CHUNK_FANOUT at a time and each chunk's response is cached,
+so a failed job only redoes the chunks that failed. The `words` of all chunks
+are shifted to track time and stitched: each chunk keeps the words whose
+midpoint falls in its own span, which removes the overlap duplicates. The
+result has the shape of a single Scribe response.
+"""
+import os
+import re
+import math
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from rendering import cache
+from rendering.stt import (
+    STT_CHUNK_SECONDS, STT_CHUNK_FANOUT, STT_AUDIO_FORMAT, STT_AUDIO_ENCODINGS, TRANSCRIPTION_CACHE,
+    _transcode_for_stt, request_transcription, shift_word
+)
+
+logger = logging.getLogger(__name__)
+
+STT_CHUNK_OVERLAP_SECONDS = float(os.environ.get("STT_CHUNK_OVERLAP_SECONDS", "2.0"))
+# How far from each even split point to look for a quiet spot
+STT_SPLIT_SEARCH_SECONDS = 20.0
+STT_SPLIT_SAMPLE_RATE = 4000
+STT_SPLIT_FRAME_SECONDS = 0.05
+STT_SPLIT_SMOOTH_FRAMES = 6
+
+
+def find_split_points(audio_path: str, duration: float, chunk_seconds: float = STT_CHUNK_SECONDS) -> List[float]:
+    """
+    Chunk boundaries, including 0 and `duration`: evenly spaced targets, each
+    moved to the lowest-energy point within STT_SPLIT_SEARCH_SECONDS (at most a
+    quarter chunk).
+    """
+    count = max(1, math.ceil(duration / chunk_seconds))
+    targets = [duration * i / count for i in range(1, count)]
+    if not targets:
+        return [0.0, duration]
+
+    try:
+        import numpy as np
+        from rendering.pcm import decoded_pcm
+
+        samples = decoded_pcm(audio_path, STT_SPLIT_SAMPLE_RATE)
+        frame = int(STT_SPLIT_FRAME_SECONDS * STT_SPLIT_SAMPLE_RATE)
+        frames = samples[:len(samples) // frame * frame].reshape(-1, frame)
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        # Prefer sustained quiet over a single quiet frame
+        rms = np.convolve(rms, np.ones(STT_SPLIT_SMOOTH_FRAMES) / STT_SPLIT_SMOOTH_FRAMES, mode="same")
+
+        # Never far enough to make a chunk much shorter or longer than planned
+        search = int(min(STT_SPLIT_SEARCH_SECONDS, duration / count / 4) / STT_SPLIT_FRAME_SECONDS)
+        points = []
+        for target in targets:
+            center = int(target / STT_SPLIT_FRAME_SECONDS)
+            lo, hi = max(0, center - search), min(len(rms), center + search + 1)
+            if hi <= lo:
+                points.append(target)
+                continue
+            points.append((lo + int(np.argmin(rms[lo:hi]))) * STT_SPLIT_FRAME_SECONDS)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not analyse audio for split points, splitting evenly: {e}")
+        points = targets
+
+    return [0.0] + sorted(points) + [duration]
+
+
+def transcribe_chunk(audio_path: str, digest: str, index: int, start: float, end: float,
+                     duration: float, language: Optional[str], model_id: Optional[str]) -> dict:
+    """Transcribe [start - overlap, end + overlap] of the track; cached per chunk."""
+    clip_start = max(0.0, start - STT_CHUNK_OVERLAP_SECONDS)
+    clip_end = min(duration, end + STT_CHUNK_OVERLAP_SECONDS)
+    key = f"{digest}-chunk-{clip_start:.3f}-{clip_end:.3f}-{language or 'auto'}-{model_id}"
+    cached = cache.read_json(TRANSCRIPTION_CACHE, key)
+    if cached is not None:
+        logger.info(f"✓ Using cached transcription for chunk {index + 1}")
+        return {"offset": clip_start, "response": cached}
+
+    # Chunks are always transcoded; 'original' falls back to Opus
+    fmt = STT_AUDIO_FORMAT if STT_AUDIO_FORMAT in STT_AUDIO_ENCODINGS else "opus"
+    _, suffix, mime = STT_AUDIO_ENCODINGS[fmt]
+    fd, chunk_path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        _transcode_for_stt(audio_path, chunk_path, fmt, start=clip_start, length=clip_end - clip_start)
+        response = request_transcription(
+            chunk_path, mime, language, model_id,
+            label=f"{os.path.basename(audio_path)} chunk {index + 1} ({clip_start:.1f}s - {clip_end:.1f}s)"
+        )
+    finally:
+        os.remove(chunk_path)
+
+    cache.write_json(TRANSCRIPTION_CACHE, key, response)
+    return {"offset": clip_start, "response": response}
+
+
+def _norm(text: str) -> str:
+    return re.sub(r"[^\w]", "", text.lower())
+
+
+def stitch_chunk_responses(chunks: List[dict], boundaries: List[float]) -> dict:
+    """
+    Merge per-chunk responses ({'offset', 'response'}, in order) into one
+    Scribe-shaped response. Chunk i owns [boundaries[i], boundaries[i + 1]).
+    """
+    words = []
+    for i, chunk in enumerate(chunks):
+        own_start, own_end = boundaries[i], boundaries[i + 1]
+        last = i == len(chunks) - 1
+        kept = []
+        for item in chunk["response"].get("words", []):
+            item = shift_word(item, chunk["offset"])
+            start = item.get("start", 0.0)
+            mid = (start + item.get("end", start)) / 2
+            if own_start <= mid < own_end or (last and mid >= own_end):
+                kept.append(item)
+
+        while kept and kept[0].get("type") == "spacing":
+            kept.pop(0)
+        previous = [w for w in words if w.get("type") == "word"]
+        if kept and previous and kept[0].get("type") == "word":
+            # Same word heard by both chunks with slightly different timings
+            if _norm(kept[0]["text"]) == _norm(previous[-1]["text"]) and kept[0]["start"] < previous[-1]["end"]:
+                kept.pop(0)
+                while kept and kept[0].get("type") == "spacing":
+                    kept.pop(0)
+        if words and kept and words[-1].get("type") != "spacing":
+            words.append({"text": " ", "start": words[-1]["end"], "end": kept[0]["start"], "type": "spacing"})
+        words.extend(kept)
+
+    while words and words[-1].get("type") == "spacing":
+        words.pop()
+
+    first = chunks[0]["response"] if chunks else {}
+    return {
+        "language_code": first.get("language_code"),
+        "language_probability": first.get("language_probability"),
+        "text": "".join(w.get("text", "") for w in words),
+        "words": words,
+        "chunks": len(chunks),
+    }
+
+
+def transcribe_in_chunks(audio_path: str, duration: float, digest: str,
+                         language: Optional[str] = None, model_id: Optional[str] = "scribe_v1") -> dict:
+    """Transcribe long audio as concurrent chunks and return one stitched response."""
+    boundaries = find_split_points(audio_path, duration)
+    count = len(boundaries) - 1
+    logger.info(f"🚀 Transcribing {duration:.0f}s of audio as {count} chunks, {STT_CHUNK_FANOUT} at a time "
+                f"(splits at {', '.join(f'{b:.1f}s' for b in boundaries[1:-1])})")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(STT_CHUNK_FANOUT, count))) as pool:
+        futures = [
+            pool.submit(transcribe_chunk, audio_path, digest, i, boundaries[i], boundaries[i + 1],
+                        duration, language, model_id)
+            for i in range(count)
+        ]
+        # Let every chunk finish (and be cached) before reporting a failure
+        errors = [f.exception() for f in futures]
+
+    failed = [i + 1 for i, e in enumerate(errors) if e is not None]
+    if failed:
+        first_error = next(e for e in errors if e is not None)
+        raise ValueError(f"Transcription failed for chunk(s) {', '.join(map(str, failed))} of {count}: {first_error}")
+
+    result = stitch_chunk_responses([f.result() for f in futures], boundaries)
+    logger.info(f"✓ Stitched {count} chunks into {len(result['words'])} words/tokens")
+    return result
@@ -0,0 +1,228 @@
+"""
+Shared HTTP client for the Scribe API: one pooled requests.Session per
+process, connect/read timeouts, retries with jittered exponential backoff on
+429/5xx and network errors (honouring Retry-After), and optional hedging.
+
+With hedging on, a call still running after the p95 latency of recent calls
+(scaled by upload size) gets a duplicate request, and whichever answers first
+wins. The duplicate costs Scribe quota, so hedging is opt-in (STT_HEDGE).
+Every request first takes a slot from the cluster-wide limiter (stt_limiter).
+Waiting for it is timed as its own stage, stt_limiter_wait; latency samples
+and the hedging countdown start only once the request is on the wire.
+"""
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rendering.stt_limiter import get_stt_limiter
+from rendering.metrics import STT_RESPONSES, STT_RETRIES, TRANSFER_BYTES
+from rendering.stages import stage
+
+logger = logging.getLogger(__name__)
+
+STT_CONNECT_TIMEOUT = float(os.environ.get("STT_CONNECT_TIMEOUT", "10"))
+STT_READ_TIMEOUT = float(os.environ.get("STT_READ_TIMEOUT", "300"))
+STT_MAX_RETRIES = int(os.environ.get("STT_MAX_RETRIES", "4"))
+STT_BACKOFF_BASE = 1.0
+STT_BACKOFF_MAX = 30.0
+# A Retry-After longer than this is treated as "not soon": give up instead of blocking the worker
+STT_RETRY_AFTER_MAX = float(os.environ.get("STT_RETRY_AFTER_MAX", "60"))
+STT_POOL_SIZE = int(os.environ.get("STT_POOL_SIZE", "8"))
+
+STT_HEDGE = os.environ.get("STT_HEDGE", "false").lower() == "true"
+STT_HEDGE_MIN_SAMPLES = 20
+STT_HEDGE_MIN_SECONDS = 5.0
+STT_LATENCY_WINDOW = 200
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class ScribeRequestError(ValueError):
+    """A Scribe call that failed for good; `retryable` is False for auth/request errors."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds from now: delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(STT_BACKOFF_MAX, STT_BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class ScribeClient:
+    """Pooled, timeout-bounded Scribe HTTP client. Thread-safe; share one per process."""
+
+    def __init__(self, api_key: str, pool_size: int = STT_POOL_SIZE):
+        self.api_key = api_key
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # Seconds per MB uploaded, for the hedging threshold
+        self._latencies = deque(maxlen=STT_LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=pool_size * 2, thread_name_prefix="stt-hedge") if STT_HEDGE else None
+
+    # --------------------------------------------------------------------------
+    # Single request
+    # --------------------------------------------------------------------------
+    def _send(self, url: str, upload_path: str, mime_type: str, fields: dict, size_mb: float,
+              issued: Optional[threading.Event] = None) -> dict:
+        """
+        One request. `issued` is set once it holds a limiter slot and is sent
+        (or failed before that); its latency sample is taken from there.
+        """
+        from requests_toolbelt import MultipartEncoder
+
+        with open(upload_path, "rb") as f:
+            multipart_data = MultipartEncoder(fields={**fields, "file": (os.path.basename(upload_path), f, mime_type)})
+            headers = {
+                "Accept": "application/json",
+                "xi-api-key": self.api_key,
+                "Content-Type": multipart_data.content_type
+            }
+            try:
+                with ExitStack() as held:
+                    try:
+                        with stage("stt_limiter_wait"):
+                            held.enter_context(get_stt_limiter().slot(os.path.basename(upload_path)))
+                    finally:
+                        if issued is not None:
+                            issued.set()
+                    started = time.monotonic()
+                    response = self.session.post(url, headers=headers, data=multipart_data,
+                                                 timeout=(STT_CONNECT_TIMEOUT, STT_READ_TIMEOUT))
+                    seconds = time.monotonic() - started
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                STT_RESPONSES.labels("network").inc()
+                raise ScribeRequestError(f"Network error calling ElevenLabs: {e}", retryable=True)
+            except requests.exceptions.RequestException as e:
+                STT_RESPONSES.labels("network").inc()
+                raise ScribeRequestError(f"Failed to transcribe audio with ElevenLabs: {e}")
+            TRANSFER_BYTES.labels("stt", "out").inc(multipart_data.len)
+
+        STT_RESPONSES.labels(str(response.status_code)).inc()
+        if response.status_code == 200:
+            with self._lock:
+                self._latencies.append(seconds / size_mb)
+            return response.json()
+        if response.status_code == 401:
+            logger.error("❌ Authentication failed. Check your ElevenLabs API key.")
+            logger.error(f"Response: {response.text}")
+            raise ScribeRequestError("Invalid ElevenLabs API key", status=401)
+        if response.status_code in RETRYABLE_STATUS:
+            raise ScribeRequestError(
+                f"ElevenLabs API returned {response.status_code}: {response.text[:200]}",
+                status=response.status_code, retryable=True,
+                retry_after=parse_retry_after(response.headers.get("Retry-After"))
+            )
+        logger.error(f"❌ ElevenLabs API returned status code {response.status_code}")
+        logger.error(f"Response: {response.text}")
+        raise ScribeRequestError(f"ElevenLabs API returned {response.status_code}: {response.text[:200]}",
+                                 status=response.status_code)
+
+    # --------------------------------------------------------------------------
+    # Hedging
+    # --------------------------------------------------------------------------
+    def hedge_delay(self, size_mb: float) -> Optional[float]:
+        """p95 of recent per-MB latencies scaled to this upload, or None until there are enough samples."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < STT_HEDGE_MIN_SAMPLES:
+            return None
+        p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+        return max(STT_HEDGE_MIN_SECONDS, p95 * size_mb)
+
+    def _hedged_send(self, url: str, upload_path: str, mime_type: str, fields: dict, size_mb: float) -> dict:
+        delay = self.hedge_delay(size_mb) if self._hedge_pool else None
+        if delay is None:
+            return self._send(url, upload_path, mime_type, fields, size_mb)
+
+        issued = threading.Event()
+        primary = self._hedge_pool.submit(self._send, url, upload_path, mime_type, fields, size_mb, issued)
+        primary.add_done_callback(lambda _: issued.set())
+        pending = {primary}
+        # A request still queued on the limiter isn't slow; count down from when it is sent
+        issued.wait()
+        done, pending = wait(pending, timeout=delay)
+        if not done:
+            logger.info(f"⏱️ Scribe call still running after {delay:.1f}s (p95), sending a hedged request")
+            pending.add(self._hedge_pool.submit(self._send, url, upload_path, mime_type, fields, size_mb))
+
+        error = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    # The slower request finishes in the background and is discarded
+                    return future.result()
+                error = error or future.exception()
+            if not pending:
+                raise error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    # --------------------------------------------------------------------------
+    # Public API
+    # --------------------------------------------------------------------------
+    def transcribe(self, url: str, upload_path: str, mime_type: str, fields: dict) -> dict:
+        """POST `upload_path` with `fields` as multipart, retrying transient failures."""
+        size_mb = max(0.1, os.path.getsize(upload_path) / (1024 * 1024))
+        for attempt in range(STT_MAX_RETRIES + 1):
+            try:
+                return self._hedged_send(url, upload_path, mime_type, fields, size_mb)
+            except ScribeRequestError as e:
+                if not e.retryable or attempt == STT_MAX_RETRIES:
+                    if e.status == 429:
+                        raise ScribeRequestError("ElevenLabs API rate limit exceeded or quota exhausted",
+                                                 status=429)
+                    raise
+                if e.retry_after is not None and e.retry_after > STT_RETRY_AFTER_MAX:
+                    raise ScribeRequestError(f"ElevenLabs asked to retry in {e.retry_after:.0f}s: {e}",
+                                             status=e.status)
+                delay = backoff_delay(attempt, e.retry_after)
+                logger.warning(f"⚠️ {e} - retrying in {delay:.1f}s (attempt {attempt + 2}/{STT_MAX_RETRIES + 1})")
+                STT_RETRIES.inc()
+                time.sleep(delay)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_scribe_client(api_key: str) -> ScribeClient:
+    """The process-wide client (rebuilt if the API key changes)."""
+    global _client
+    with _client_lock:
+        if _client is None or _client.api_key != api_key:
+            _client = ScribeClient(api_key)
+        return _client
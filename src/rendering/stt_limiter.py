@@ -0,0 +1,169 @@
+"""
+Cluster-wide Scribe rate limiter shared through Redis.
+
+Every Scribe request (retries and hedges included) takes a slot first: a
+token from a bucket refilled at STT_RATE_PER_MINUTE and, with
+STT_MAX_CONCURRENT set, one of that many concurrency leases. Both are updated
+atomically in one Lua script using the Redis clock, so API workers, render
+workers and RunPod handlers pointing at the same Redis share the ElevenLabs
+plan limits. Callers wait for a slot instead of failing; leases expire after
+STT_LEASE_SECONDS so a crashed holder can't leak one.
+
+Without Redis the limiter degrades to a per-process concurrency cap.
+"""
+import os
+import time
+import uuid
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
+# ElevenLabs plan limits; 0 disables the respective limit
+STT_RATE_PER_MINUTE = float(os.environ.get("STT_RATE_PER_MINUTE", "0"))
+STT_BURST = int(os.environ.get("STT_BURST", "0")) or None
+STT_MAX_CONCURRENT = int(os.environ.get("STT_MAX_CONCURRENT", "0"))
+# How long a caller waits for a slot before giving up
+STT_LIMIT_WAIT_MAX = float(os.environ.get("STT_LIMIT_WAIT_MAX", "600"))
+# Longer than any single request (STT_READ_TIMEOUT) so live leases never expire
+STT_LEASE_SECONDS = float(os.environ.get("STT_LEASE_SECONDS", "360"))
+STT_POLL_SECONDS = 0.25
+
+BUCKET_KEY = "stt:limiter:bucket"
+LEASES_KEY = "stt:limiter:leases"
+
+# Returns 0 when a slot was taken, otherwise the seconds to wait before trying again
+_ACQUIRE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_concurrent = tonumber(ARGV[3])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if max_concurrent > 0 and redis.call('ZCARD', KEYS[2]) >= max_concurrent then
+    return tostring(-1)
+end
+
+if rate > 0 then
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    if tokens < 1 then
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+        return tostring((1 - tokens) / rate)
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+end
+
+if max_concurrent > 0 then
+    redis.call('ZADD', KEYS[2], now + tonumber(ARGV[5]), ARGV[4])
+    redis.call('EXPIRE', KEYS[2], tonumber(ARGV[5]) + 60)
+end
+return tostring(0)
+"""
+
+
+class STTLimiter:
+    """Token bucket plus concurrency leases in Redis; see the module docstring."""
+
+    def __init__(self, redis_client, rate_per_minute: float = STT_RATE_PER_MINUTE,
+                 burst: Optional[int] = STT_BURST, max_concurrent: int = STT_MAX_CONCURRENT):
+        self.redis = redis_client
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst or max(1, max_concurrent or int(rate_per_minute / 6) or 1)
+        self.max_concurrent = max_concurrent
+        self._acquire = redis_client.register_script(_ACQUIRE_SCRIPT) if redis_client is not None else None
+        self._local = threading.BoundedSemaphore(max_concurrent) if max_concurrent > 0 else None
+        self._redis_down = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 or self.max_concurrent > 0
+
+    def try_acquire(self, lease_id: str) -> float:
+        """Take a slot if one is free; returns 0 on success, else seconds to wait (-1: concurrency full)."""
+        return float(self._acquire(
+            keys=[BUCKET_KEY, LEASES_KEY],
+            args=[self.rate, self.burst, self.max_concurrent, lease_id, STT_LEASE_SECONDS]
+        ))
+
+    def release(self, lease_id: str):
+        if self.max_concurrent > 0:
+            self.redis.zrem(LEASES_KEY, lease_id)
+
+    @contextmanager
+    def slot(self, label: str = "Scribe request"):
+        """Hold one slot for the duration of the block, waiting up to STT_LIMIT_WAIT_MAX for it."""
+        if not self.enabled:
+            yield
+            return
+
+        import redis
+
+        lease_id = uuid.uuid4().hex
+        started = next_log = time.monotonic()
+        try:
+            while True:
+                wait = self.try_acquire(lease_id)
+                if wait == 0:
+                    break
+                waited = time.monotonic() - started
+                if waited > STT_LIMIT_WAIT_MAX:
+                    raise ValueError(f"Timed out after {waited:.0f}s waiting for STT capacity")
+                if time.monotonic() >= next_log:
+                    logger.info(f"⏳ {label} waiting for STT capacity "
+                                f"({'concurrency limit' if wait < 0 else f'rate limit, {wait:.1f}s'})")
+                    next_log += 30
+                sleep = STT_POLL_SECONDS if wait < 0 else wait
+                time.sleep(sleep * random.uniform(1.0, 1.5))
+        except redis.exceptions.RedisError as e:
+            if not self._redis_down:
+                logger.warning(f"⚠️ STT limiter can't reach Redis, limiting this process only: {e}")
+                self._redis_down = True
+            with self._local_slot():
+                yield
+            return
+
+        self._redis_down = False
+        waited = time.monotonic() - started
+        if waited > 1:
+            logger.info(f"✓ {label} got an STT slot after {waited:.1f}s")
+        try:
+            yield
+        finally:
+            try:
+                self.release(lease_id)
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"⚠️ Could not release STT lease (expires in {STT_LEASE_SECONDS:.0f}s): {e}")
+
+    @contextmanager
+    def _local_slot(self):
+        if self._local is None:
+            yield
+            return
+        with self._local:
+            yield
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_stt_limiter() -> STTLimiter:
+    """The process-wide limiter, connected to REDIS_URL when limits are configured."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            client = None
+            if STT_RATE_PER_MINUTE > 0 or STT_MAX_CONCURRENT > 0:
+                import redis
+                client = redis.from_url(REDIS_URL, socket_timeout=5, socket_connect_timeout=5)
+            _limiter = STTLimiter(client)
+        return _limiter
@@ -0,0 +1,146 @@
+"""
+Subtitle export: turn a render plan into WebVTT, SRT, ASS or JSON.
+
+Everything works from `display_cues`, the same timing the renderer uses, so
+exported subtitles line up with a rendered video of the same plan. No MoviePy.
+"""
+import json
+import logging
+from typing import List
+
+from rendering.plan import display_cues
+from rendering.timing import seconds_to_srt_timestamp
+
+logger = logging.getLogger(__name__)
+
+SUBTITLE_FORMATS = {
+    "vtt": "text/vtt",
+    "srt": "application/x-subrip",
+    "ass": "text/x-ssa",
+    "json": "application/json",
+}
+
+# ASS is laid out for a vertical reel; players scale it to the actual video
+ASS_PLAY_RES = (1080, 1920)
+
+
+def export_entries(plan: dict, granularity: str = "group") -> List[dict]:
+    """
+    Timed entries to write: 'group' gives one entry per word group exactly as
+    shown in the video, 'line' one entry per aligned lyrics line.
+    """
+    cues = display_cues(plan)
+    if granularity == "line":
+        return [{"start": c["start"], "end": c["end"], "text": c["text"]} for c in cues]
+    return [group for c in cues for group in c["groups"]]
+
+
+def to_webvtt(entries: List[dict]) -> str:
+    blocks = ["WEBVTT\n"]
+    for e in entries:
+        blocks.append(f"{seconds_to_srt_timestamp(e['start'])} --> {seconds_to_srt_timestamp(e['end'])}\n{e['text']}\n")
+    return "\n".join(blocks)
+
+
+def to_srt(entries: List[dict]) -> str:
+    blocks = []
+    for i, e in enumerate(entries, start=1):
+        # SRT uses a comma before the milliseconds
+        start = seconds_to_srt_timestamp(e["start"]).replace(".", ",")
+        end = seconds_to_srt_timestamp(e["end"]).replace(".", ",")
+        blocks.append(f"{i}\n{start} --> {end}\n{e['text']}\n")
+    return "\n".join(blocks)
+
+
+def _ass_timestamp(seconds: float) -> str:
+    centis = int(round(seconds * 100))
+    hours, centis = divmod(centis, 360000)
+    minutes, centis = divmod(centis, 6000)
+    secs, centis = divmod(centis, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centis:02d}"
+
+
+def _ass_color(color: str, alpha: int = 0) -> str:
+    """CSS color name or #hex -> ASS &HAABBGGRR (alpha 0 is opaque)."""
+    from PIL import ImageColor
+
+    try:
+        r, g, b = ImageColor.getrgb(color)[:3]
+    except ValueError:
+        logger.warning(f"Unknown subtitle color '{color}', using yellow")
+        r, g, b = 255, 255, 0
+    return f"&H{alpha:02X}{b:02X}{g:02X}{r:02X}"
+
+
+def to_ass(entries: List[dict], style: dict) -> str:
+    width, height = ASS_PLAY_RES
+    # The renderer centers a 100px caption box at 80% of the frame height
+    margin_v = int(height * 0.2) - 100
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 0",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+        "Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: Default,Arial,{style.get('font_size', 45)},{_ass_color(style.get('font_color', 'yellow'))},"
+        f"&H000000FF,&H00000000,&H87000000,0,0,0,0,100,100,0,0,1,2,0,2,10,10,{margin_v},1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for e in entries:
+        text = e["text"].replace("\n", "\\N")
+        lines.append(f"Dialogue: 0,{_ass_timestamp(e['start'])},{_ass_timestamp(e['end'])},Default,,0,0,0,,{text}")
+    return "\n".join(lines) + "\n"
+
+
+def to_json(plan: dict) -> str:
+    """
+    Lines with their displayed word groups and per-word times. Captions aligned
+    to a Scribe transcription carry the transcribed words' times; a word Scribe
+    did not hear, and every word of a caption timed without a transcription
+    (uploaded timings, 'even' or 'vad' alignment), is spread evenly over its
+    group the way the video reveals it and marked "interpolated": true.
+    """
+    lines = []
+    for cue in display_cues(plan):
+        words = cue.get("words")
+        if not words:
+            words = []
+            for group in cue["groups"]:
+                group_words = group["text"].split()
+                step = (group["end"] - group["start"]) / len(group_words)
+                words.extend(
+                    {"text": w, "start": group["start"] + i * step, "end": group["start"] + (i + 1) * step,
+                     "interpolated": True}
+                    for i, w in enumerate(group_words)
+                )
+        lines.append({
+            "start": round(cue["start"], 3),
+            "end": round(cue["end"], 3),
+            "text": cue["text"],
+            "groups": [{"start": round(g["start"], 3), "end": round(g["end"], 3), "text": g["text"]} for g in cue["groups"]],
+            "words": [{**w, "start": round(w["start"], 3), "end": round(w["end"], 3)} for w in words],
+        })
+    return json.dumps({"duration": plan["duration"], "lines": lines}, ensure_ascii=False, indent=2)
+
+
+def export_subtitles(plan: dict, fmt: str, granularity: str = "group") -> str:
+    """Render a plan's captions in one of SUBTITLE_FORMATS."""
+    if fmt not in SUBTITLE_FORMATS:
+        raise ValueError(f"Unsupported subtitle format '{fmt}'. Use one of: {', '.join(SUBTITLE_FORMATS)}")
+    if granularity not in ("group", "line"):
+        raise ValueError("granularity must be 'group' or 'line'")
+    if fmt == "json":
+        return to_json(plan)
+    entries = export_entries(plan, granularity)
+    if fmt == "vtt":
+        return to_webvtt(entries)
+    if fmt == "srt":
+        return to_srt(entries)
+    return to_ass(entries, plan["style"])
@@ -0,0 +1,164 @@
+"""
+Bring-your-own timings: parse SRT, WebVTT, LRC or JSON timed lyrics into cues.
+
+Jobs with a timing file skip transcription and alignment; the cues go
+straight to caption optimization and rendering (alignment_mode 'provided').
+Every parser returns [{'start', 'end', 'text'}] in seconds, sorted by start,
+and raises ValueError with a message fit for an API response.
+"""
+import re
+import json
+import math
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+TIMING_FORMATS = ("srt", "vtt", "lrc", "json")
+TIMING_FILE_MAX_BYTES = 1024 * 1024
+MAX_TIMED_CUES = 2000
+# An LRC line ends where the next one starts; the last one this long at most
+LRC_LAST_LINE_SECONDS = 5.0
+
+_CUE_TIME = re.compile(r"(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[.,](\d{1,3}))?")
+_CUE_ARROW = re.compile(r"^\s*(\S+)\s*-->\s*(\S+)")
+_LRC_TAG = re.compile(r"\[(\d+):(\d{1,2}(?:[.:]\d{1,3})?)\]")
+_LRC_OFFSET = re.compile(r"\[offset:\s*([+-]?\d+)\s*\]", re.IGNORECASE)
+_LRC_WORD_TAG = re.compile(r"<\d+:\d{1,2}(?:[.:]\d{1,3})?>")
+_MARKUP = re.compile(r"<[^>]+>|\{\\[^}]*\}")
+
+
+def timing_format(filename: str) -> str:
+    """Format from the file extension ('srt', 'vtt', 'lrc' or 'json')."""
+    fmt = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if fmt not in TIMING_FORMATS:
+        raise ValueError(f"Timing file must be one of: {', '.join('.' + f for f in TIMING_FORMATS)}")
+    return fmt
+
+
+def _cue_seconds(timestamp: str) -> float:
+    match = _CUE_TIME.fullmatch(timestamp)
+    if not match:
+        raise ValueError(f"Invalid timestamp '{timestamp}'")
+    hours, minutes, seconds, fraction = match.groups()
+    return (int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+            + (int(fraction.ljust(3, "0")) / 1000 if fraction else 0.0))
+
+
+def parse_srt_or_vtt(text: str) -> List[dict]:
+    """SRT and WebVTT share the cue layout: optional id, 'start --> end', text lines."""
+    cues = []
+    for block in re.split(r"\n\s*\n", text.replace("\r\n", "\n").strip()):
+        lines = block.split("\n")
+        for i, line in enumerate(lines):
+            match = _CUE_ARROW.match(line)
+            if match:
+                # VTT cue settings after the end time are ignored
+                caption = " ".join(_MARKUP.sub("", l).strip() for l in lines[i + 1:] if l.strip())
+                cues.append({
+                    "start": _cue_seconds(match.group(1)),
+                    "end": _cue_seconds(match.group(2)),
+                    "text": caption
+                })
+                break
+    return cues
+
+
+def parse_lrc(text: str) -> List[dict]:
+    """[mm:ss.xx] lines; enhanced-LRC word tags are dropped, [offset:ms] honoured."""
+    offset_match = _LRC_OFFSET.search(text)
+    # A positive LRC offset shows lyrics earlier
+    offset = -int(offset_match.group(1)) / 1000 if offset_match else 0.0
+
+    starts = []
+    for line in text.splitlines():
+        tags = _LRC_TAG.findall(line)
+        if not tags:
+            continue
+        caption = _LRC_WORD_TAG.sub("", _LRC_TAG.sub("", line)).strip()
+        for minutes, seconds in tags:
+            starts.append((max(0.0, int(minutes) * 60 + float(seconds.replace(":", ".")) + offset), caption))
+
+    starts.sort(key=lambda s: s[0])
+    cues = []
+    for i, (start, caption) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else start + LRC_LAST_LINE_SECONDS
+        # Empty lines only mark where the previous lyric ends
+        if caption:
+            cues.append({"start": start, "end": end, "text": caption})
+    return cues
+
+
+def parse_json_timings(text: str) -> List[dict]:
+    """
+    A list of {'start', 'end', 'text'} (seconds), or an object holding one
+    under 'cues' or 'lines' (so the JSON from POST /subtitles round-trips).
+    """
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON timing file: {e}")
+    if isinstance(data, dict):
+        data = data.get("cues", data.get("lines"))
+    if not isinstance(data, list):
+        raise ValueError("JSON timing file must be a list of cues or have a 'cues' or 'lines' list")
+
+    cues = []
+    for i, item in enumerate(data):
+        try:
+            cues.append({"start": float(item["start"]), "end": float(item["end"]), "text": str(item["text"])})
+        except (TypeError, KeyError, ValueError):
+            raise ValueError(f"Cue {i + 1} needs numeric 'start' and 'end' and a 'text'")
+    return cues
+
+
+def validate_cues(cues: List[dict], duration: Optional[float] = None) -> List[dict]:
+    """
+    Sort, drop empty captions and check times. With `duration`, cues past the
+    end of the audio are dropped and the last ones clamped to it.
+    """
+    cues = sorted(
+        ({**c, "text": c["text"].strip()} for c in cues if c["text"].strip()),
+        key=lambda c: c["start"]
+    )
+    if not cues:
+        raise ValueError("Timing file contains no captions")
+    if len(cues) > MAX_TIMED_CUES:
+        raise ValueError(f"Timing file has {len(cues)} captions, the maximum is {MAX_TIMED_CUES}")
+    for i, cue in enumerate(cues):
+        # NaN passes every comparison below and 1e999 parses as inf
+        if not (math.isfinite(cue["start"]) and math.isfinite(cue["end"])):
+            raise ValueError(f"Caption {i + 1} ('{cue['text'][:30]}') has a non-finite time "
+                             f"{cue['start']} - {cue['end']}")
+        if cue["start"] < 0 or cue["end"] <= cue["start"]:
+            raise ValueError(f"Caption {i + 1} ('{cue['text'][:30]}') has an invalid time range "
+                             f"{cue['start']:.3f}s - {cue['end']:.3f}s")
+
+    if duration is not None:
+        cues = [{**c, "end": min(c["end"], duration)} for c in cues if c["start"] < duration]
+        if not cues:
+            raise ValueError(f"All captions in the timing file start after the end of the audio ({duration:.2f}s)")
+    return cues
+
+
+def parse_timings(text: str, filename: str, duration: Optional[float] = None) -> List[dict]:
+    """Parse and validate a timing file's content; the format comes from `filename`."""
+    fmt = timing_format(filename)
+    if fmt == "json":
+        cues = parse_json_timings(text)
+    elif fmt == "lrc":
+        cues = parse_lrc(text)
+    else:
+        cues = parse_srt_or_vtt(text)
+    cues = validate_cues(cues, duration)
+    logger.info(f"Parsed {len(cues)} timed captions from {fmt.upper()} file")
+    return cues
+
+
+def decode_timing_file(content: bytes) -> str:
+    if len(content) > TIMING_FILE_MAX_BYTES:
+        raise ValueError(f"Timing file is larger than {TIMING_FILE_MAX_BYTES // 1024} KB")
+    try:
+        return content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("Timing file must be UTF-8 text")
@@ -0,0 +1,162 @@
+"""
+Timestamp helpers and caption timing optimization (HH:MM:SS.mmm strings).
+"""
+import re
+import logging
+import datetime
+from typing import List
+
+import webvtt
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------------------------
+# Utility: Parse SRT/WebVTT times
+# ------------------------------------------------------------------------------
+def parse_time(time_str: str) -> datetime.time:
+    """Parse SRT timestamp string to datetime.time object."""
+    try:
+        # Split into hours, minutes, seconds, and milliseconds
+        time_parts = re.split(r'[:.]', time_str)
+        if len(time_parts) != 4:
+            raise ValueError("Invalid time format")
+        
+        hours = int(time_parts[0])
+        minutes = int(time_parts[1])
+        seconds = int(time_parts[2])
+        milliseconds = int(time_parts[3])
+        
+        # Create time object with microseconds (milliseconds * 1000)
+        microseconds = (milliseconds % 1000) * 1000
+        return datetime.time(hours, minutes, seconds, microseconds)
+    except Exception as e:
+        logger.error(f"Error parsing time string '{time_str}': {str(e)}")
+        return None
+    
+def seconds_to_srt_timestamp(seconds: float) -> str:
+    """
+    Convert a float number of seconds to an SRT/WebVTT timestamp: HH:MM:SS.mmm
+    """
+    td = datetime.timedelta(seconds=seconds)
+    total_seconds = int(td.total_seconds())
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    secs = total_seconds % 60
+    millis = int((td.total_seconds() - total_seconds) * 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+
+# ------------------------------------------------------------------------------
+# Utility: Optimize Subtitles
+# ------------------------------------------------------------------------------
+def optimize_subtitles_for_timing(captions: List[webvtt.Caption]) -> List[webvtt.Caption]:
+    """
+    - Merge short captions
+    - Add buffer time
+    - Break up overly long lines
+    """
+    if not captions:
+        return []
+
+    MIN_DURATION = 1.0   # merge very short segments
+    BUFFER_TIME = 0.2
+    MAX_CHARS_PER_LINE = 60
+
+    optimized_captions = []
+    current_caption = None
+    current_start_seconds = None
+    current_end_seconds = None
+
+    for caption in captions:
+        start_time_obj = parse_time(caption.start)
+        end_time_obj = parse_time(caption.end)
+        if start_time_obj is None or end_time_obj is None:
+            continue
+
+        start_s = (start_time_obj.hour * 3600
+                   + start_time_obj.minute * 60
+                   + start_time_obj.second
+                   + start_time_obj.microsecond / 1e6)
+        end_s = (end_time_obj.hour * 3600
+                 + end_time_obj.minute * 60
+                 + end_time_obj.second
+                 + end_time_obj.microsecond / 1e6)
+
+        if end_s <= start_s:
+            continue
+
+        text = caption.text.strip()
+
+        if current_caption:
+            duration = current_end_seconds - current_start_seconds
+            if duration < MIN_DURATION:
+                # Merge with the current caption
+                current_caption.text = f"{current_caption.text} {text}"
+                current_end_seconds = end_s
+                continue
+
+            # Otherwise, finalize the current caption
+            optimized_captions.append(
+                webvtt.Caption(
+                    seconds_to_srt_timestamp(current_start_seconds),
+                    seconds_to_srt_timestamp(current_end_seconds),
+                    current_caption.text
+                )
+            )
+            current_caption = None
+
+        if not current_caption:
+            current_caption = caption
+            current_start_seconds = start_s
+            current_end_seconds = end_s
+
+        # Add buffer from previous
+        if optimized_captions:
+            prev_end_obj = parse_time(optimized_captions[-1].end)
+            if prev_end_obj:
+                prev_end_s = (prev_end_obj.hour * 3600
+                              + prev_end_obj.minute * 60
+                              + prev_end_obj.second
+                              + prev_end_obj.microsecond / 1e6)
+                current_start_seconds = max(current_start_seconds, prev_end_s + BUFFER_TIME)
+
+        # Split if line is too long
+        if len(text) > MAX_CHARS_PER_LINE:
+            words = text.split()
+            lines = []
+            tmp_line = ""
+            for w in words:
+                if len(tmp_line) + len(w) + 1 > MAX_CHARS_PER_LINE:
+                    lines.append(tmp_line.strip())
+                    tmp_line = ""
+                tmp_line += w + " "
+            lines.append(tmp_line.strip())
+            current_caption.text = "\n".join(lines)
+
+    # Final flush
+    if current_caption:
+        optimized_captions.append(
+            webvtt.Caption(
+                seconds_to_srt_timestamp(current_start_seconds),
+                seconds_to_srt_timestamp(current_end_seconds),
+                current_caption.text
+            )
+        )
+
+    return optimized_captions
+
+
+def parse_seconds_from_timestamp(timestamp: str) -> float:
+    """Converts a timestamp string (HH:MM:SS.mmm) to seconds"""
+    time_parts = timestamp.split(':')
+    if len(time_parts) != 3:
+        return 0.0
+    
+    hours = int(time_parts[0])
+    minutes = int(time_parts[1])
+    seconds_parts = time_parts[2].split('.')
+    seconds = int(seconds_parts[0])
+    milliseconds = int(seconds_parts[1]) if len(seconds_parts) > 1 else 0
+    
+    return hours * 3600 + minutes * 60 + seconds + milliseconds / 1000
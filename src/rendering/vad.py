@@ -0,0 +1,182 @@
+"""
+Offline vocal-activity alignment (alignment_mode 'vad'): no network, no quota.
+
+The audio comes from the shared decoded-PCM cache (rendering.pcm) as mono
+16 kHz samples. A vectorized NumPy pass computes per-frame energy in the voice
+band and spectral flux, and frames scoring above an adaptive threshold form
+vocal-active regions. Lyrics lines are then laid
+out over the active time only, each taking a share proportional to its
+syllable count, so intros, instrumental breaks and outros stay caption-free.
+
+This is an energy heuristic, not a vocal separator: loud instrumentals in the
+voice band count as active. It is used when ElevenLabs is unavailable and
+beats spreading lines evenly over the whole track.
+"""
+import os
+import re
+import logging
+import subprocess
+from typing import List, Tuple
+
+from rendering.pcm import decoded_pcm
+
+logger = logging.getLogger(__name__)
+
+VAD_SAMPLE_RATE = 16000
+VAD_FRAME_SECONDS = 0.025
+VAD_HOP_SECONDS = 0.010
+VAD_BAND_HZ = (300.0, 3400.0)
+# Position of the activity threshold between the quiet and loud ends of the track (0..1)
+VAD_THRESHOLD = float(os.environ.get("VAD_THRESHOLD", "0.45"))
+VAD_SMOOTH_SECONDS = 0.2
+VAD_MIN_GAP_SECONDS = float(os.environ.get("VAD_MIN_GAP_SECONDS", "0.6"))
+VAD_MIN_REGION_SECONDS = 0.3
+VAD_FFT_BLOCK = 4096
+# Less activity than this share of the track means the detector found no structure
+VAD_MIN_COVERAGE = 0.15
+
+_VOWEL_GROUPS = re.compile(r"[aeiouyàáâãäåèéêëìíîïòóôõöùúûüýÿ]+")
+
+
+def _normalize(values):
+    """Map to 0..1 between the 10th and 95th percentile (robust to outliers)."""
+    import numpy as np
+
+    low, high = np.percentile(values, [10, 95])
+    if high - low < 1e-9:
+        return np.zeros_like(values)
+    return np.clip((values - low) / (high - low), 0.0, 1.0)
+
+
+def activity_envelope(samples, sample_rate: int = VAD_SAMPLE_RATE):
+    """
+    Per-frame vocal activity score in 0..1: voice-band energy (dB) and spectral
+    flux, each normalized over the track, averaged. Returns (score, hop_seconds).
+    """
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    frame = int(VAD_FRAME_SECONDS * sample_rate)
+    hop = int(VAD_HOP_SECONDS * sample_rate)
+    if len(samples) < frame:
+        return np.zeros(0, dtype=np.float32), VAD_HOP_SECONDS
+
+    frames = sliding_window_view(samples, frame)[::hop]
+    window = np.hanning(frame).astype(np.float32)
+    freqs = np.fft.rfftfreq(frame, 1.0 / sample_rate)
+    in_band = (freqs >= VAD_BAND_HZ[0]) & (freqs <= VAD_BAND_HZ[1])
+    # FFT in blocks so long tracks don't materialize every windowed frame at once
+    band = np.concatenate([
+        np.abs(np.fft.rfft(frames[i:i + VAD_FFT_BLOCK] * window, axis=1))[:, in_band]
+        for i in range(0, len(frames), VAD_FFT_BLOCK)
+    ])
+
+    energy_db = 10.0 * np.log10(np.mean(band ** 2, axis=1) + 1e-10)
+    # Onsets and pitch movement; sustained pads and drones have little flux
+    flux = np.sum(np.maximum(np.diff(band, axis=0, prepend=band[:1]), 0.0), axis=1)
+    flux = np.log1p(flux)
+
+    score = 0.5 * _normalize(energy_db) + 0.5 * _normalize(flux)
+    smooth = max(1, int(VAD_SMOOTH_SECONDS / VAD_HOP_SECONDS))
+    score = np.convolve(score, np.ones(smooth) / smooth, mode="same")
+    return score, VAD_HOP_SECONDS
+
+
+def active_regions(score, hop_seconds: float, threshold: float = VAD_THRESHOLD) -> List[Tuple[float, float]]:
+    """Threshold the envelope into (start, end) regions, bridging short gaps and dropping blips."""
+    import numpy as np
+
+    if len(score) == 0:
+        return []
+    active = (score > threshold).astype(np.int8)
+    edges = np.diff(np.concatenate(([0], active, [0])))
+    starts = np.flatnonzero(edges == 1) * hop_seconds
+    ends = np.flatnonzero(edges == -1) * hop_seconds
+
+    regions = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if regions and start - regions[-1][1] < VAD_MIN_GAP_SECONDS:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return [(s, e) for s, e in regions if e - s >= VAD_MIN_REGION_SECONDS]
+
+
+def detect_vocal_regions(audio_path: str) -> List[Tuple[float, float]]:
+    """Vocal-active (start, end) regions, or [] if too little of the track is active to trust."""
+    samples = decoded_pcm(audio_path, VAD_SAMPLE_RATE)
+    score, hop_seconds = activity_envelope(samples)
+    regions = active_regions(score, hop_seconds)
+    total = sum(e - s for s, e in regions)
+    duration = len(samples) / VAD_SAMPLE_RATE
+    logger.info(f"VAD: {len(regions)} vocal-active regions, {total:.1f}s of {duration:.1f}s")
+    if total < VAD_MIN_COVERAGE * duration:
+        return []
+    return regions
+
+
+def count_syllables(line: str) -> int:
+    """Vowel groups per word for Latin script; other scripts count letters / 2."""
+    count = 0
+    for word in line.lower().split():
+        if re.search(r"[a-z]", word):
+            count += max(1, len(_VOWEL_GROUPS.findall(word)))
+        else:
+            letters = sum(1 for ch in word if ch.isalpha())
+            if letters:
+                count += max(1, letters // 2)
+    return max(1, count)
+
+
+def distribute_lines(lyrics_lines: List[str], regions: List[Tuple[float, float]]) -> List[dict]:
+    """
+    Lay lines out over the concatenated active time, proportionally to their
+    syllables. A line that would straddle a gap moves wholly to the side
+    holding most of it, so captions don't sit through instrumental breaks.
+    """
+    import numpy as np
+
+    weights = np.array([count_syllables(line) for line in lyrics_lines], dtype=np.float64)
+    region_starts = np.array([s for s, _ in regions])
+    region_ends = np.array([e for _, e in regions])
+    # Active time before each region
+    offsets = np.concatenate(([0.0], np.cumsum(region_ends - region_starts)))
+    total = offsets[-1]
+
+    bounds = np.concatenate(([0.0], np.cumsum(weights))) / weights.sum() * total
+    line_starts, line_ends = bounds[:-1], bounds[1:]
+    # A start at a region boundary belongs to the next region, an end to the previous one
+    start_region = np.clip(np.searchsorted(offsets, line_starts, side="right") - 1, 0, len(regions) - 1)
+    end_region = np.clip(np.searchsorted(offsets, line_ends, side="left") - 1, 0, len(regions) - 1)
+
+    segments = []
+    for i, line in enumerate(lyrics_lines):
+        a, b = start_region[i], end_region[i]
+        start = region_starts[a] + line_starts[i] - offsets[a]
+        end = region_starts[b] + line_ends[i] - offsets[b]
+        if a != b:
+            before = region_ends[a] - start
+            after = end - region_starts[b]
+            if before >= after:
+                end = region_ends[a]
+            else:
+                start = region_starts[b]
+        segments.append({"start": float(start), "end": float(end), "text": line})
+    return segments
+
+
+def align_lyrics_with_vad(lyrics_lines: List[str], audio_path: str) -> List[dict]:
+    """
+    Align lyrics lines to the vocal-active parts of the audio. Returns [] when
+    no activity is found (e.g. a silent or undecodable file).
+    """
+    if not lyrics_lines:
+        return []
+    try:
+        regions = detect_vocal_regions(audio_path)
+    except (ValueError, OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"⚠️ VAD alignment unavailable: {e}")
+        return []
+    if not regions:
+        return []
+    return distribute_lines(lyrics_lines, regions)
@@ -0,0 +1,212 @@
+"""
+Columnar view of the words in a Scribe response, parsed once per job.
+
+Captions, sentence grouping and lyrics matching all used to walk the `words`
+list of dicts, filter `type == "word"` and re-normalize every word's text
+each time. WordTable keeps the words (type 'word', in order) as NumPy start
+and end arrays plus the original texts, and normalizes each distinct
+spelling once into interned token IDs. Grouping and line matching then run
+as array operations; the results match the original per-word loops.
+"""
+import re
+from typing import List, Tuple
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+SENTENCE_END = ".!?"
+# A transcribed "sentence" is cut after this many words even without punctuation
+MAX_SENTENCE_WORDS = 11
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase without punctuation: the form lyrics and transcript are compared in."""
+    return _PUNCTUATION.sub("", text.lower()).strip()
+
+
+class WordTable:
+    """
+    texts: original text per word; starts/ends: float64 seconds (missing = 0);
+    valid: words with a non-empty normalized form; token_ids/token_words: the
+    normalized tokens of valid words (flat, with the word each belongs to);
+    vocab: token -> ID; sentence_end: text ends in . ! or ?
+    """
+
+    def __init__(self, words: List[dict]):
+        import numpy as np
+
+        words = [w for w in words if w.get("type", "word") == "word"]
+        self.texts = [w.get("text", "") for w in words]
+        self.starts = np.array([w.get("start", 0) or 0 for w in words], dtype=np.float64)
+        self.ends = np.array([w.get("end", 0) or 0 for w in words], dtype=np.float64)
+        self.vocab = {}
+
+        # Songs repeat themselves: normalize each distinct spelling once
+        spellings = {}
+        token_ids, token_words, valid, sentence_end = [], [], [], []
+        for index, text in enumerate(self.texts):
+            ids = spellings.get(text)
+            if ids is None:
+                tokens = normalize_text(text).split() if text.strip() else []
+                ids = spellings[text] = [self.vocab.setdefault(t, len(self.vocab)) for t in tokens]
+            valid.append(bool(ids))
+            sentence_end.append(bool(ids) and text.rstrip()[-1] in SENTENCE_END)
+            token_ids.extend(ids)
+            token_words.extend([index] * len(ids))
+
+        self.valid = np.array(valid, dtype=bool)
+        self.sentence_end = np.array(sentence_end, dtype=bool)
+        self.token_ids = np.array(token_ids, dtype=np.int64)
+        self.token_words = np.array(token_words, dtype=np.int64)
+
+    @classmethod
+    def from_response(cls, response: dict) -> "WordTable":
+        return cls(response.get("words", []))
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    # --------------------------------------------------------------------------
+    # Grouping
+    # --------------------------------------------------------------------------
+    def fixed_groups(self, size: int) -> List[Tuple[float, float, str]]:
+        """(start, end, text) of consecutive groups of `size` words, for captions."""
+        firsts = range(0, len(self.texts), size)
+        return [
+            (float(self.starts[i]), float(self.ends[min(i + size, len(self.texts)) - 1]),
+             " ".join(self.texts[i:i + size]))
+            for i in firsts
+        ]
+
+    def sentence_segments(self, audio_duration: float):
+        """
+        Group valid words into sentences, closing at . ! ? or after
+        MAX_SENTENCE_WORDS words. Returns (segment of each word, -1 for invalid
+        words; segment starts; segment ends).
+        """
+        import numpy as np
+
+        indices = np.flatnonzero(self.valid)
+        segment = np.full(len(self.texts), -1, dtype=np.int64)
+        if not len(indices):
+            return segment, np.zeros(0), np.zeros(0)
+
+        punctuated = self.sentence_end[indices]
+        # Position of each word within its run between punctuation marks
+        run = np.concatenate(([0], np.cumsum(punctuated[:-1])))
+        run_first = np.flatnonzero(np.concatenate(([True], run[1:] != run[:-1])))
+        position = np.arange(len(indices)) - run_first[run]
+        closes = punctuated | (position % MAX_SENTENCE_WORDS == MAX_SENTENCE_WORDS - 1)
+
+        segment[indices] = np.concatenate(([0], np.cumsum(closes[:-1])))
+        firsts = indices[np.concatenate(([True], closes[:-1]))]
+        lasts = indices[np.concatenate((np.flatnonzero(closes[:-1]), [len(indices) - 1]))]
+        starts, ends = self.starts[firsts], self.ends[lasts].copy()
+        # A trailing unclosed sentence with no end time runs to the end of the audio
+        if not closes[-1] and ends[-1] == 0:
+            ends[-1] = audio_duration
+        return segment, starts, ends
+
+    def word_segments(self):
+        """Every valid word as its own segment, in the shape of sentence_segments."""
+        import numpy as np
+
+        indices = np.flatnonzero(self.valid)
+        segment = np.full(len(self.texts), -1, dtype=np.int64)
+        segment[indices] = np.arange(len(indices))
+        return segment, self.starts[indices], self.ends[indices]
+
+    # --------------------------------------------------------------------------
+    # Matching
+    # --------------------------------------------------------------------------
+    def line_similarities(self, normalized_lines: List[str], segment, segment_count: int):
+        """
+        Jaccard similarity (intersection over union of token sets) of each
+        normalized lyrics line against every segment, yielded one line at a
+        time as a float64 array over the segments.
+
+        Shared tokens are counted from an inverted index (token -> segments
+        containing it), so memory stays linear in the words instead of
+        lines x vocabulary or lines x segments.
+        """
+        import numpy as np
+
+        # Distinct (segment, token) pairs, grouped by token
+        vocab_size = max(len(self.vocab), 1)
+        pairs = np.unique(segment[self.token_words] * vocab_size + self.token_ids)
+        pair_segments, pair_tokens = np.divmod(pairs, vocab_size)
+        order = np.argsort(pair_tokens, kind="stable")
+        postings = pair_segments[order]
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(pair_tokens, minlength=vocab_size))))
+        segment_sizes = np.bincount(pair_segments, minlength=segment_count).astype(np.float64)
+
+        for line in normalized_lines:
+            tokens = set(line.split())
+            known = [self.vocab[t] for t in tokens if t in self.vocab]
+            if known:
+                hits = np.concatenate([postings[bounds[t]:bounds[t + 1]] for t in known])
+                common = np.bincount(hits, minlength=segment_count).astype(np.float64)
+            else:
+                common = np.zeros(segment_count)
+            union = len(tokens) + segment_sizes - common
+            with np.errstate(divide="ignore", invalid="ignore"):
+                yield np.where(union > 0, common / union, 0.0)
+
+    # --------------------------------------------------------------------------
+    # Word timings
+    # --------------------------------------------------------------------------
+    def caption_words(self, start: float, end: float, text: str) -> List[dict]:
+        """
+        Per-word times of a caption from the transcribed words heard in
+        [start, end): the caption's words are matched in order to the
+        transcript's, and the times of matched ones are Scribe's. A caption
+        word with no match is spread evenly between its matched neighbours
+        and marked 'interpolated'. Empty if no word matched at all.
+        """
+        import numpy as np
+        from difflib import SequenceMatcher
+
+        said = text.split()
+        middles = (self.starts + self.ends) / 2
+        heard = np.flatnonzero(self.valid & (middles >= start) & (middles < end))
+        if not said or not len(heard):
+            return []
+
+        matcher = SequenceMatcher(None, [normalize_text(w) for w in said],
+                                  [normalize_text(self.texts[i]) for i in heard], autojunk=False)
+        times = [None] * len(said)
+        for a, b, size in matcher.get_matching_blocks():
+            for k in range(size):
+                index = heard[b + k]
+                times[a + k] = (float(self.starts[index]), float(self.ends[index]))
+        if not any(times):
+            return []
+
+        words = []
+        i = 0
+        while i < len(said):
+            if times[i]:
+                words.append({"text": said[i], "start": times[i][0], "end": times[i][1]})
+                i += 1
+                continue
+            # A run of unmatched words shares the time between its neighbours
+            j = i
+            while j < len(said) and not times[j]:
+                j += 1
+            run_start = words[-1]["end"] if words else start
+            run_end = max(times[j][0] if j < len(said) else end, run_start)
+            step = (run_end - run_start) / (j - i)
+            words.extend(
+                {"text": said[k], "start": run_start + (k - i) * step, "end": run_start + (k - i + 1) * step,
+                 "interpolated": True}
+                for k in range(i, j)
+            )
+            i = j
+        return words
+
+
+def word_table(words_or_response) -> WordTable:
+    """A WordTable from a table, a Scribe response or a list of word dicts."""
+    if isinstance(words_or_response, WordTable):
+        return words_or_response
+    if isinstance(words_or_response, dict):
+        return WordTable.from_response(words_or_response)
+    return WordTable(words_or_response or [])
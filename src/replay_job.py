@@ -0,0 +1,151 @@
+"""
+Replay a stored job under the profiler.
+
+Re-runs a job's inputs through the worker's local render path with a fresh job
+id, so nothing of the original is overwritten, and writes its CPU and memory
+profile (see rendering.profiling) to --output. The inputs are the original
+uploads, or the stored background and audio artifacts once the uploads have
+been cleaned up. Re-renders are replayed as re-renders, reusing the stored
+plan of the job they restyled, as they did in production.
+
+Run it from the worker's working directory with the worker's DATABASE_DIR,
+ARTIFACTS_DIR and CACHE_DIR. Transcriptions come from the cache as usual;
+--no-cache sends the audio to ElevenLabs again.
+
+Usage:
+    python src/replay_job.py <job_id>
+    python src/replay_job.py <job_id> --output profiles/slow-job --keep-output
+    python src/replay_job.py <job_id> --interval-ms 5 --no-memory
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+
+def replay_job_data(job, root, stored_plan: dict, upload_dir: str, replay_id: str) -> dict:
+    """Queue payload re-creating `job` (as the API built it) under `replay_id`."""
+    from rendering.artifacts import artifact_path, BACKGROUND_FILE, AUDIO_FILE
+
+    root_id = root.id if root else job.source_job_id
+
+    def input_path(upload_name, artifact_name):
+        upload = os.path.join(upload_dir, upload_name) if upload_name else None
+        if upload and os.path.exists(upload):
+            return upload
+        stored = artifact_path(root_id, artifact_name)
+        return stored if os.path.exists(stored) else None
+
+    image_path = input_path(root.image_filename if root else None, BACKGROUND_FILE)
+    audio_path = input_path(root.audio_filename if root else None, AUDIO_FILE)
+    if not image_path or not audio_path:
+        raise ValueError(f"The image and audio of job {job.id} are no longer available")
+
+    job_data = {
+        "job_id": replay_id,
+        "image_path": image_path,
+        "audio_path": audio_path,
+        "lyrics": job.lyrics,
+        "language": job.language,
+        "font_size": job.font_size,
+        "font_color": job.font_color,
+        "words_per_group": job.words_per_group,
+        "timing_offset": job.timing_offset,
+        "min_duration": job.min_duration,
+        "alignment_mode": job.alignment_mode,
+        "debug_mode": job.debug_mode,
+        "preview": job.preview,
+        "preview_start": job.preview_start,
+        "preview_end": job.preview_end,
+        "output_mode": job.output_mode or "burn",
+        "force_local": True,
+        "profile": True,
+    }
+    if job.source_job_id:
+        job_data["source_job_id"] = job.source_job_id
+    if job.alignment_mode == "provided":
+        # Uploaded timings are kept only in the stored plan
+        timed_cues = ((stored_plan or {}).get("alignment") or {}).get("inputs", {}).get("timed_cues")
+        if not timed_cues:
+            raise ValueError(f"The uploaded timings of job {job.id} are no longer available")
+        job_data["timed_cues"] = timed_cues
+    return job_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run a stored job's inputs under the profiler")
+    parser.add_argument("job_id")
+    parser.add_argument("--output", help="directory for the profile (default: profiles/<job_id>-<time>)")
+    parser.add_argument("--interval-ms", type=float, help="stack sampling interval (default: JOB_PROFILE_INTERVAL_MS)")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc snapshots (less overhead)")
+    parser.add_argument("--no-cache", action="store_true", help="ignore cached transcriptions (calls ElevenLabs)")
+    parser.add_argument("--keep-output", action="store_true", help="keep the rendered video next to the profile")
+    args = parser.parse_args()
+
+    # Read at import by the rendering modules
+    if args.interval_ms:
+        os.environ["JOB_PROFILE_INTERVAL_MS"] = str(args.interval_ms)
+    if args.no_memory:
+        os.environ["JOB_PROFILE_MEMORY"] = "false"
+    if args.no_cache:
+        os.environ["CACHE_ENABLED"] = "false"
+
+    import worker
+    from models import SessionLocal, VideoJob
+    from rendering.artifacts import load_plan, delete_job_artifacts
+    from rendering.profiling import memory_folded_file
+
+    db = SessionLocal()
+    try:
+        job = db.query(VideoJob).filter(VideoJob.id == args.job_id).first()
+        if not job:
+            sys.exit(f"Job {args.job_id} not found")
+        root_id = job.source_job_id or job.id
+        root = job if root_id == job.id else db.query(VideoJob).filter(VideoJob.id == root_id).first()
+        replay_id = str(uuid.uuid4())
+        try:
+            job_data = replay_job_data(job, root, load_plan(job.id) or load_plan(root_id),
+                                       worker.UPLOAD_DIR, replay_id)
+        except ValueError as e:
+            sys.exit(str(e))
+    finally:
+        db.close()
+
+    output_dir = os.path.abspath(args.output or os.path.join("profiles", f"{args.job_id}-{time.strftime('%Y%m%d-%H%M%S')}"))
+    job_data["profile_dir"] = output_dir
+    os.makedirs(worker.OUTPUT_DIR, exist_ok=True)
+
+    logger.info(f"🔁 Replaying job {args.job_id} as {replay_id} under the profiler")
+    processor = worker.VideoProcessor(worker_id="replay")
+    try:
+        success = processor.process_video_job(job_data)
+    finally:
+        # The replay's own plan and artifacts; a re-render only read the original's
+        delete_job_artifacts(replay_id)
+
+    prefix = "preview" if job_data["preview"] else "output"
+    rendered = os.path.join(worker.OUTPUT_DIR, f"{prefix}_{replay_id}.mp4")
+    if os.path.exists(rendered):
+        if args.keep_output:
+            shutil.move(rendered, os.path.join(output_dir, f"{prefix}_{args.job_id}.mp4"))
+        else:
+            os.remove(rendered)
+
+    logger.info("Folding the memory snapshot")
+    memory_folded_file(output_dir)
+    print(json.dumps({"job_id": args.job_id, "success": success, "profile": output_dir,
+                      "timings": processor.last_timings}, indent=2))
+    print(f"Flamegraph: flamegraph.pl {os.path.join(output_dir, 'cpu.folded')} > cpu.svg "
+          f"(or open it in https://www.speedscope.app)")
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
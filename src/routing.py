@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import logging
+from typing import Optional, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ROUTING_MODE: 'auto' (decide per job), 'local' or 'runpod' (pin every job)
+ROUTING_MODE = os.environ.get("ROUTING_MODE", "auto")
+# Queue a running RunPod dispatcher consumes remote jobs from (see runpod_dispatcher.py)
+ROUTING_REMOTE_QUEUE = os.environ.get("ROUTING_REMOTE_QUEUE", "runpod_jobs")
+# Reels up to this long always render locally when a local slot is free
+ROUTING_SHORT_JOB_SECONDS = float(os.environ.get("ROUTING_SHORT_JOB_SECONDS", "30"))
+# Once the oldest queued job has waited this long, prefer remote capacity
+ROUTING_MAX_BACKLOG_AGE = float(os.environ.get("ROUTING_MAX_BACKLOG_AGE", "120"))
+# After this many remote failures within the window, stop routing remote for a while
+ROUTING_REMOTE_FAILURE_LIMIT = int(os.environ.get("ROUTING_REMOTE_FAILURE_LIMIT", "3"))
+ROUTING_REMOTE_FAILURE_WINDOW = int(os.environ.get("ROUTING_REMOTE_FAILURE_WINDOW", "300"))
+
+# Priors used until enough jobs have been observed: latency = overhead + rtf * audio seconds
+LOCAL_PRIOR = (5.0, 1.5)
+REMOTE_PRIOR = (45.0, 0.3)  # cold start + transfer dominate short jobs
+
+SAMPLE_HISTORY = 50
+MIN_SAMPLES_FOR_FIT = 5
+WORKER_HEARTBEAT_TTL = 60
+
+SAMPLES_KEY = "routing:samples:{target}"
+REMOTE_FAILURES_KEY = "routing:remote_failures"
+WORKERS_KEY = "routing:workers"
+DISPATCHER_HEARTBEAT_KEY = "runpod_dispatcher:heartbeat"
+
+
+def fit_latency_model(samples: List[Tuple[float, float]], prior: Tuple[float, float]) -> Tuple[float, float]:
+    """
+    Least-squares fit of latency = overhead + rtf * duration over observed
+    (duration, latency) samples. Falls back to the prior with too little data.
+    """
+    if len(samples) < MIN_SAMPLES_FOR_FIT:
+        return prior
+
+    n = len(samples)
+    mean_x = sum(d for d, _ in samples) / n
+    mean_y = sum(l for _, l in samples) / n
+    var_x = sum((d - mean_x) ** 2 for d, _ in samples)
+    if var_x == 0:
+        # All jobs had the same length; keep the prior's slope and fit the intercept
+        return max(0.0, mean_y - prior[1] * mean_x), prior[1]
+
+    rtf = sum((d - mean_x) * (l - mean_y) for d, l in samples) / var_x
+    rtf = max(rtf, 0.0)
+    overhead = max(mean_y - rtf * mean_x, 0.0)
+    return overhead, rtf
+
+
+def local_only(job_data: dict) -> bool:
+    """
+    True for jobs that must render on a local worker whatever the cluster state.
+
+    Previews and soft-subtitle muxes take seconds; a remote cold start would dominate them.
+    Re-renders read the stored artifacts on the local volume. Profiled jobs are
+    sampled in this process. Forced jobs were already sent back by RunPod.
+    """
+    return bool(job_data.get("force_local") or job_data.get("preview")
+                or job_data.get("output_mode") == "soft" or job_data.get("source_job_id")
+                or job_data.get("profile"))
+
+
+class RoutingPolicy:
+    """
+    Decide per job whether to render locally or on RunPod.
+
+    The decision compares estimated completion times: a local render has to
+    wait for a free slot, a remote one pays cold start and transfer overhead.
+    Both latency models are refit from recently observed jobs stored in Redis,
+    so the split follows real capacity instead of a static setting.
+    """
+
+    def __init__(self, redis_client, remote_available: bool):
+        self.redis = redis_client
+        self.remote_available = remote_available
+
+    # -- Observations ---------------------------------------------------------
+
+    def record_latency(self, target: str, audio_duration: float, seconds: float):
+        """Store how long a finished job took on `target` ('local' or 'runpod')."""
+        try:
+            key = SAMPLES_KEY.format(target=target)
+            pipe = self.redis.pipeline()
+            pipe.lpush(key, json.dumps([audio_duration, seconds]))
+            pipe.ltrim(key, 0, SAMPLE_HISTORY - 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to record {target} latency: {e}")
+
+    def record_remote_failure(self):
+        try:
+            now = time.time()
+            pipe = self.redis.pipeline()
+            pipe.zadd(REMOTE_FAILURES_KEY, {str(now): now})
+            pipe.zremrangebyscore(REMOTE_FAILURES_KEY, 0, now - ROUTING_REMOTE_FAILURE_WINDOW)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to record remote failure: {e}")
+
+    def heartbeat(self, worker_id: str, busy: bool):
+        """Advertise this worker's slot and whether it is rendering."""
+        try:
+            self.redis.hset(WORKERS_KEY, worker_id, json.dumps({"busy": busy, "ts": time.time()}))
+        except Exception as e:
+            logger.warning(f"Failed to update worker heartbeat: {e}")
+
+    # -- Cluster state --------------------------------------------------------
+
+    def latency_model(self, target: str) -> Tuple[float, float]:
+        raw = self.redis.lrange(SAMPLES_KEY.format(target=target), 0, SAMPLE_HISTORY - 1)
+        samples = [tuple(json.loads(s)) for s in raw]
+        return fit_latency_model(samples, LOCAL_PRIOR if target == "local" else REMOTE_PRIOR)
+
+    def local_slots(self) -> Tuple[int, int]:
+        """Return (busy, total) across workers with a fresh heartbeat."""
+        now = time.time()
+        busy = total = 0
+        for worker_id, raw in self.redis.hgetall(WORKERS_KEY).items():
+            state = json.loads(raw)
+            if now - state.get("ts", 0) > WORKER_HEARTBEAT_TTL:
+                self.redis.hdel(WORKERS_KEY, worker_id)
+                continue
+            total += 1
+            busy += 1 if state.get("busy") else 0
+        return busy, max(total, 1)
+
+    def backlog(self) -> Tuple[int, float]:
+        """Return (queued jobs, age in seconds of the oldest queued job)."""
+        depth = self.redis.llen("video_jobs")
+        if not depth:
+            return 0, 0.0
+        # lpush + brpop: the oldest job sits at the right end
+        oldest = json.loads(self.redis.lindex("video_jobs", -1) or "{}")
+        enqueued_at = oldest.get("enqueued_at")
+        return depth, (time.time() - enqueued_at) if enqueued_at else 0.0
+
+    def remote_healthy(self) -> bool:
+        now = time.time()
+        failures = self.redis.zcount(REMOTE_FAILURES_KEY, now - ROUTING_REMOTE_FAILURE_WINDOW, now)
+        return failures < ROUTING_REMOTE_FAILURE_LIMIT
+
+    def dispatcher_available(self) -> bool:
+        """True if a RunPod dispatcher is consuming the remote hand-off queue."""
+        try:
+            return self.redis.get(DISPATCHER_HEARTBEAT_KEY) == ROUTING_REMOTE_QUEUE
+        except Exception:
+            return False
+
+    # -- Decision -------------------------------------------------------------
+
+    def decide(self, job_data: dict, audio_duration: Optional[float], own_slot_free: bool = True) -> str:
+        """
+        Return 'local' or 'runpod' for a job.
+
+        `own_slot_free` is True when the caller (a worker that just popped the
+        job) can start rendering immediately; only then are short jobs pinned local.
+        """
+        if not self.remote_available or local_only(job_data):
+            return "local"
+        if ROUTING_MODE in ("local", "runpod"):
+            return ROUTING_MODE
+
+        try:
+            if not self.remote_healthy():
+                logger.info("Routing: remote endpoint failing recently, rendering locally")
+                return "local"
+
+            duration = audio_duration or 0.0
+            if duration <= ROUTING_SHORT_JOB_SECONDS and own_slot_free:
+                return "local"
+
+            busy, total = self.local_slots()
+            depth, backlog_age = self.backlog()
+            local_overhead, local_rtf = self.latency_model("local")
+            remote_overhead, remote_rtf = self.latency_model("runpod")
+
+            local_job_seconds = local_overhead + local_rtf * duration
+            # A local render holds a slot for local_job_seconds; with jobs queued,
+            # that time is added to their wait too (or to ours, if no slot is free)
+            local_eta = local_job_seconds * (1 + depth / total)
+            remote_eta = remote_overhead + remote_rtf * duration
+
+            target = "runpod" if remote_eta < local_eta else "local"
+            if backlog_age > ROUTING_MAX_BACKLOG_AGE and busy >= total:
+                target = "runpod"
+
+            logger.info(
+                f"Routing job {job_data.get('job_id')}: {target} "
+                f"(audio {duration:.0f}s, local eta {local_eta:.0f}s, remote eta {remote_eta:.0f}s, "
+                f"slots {busy}/{total} busy, backlog {depth} jobs / {backlog_age:.0f}s)"
+            )
+            return target
+        except Exception as e:
+            logger.warning(f"Routing decision failed ({e}), rendering locally")
+            return "local"
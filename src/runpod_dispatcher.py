@@ -0,0 +1,411 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, Any
+from urllib.parse import urlsplit, urlunsplit, parse_qs, urlencode
+
+import redis
+import redis.asyncio as aioredis
+import requests
+
+from models import VideoJob, JobStatus, SessionLocal, create_tables
+from transfer import get_object_store, b64encode_file, b64decode_to_file
+from routing import RoutingPolicy, DISPATCHER_HEARTBEAT_KEY, ROUTING_REMOTE_QUEUE, local_only
+from rendering.artifacts import load_plan, save_plan
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Redis connection
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
+
+# File paths
+OUTPUT_DIR = os.path.abspath("output")
+
+# RunPod configuration
+RUNPOD_API_BASE = os.environ.get("RUNPOD_API_BASE", "https://api.runpod.ai/v2")
+# Workers hand remote jobs over on this queue (see routing.py); video_jobs makes
+# the dispatcher the only consumer of all jobs, with no local workers to fall back to
+RUNPOD_QUEUE = os.environ.get("RUNPOD_QUEUE", ROUTING_REMOTE_QUEUE)
+RUNPOD_MAX_IN_FLIGHT = int(os.environ.get("RUNPOD_MAX_IN_FLIGHT", "32"))
+RUNPOD_JOB_TIMEOUT = float(os.environ.get("RUNPOD_JOB_TIMEOUT", "900"))
+RUNPOD_WEBHOOK_URL = os.environ.get("RUNPOD_WEBHOOK_URL")
+# Shared with the API, which rejects callbacks without it (?token=...)
+RUNPOD_WEBHOOK_SECRET = os.environ.get("RUNPOD_WEBHOOK_SECRET")
+RUNPOD_WEBHOOK_CHANNEL = "runpod_webhooks"
+
+# Adaptive polling: start fast so short jobs are picked up promptly, back off
+# geometrically while a job sits in the queue or runs long.
+POLL_INITIAL_INTERVAL = 1.0
+POLL_BACKOFF_FACTOR = 1.5
+POLL_MAX_INTERVAL = 15.0
+# With a webhook configured, polling is only a safety net for lost callbacks.
+POLL_MAX_INTERVAL_WITH_WEBHOOK = 60.0
+
+TERMINAL_STATUSES = {"COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT"}
+
+
+def next_poll_interval(attempt: int, max_interval: float = POLL_MAX_INTERVAL) -> float:
+    """Return the delay before poll number `attempt` (0-based) of a RunPod job."""
+    return min(max_interval, POLL_INITIAL_INTERVAL * (POLL_BACKOFF_FACTOR ** attempt))
+
+
+def signed_webhook_url(url: str, secret: str) -> str:
+    """The webhook URL RunPod calls back, with the shared token as ?token=."""
+    parts = urlsplit(url)
+    query = {k: v for k, v in parse_qs(parts.query).items() if k != "token"}
+    query["token"] = [secret]
+    return urlunsplit(parts._replace(query=urlencode(query, doseq=True)))
+
+
+def build_runpod_input(job_data: dict) -> dict:
+    """
+    Build the RunPod handler input for a queued job, carrying its render plan
+    when one has been compiled. With an object store configured, inputs are uploaded and only presigned URLs
+    are sent; otherwise they are inlined as base64.
+    """
+    job_id = job_data["job_id"]
+    image_filename = os.path.basename(job_data["image_path"])
+    audio_filename = os.path.basename(job_data["audio_path"])
+
+    job_input = {
+        "job_id": job_id,
+        "image_filename": image_filename,
+        "audio_filename": audio_filename
+    }
+    if job_data.get("render_plan"):
+        # Captions were already aligned on the CPU tier; the handler only renders
+        # The stored alignment is only needed for later restyles, not to render
+        job_input["render_plan"] = {k: v for k, v in job_data["render_plan"].items() if k != "alignment"}
+    else:
+        job_input.update({
+            "lyrics": job_data["lyrics"],
+            "language": job_data.get("language", "en"),
+            "font_size": job_data.get("font_size", 45),
+            "font_color": job_data.get("font_color", "yellow"),
+            "words_per_group": job_data.get("words_per_group", 3),
+            "timing_offset": job_data.get("timing_offset", 0.0),
+            "min_duration": job_data.get("min_duration", 1.0),
+            "alignment_mode": job_data.get("alignment_mode", "auto"),
+            "debug_mode": job_data.get("debug_mode", False)
+        })
+
+    store = get_object_store()
+    if store:
+        image_key = store.key_for(job_id, image_filename)
+        audio_key = store.key_for(job_id, audio_filename)
+        output_key = store.key_for(job_id, "output.mp4")
+        store.upload_file(job_data["image_path"], image_key)
+        store.upload_file(job_data["audio_path"], audio_key)
+        job_input.update({
+            "image_url": store.presign_get(image_key),
+            "audio_url": store.presign_get(audio_key),
+            "output_key": output_key,
+            "output_upload_url": store.presign_put(output_key, content_type="video/mp4")
+        })
+    else:
+        job_input.update({
+            "image_base64": b64encode_file(job_data["image_path"]),
+            "audio_base64": b64encode_file(job_data["audio_path"])
+        })
+
+    return job_input
+
+
+def save_runpod_output(job_id: str, output: Dict[str, Any]) -> str:
+    """Validate a finished RunPod handler output, write the video and return its filename."""
+    if output.get('status') != 'completed':
+        error_msg = output.get('error', 'Unknown RunPod error')
+        raise Exception(f"RunPod processing failed: {error_msg}")
+
+    output_filename = f"{job_id}.mp4"
+    output_path = os.path.join(OUTPUT_DIR, output_filename)
+
+    store = get_object_store()
+    if output.get('video_key') and store:
+        store.download_file(output['video_key'], output_path)
+        store.delete_prefix(job_id)
+    elif output.get('video_base64'):
+        b64decode_to_file(output['video_base64'], output_path)
+    else:
+        raise Exception("No video data returned from RunPod")
+
+    db = SessionLocal()
+    try:
+        job = db.query(VideoJob).filter(VideoJob.id == job_id).first()
+        if job:
+            job.output_filename = output_filename
+            db.commit()
+            logger.info(f"Updated job {job_id} with output filename: {output_filename}")
+    finally:
+        db.close()
+
+    return output_filename
+
+
+def discard_runpod_objects(job_id: str):
+    """Drop any inputs/outputs a job left in the object store."""
+    store = get_object_store()
+    if store:
+        store.delete_prefix(job_id)
+
+
+class RunPodClient:
+    """Thin client for the asynchronous RunPod serverless API (/run + /status)."""
+
+    def __init__(self, api_key: str, endpoint_id: str, session: Optional[requests.Session] = None):
+        self.endpoint_id = endpoint_id
+        self.base_url = f"{RUNPOD_API_BASE}/{endpoint_id}"
+        self.session = session or requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    def submit(self, job_input: dict, webhook: Optional[str] = None) -> str:
+        """Queue a job on the endpoint and return the RunPod job id."""
+        body = {"input": job_input}
+        if webhook:
+            body["webhook"] = webhook
+
+        response = self.session.post(f"{self.base_url}/run", json=body, timeout=(10, 120))
+        if response.status_code != 200:
+            raise Exception(f"RunPod API error: {response.status_code} - {response.text}")
+
+        result = response.json()
+        if not result.get("id"):
+            raise Exception(f"RunPod did not return a job id: {result}")
+        return result["id"]
+
+    def status(self, runpod_job_id: str) -> dict:
+        """Fetch the current status (and output, once finished) of a RunPod job."""
+        response = self.session.get(f"{self.base_url}/status/{runpod_job_id}", timeout=(10, 120))
+        if response.status_code != 200:
+            raise Exception(f"RunPod status error: {response.status_code} - {response.text}")
+        return response.json()
+
+    def cancel(self, runpod_job_id: str):
+        """Best-effort cancellation of a RunPod job."""
+        try:
+            self.session.post(f"{self.base_url}/cancel/{runpod_job_id}", timeout=(10, 30))
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Failed to cancel RunPod job {runpod_job_id}: {e}")
+
+
+class RunPodDispatcher:
+    """
+    Keep many RunPod jobs in flight from a single asyncio loop.
+
+    Jobs are pulled from the Redis queue, submitted with the non-blocking
+    /run endpoint and tracked concurrently. Each job is polled with an
+    adaptive interval; when RUNPOD_WEBHOOK_URL is set, the API publishes
+    RunPod's completion callbacks on Redis and the tracking task wakes up
+    immediately instead of waiting for its next poll. A callback is only a
+    wake-up: results are always read from RunPod's /status endpoint.
+    """
+
+    def __init__(self, api_key: str, endpoint_id: str, max_in_flight: int = RUNPOD_MAX_IN_FLIGHT,
+                 webhook_url: Optional[str] = RUNPOD_WEBHOOK_URL):
+        # Imported here to avoid a circular import (the worker uses this module's helpers)
+        # and to keep the rendering stack out of the API, which imports this module
+        from worker import VideoProcessor
+        from rendering.plan import build_render_plan
+
+        self.client = RunPodClient(api_key, endpoint_id)
+        self.processor = VideoProcessor(worker_id=f"runpod-dispatcher_{os.getpid()}")
+        self.build_render_plan = build_render_plan
+        self.max_in_flight = max_in_flight
+        self.webhook_url = webhook_url
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight: Dict[str, asyncio.Event] = {}
+        self.redis = aioredis.from_url(REDIS_URL, decode_responses=True)
+        self.router = RoutingPolicy(redis.from_url(REDIS_URL, decode_responses=True), remote_available=True)
+
+    async def run(self):
+        """Main dispatch loop."""
+        logger.info(f"🚀 RunPod dispatcher started (endpoint: {self.client.endpoint_id}, "
+                    f"max in flight: {self.max_in_flight}, webhook: {'on' if self.webhook_url else 'off'})")
+
+        listener = asyncio.create_task(self._listen_for_webhooks()) if self.webhook_url else None
+        heartbeat = asyncio.create_task(self._heartbeat())
+        tasks = set()
+        try:
+            while True:
+                await self.slots.acquire()
+                try:
+                    popped = await self.redis.brpop(RUNPOD_QUEUE, timeout=30)
+                except Exception as e:
+                    self.slots.release()
+                    logger.error(f"Dispatcher queue error: {e}")
+                    await asyncio.sleep(5)
+                    continue
+
+                if popped is None:
+                    self.slots.release()
+                    continue
+
+                _, job_json = popped
+                job_data = json.loads(job_json)
+                if RUNPOD_QUEUE != "video_jobs" and local_only(job_data):
+                    # Never routed here by a worker; render it where its inputs live
+                    self.slots.release()
+                    job_data["force_local"] = True
+                    await self.redis.lpush("video_jobs", json.dumps(job_data))
+                    logger.warning(f"⚠️ Job {job_data['job_id']} must render locally, sent back to the workers")
+                    continue
+                logger.info(f"Received job: {job_data['job_id']} ({len(self.in_flight) + 1} in flight)")
+
+                task = asyncio.create_task(self._dispatch(job_data))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            heartbeat.cancel()
+            if listener:
+                listener.cancel()
+
+    async def _dispatch(self, job_data: dict):
+        job_id = job_data["job_id"]
+        runpod_job_id = None
+        started = time.monotonic()
+        try:
+            await self._progress(job_id, 10)
+            # STT and alignment run here; RunPod only composites and encodes.
+            # A stored alignment (an earlier attempt, or the job a re-render
+            # restyles) is reused instead of transcribing again.
+            source_id = job_data.get("source_job_id")
+            stored = await asyncio.to_thread(load_plan, job_id) or (
+                await asyncio.to_thread(load_plan, source_id) if source_id else None)
+            job_data["render_plan"] = await asyncio.to_thread(
+                self.build_render_plan, job_data,
+                stored["duration"] if stored else job_data.get("audio_duration"),
+                stored.get("alignment") if stored else None
+            )
+            await asyncio.to_thread(save_plan, job_id, job_data["render_plan"])
+            await self._progress(job_id, 20)
+            job_input = await asyncio.to_thread(build_runpod_input, job_data)
+            runpod_job_id = await asyncio.to_thread(self.client.submit, job_input, self.webhook_url)
+            self.in_flight[runpod_job_id] = asyncio.Event()
+            logger.info(f"🚀 Submitted job {job_id} to RunPod as {runpod_job_id}")
+            await self._progress(job_id, 30)
+
+            result = await self._wait_for_completion(job_id, runpod_job_id)
+
+            await self._progress(job_id, 90)
+            await asyncio.to_thread(save_runpod_output, job_id, result.get('output') or {})
+            await asyncio.to_thread(self.processor.update_job_progress, job_id, JobStatus.COMPLETED, 100)
+            if job_data.get("audio_duration"):
+                await asyncio.to_thread(self.router.record_latency, "runpod",
+                                        job_data["audio_duration"], time.monotonic() - started)
+            logger.info(f"✅ RunPod job {job_id} completed")
+        except Exception as e:
+            logger.error(f"❌ RunPod job {job_id} failed: {e}")
+            await asyncio.to_thread(discard_runpod_objects, job_id)
+            await asyncio.to_thread(self.router.record_remote_failure)
+            if RUNPOD_QUEUE != "video_jobs":
+                # Handed off by a worker's routing policy: send it back for local rendering
+                job_data["force_local"] = True
+                await self.redis.lpush("video_jobs", json.dumps(job_data))
+                logger.warning(f"⚠️ Re-queued job {job_id} for local processing")
+            else:
+                await asyncio.to_thread(self.processor.update_job_progress, job_id, JobStatus.FAILED, 0, str(e))
+        finally:
+            if runpod_job_id:
+                self.in_flight.pop(runpod_job_id, None)
+            self.slots.release()
+
+    async def _wait_for_completion(self, job_id: str, runpod_job_id: str) -> dict:
+        max_interval = POLL_MAX_INTERVAL_WITH_WEBHOOK if self.webhook_url else POLL_MAX_INTERVAL
+        woken = self.in_flight[runpod_job_id]
+        started = time.monotonic()
+        last_status = None
+        attempt = 0
+
+        while True:
+            elapsed = time.monotonic() - started
+            if elapsed > RUNPOD_JOB_TIMEOUT:
+                await asyncio.to_thread(self.client.cancel, runpod_job_id)
+                raise Exception(f"RunPod job timed out after {RUNPOD_JOB_TIMEOUT:.0f}s")
+
+            try:
+                await asyncio.wait_for(woken.wait(), timeout=next_poll_interval(attempt, max_interval))
+            except asyncio.TimeoutError:
+                pass
+            woken.clear()
+
+            result = await asyncio.to_thread(self.client.status, runpod_job_id)
+            status = result.get('status')
+
+            if status == 'COMPLETED':
+                return result
+            if status in TERMINAL_STATUSES:
+                raise Exception(f"RunPod job {status.lower()}: {result.get('error') or result}")
+
+            # Restart the fast cadence when a queued job starts running
+            if status != last_status:
+                attempt = 0
+                last_status = status
+            else:
+                attempt += 1
+
+            progress = 50 + int(min(elapsed / RUNPOD_JOB_TIMEOUT, 1.0) * 30)  # 50-80% while running
+            await self._progress(job_id, progress)
+
+    async def _listen_for_webhooks(self):
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(RUNPOD_WEBHOOK_CHANNEL)
+        async for message in pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            event = self.in_flight.get(message["data"])
+            if event:
+                event.set()
+
+    async def _heartbeat(self):
+        """Tell workers which queue this dispatcher consumes (see routing.py)."""
+        while True:
+            try:
+                await self.redis.set(DISPATCHER_HEARTBEAT_KEY, RUNPOD_QUEUE, ex=60)
+            except Exception as e:
+                logger.warning(f"Dispatcher heartbeat failed: {e}")
+            await asyncio.sleep(20)
+
+    async def _progress(self, job_id: str, progress: int):
+        await asyncio.to_thread(self.processor.update_job_progress, job_id, JobStatus.PROCESSING, progress)
+
+
+def publish_webhook(redis_client: redis.Redis, payload: dict):
+    """
+    Wake the dispatcher tracking the job of a RunPod webhook payload.
+    The payload itself is not trusted: the dispatcher fetches the job's status.
+    """
+    runpod_job_id = payload.get("id")
+    if not runpod_job_id or not isinstance(runpod_job_id, str):
+        raise ValueError("Webhook payload has no job id")
+    redis_client.publish(RUNPOD_WEBHOOK_CHANNEL, runpod_job_id)
+
+
+def run_dispatcher():
+    """Entry point for the RunPod dispatcher process."""
+    create_tables()
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    api_key = os.environ.get("RUNPOD_API_KEY")
+    endpoint_id = os.environ.get("RUNPOD_ENDPOINT_ID")
+    if not (api_key and endpoint_id):
+        raise SystemExit("RUNPOD_API_KEY and RUNPOD_ENDPOINT_ID must be set to run the dispatcher")
+    if RUNPOD_WEBHOOK_URL and not RUNPOD_WEBHOOK_SECRET:
+        raise SystemExit("RUNPOD_WEBHOOK_SECRET must be set when RUNPOD_WEBHOOK_URL is")
+
+    webhook_url = signed_webhook_url(RUNPOD_WEBHOOK_URL, RUNPOD_WEBHOOK_SECRET) if RUNPOD_WEBHOOK_URL else None
+    dispatcher = RunPodDispatcher(api_key, endpoint_id, webhook_url=webhook_url)
+    try:
+        asyncio.run(dispatcher.run())
+    except KeyboardInterrupt:
+        logger.info("Dispatcher interrupted by user")
+
+
+if __name__ == "__main__":
+    run_dispatcher()
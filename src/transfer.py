@@ -0,0 +1,202 @@
+"""
+File transfer helpers for the RunPod path.
+
+Inputs and outputs move through an S3-compatible object store (AWS S3, MinIO,
+R2, ...) and only presigned URLs travel in the job payload. The GPU side needs
+nothing but `requests` to stream from and to those URLs, so it never holds
+object store credentials. When no store is configured, files are still sent
+inline as base64, but encoded and decoded in chunks straight from and to disk.
+"""
+import os
+import io
+import base64
+import logging
+from typing import Optional
+
+import requests
+
+from rendering.metrics import TRANSFER_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Object store configuration (leave OBJECT_STORE_BUCKET unset to use inline base64)
+OBJECT_STORE_BUCKET = os.environ.get("OBJECT_STORE_BUCKET")
+OBJECT_STORE_ENDPOINT_URL = os.environ.get("OBJECT_STORE_ENDPOINT_URL")  # e.g. http://minio:9000
+OBJECT_STORE_ACCESS_KEY = os.environ.get("OBJECT_STORE_ACCESS_KEY")
+OBJECT_STORE_SECRET_KEY = os.environ.get("OBJECT_STORE_SECRET_KEY")
+OBJECT_STORE_REGION = os.environ.get("OBJECT_STORE_REGION", "us-east-1")
+OBJECT_STORE_PREFIX = os.environ.get("OBJECT_STORE_PREFIX", "jobs")
+PRESIGNED_URL_EXPIRY = int(os.environ.get("PRESIGNED_URL_EXPIRY", "3600"))
+
+# 3 MiB of raw bytes -> 4 MiB of base64; both multiples keep chunks aligned
+B64_RAW_CHUNK = 3 * 1024 * 1024
+B64_TEXT_CHUNK = 4 * 1024 * 1024
+STREAM_CHUNK = 1024 * 1024
+
+
+# ------------------------------------------------------------------------------
+# Inline base64, chunked
+# ------------------------------------------------------------------------------
+def b64encode_file(path: str) -> str:
+    """Base64-encode a file without loading the raw bytes into memory at once."""
+    out = io.StringIO()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(B64_RAW_CHUNK)
+            if not chunk:
+                break
+            out.write(base64.b64encode(chunk).decode("ascii"))
+    return out.getvalue()
+
+
+def b64decode_to_file(data: str, path: str) -> int:
+    """Decode a base64 string into a file chunk by chunk. Returns bytes written."""
+    written = 0
+    with open(path, "wb") as f:
+        for i in range(0, len(data), B64_TEXT_CHUNK):
+            chunk = base64.b64decode(data[i:i + B64_TEXT_CHUNK])
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+# ------------------------------------------------------------------------------
+# Presigned URL streaming (used on both sides)
+# ------------------------------------------------------------------------------
+def download_url_to_file(url: str, path: str, timeout: tuple = (10, 300)) -> int:
+    """Stream a URL to disk. Returns bytes written."""
+    written = 0
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(STREAM_CHUNK):
+                f.write(chunk)
+                written += len(chunk)
+    return written
+
+
+def upload_file_to_url(path: str, url: str, content_type: str = "application/octet-stream",
+                       timeout: tuple = (10, 600)):
+    """Stream a file to a presigned PUT URL."""
+    with open(path, "rb") as f:
+        response = requests.put(
+            url,
+            data=f,
+            headers={
+                "Content-Type": content_type,
+                "Content-Length": str(os.path.getsize(path))
+            },
+            timeout=timeout
+        )
+    response.raise_for_status()
+
+
+# ------------------------------------------------------------------------------
+# Object store
+# ------------------------------------------------------------------------------
+class ObjectStore:
+    """S3-compatible object store used to hand files to and from RunPod."""
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None,
+                 access_key: Optional[str] = None, secret_key: Optional[str] = None,
+                 region: str = OBJECT_STORE_REGION):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise ImportError("boto3 is required for object store transfers. Install it with 'pip install boto3'.")
+
+        self.bucket = bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region,
+            # Path-style addressing keeps MinIO and other self-hosted stores working
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path"})
+        )
+
+    def key_for(self, job_id: str, name: str) -> str:
+        return f"{OBJECT_STORE_PREFIX}/{job_id}/{name}"
+
+    def upload_file(self, path: str, key: str):
+        """Multipart, streamed upload of a local file."""
+        self.client.upload_file(path, self.bucket, key)
+        TRANSFER_BYTES.labels("object_store", "out").inc(os.path.getsize(path))
+
+    def download_file(self, key: str, path: str):
+        """Streamed download of an object to a local file."""
+        self.client.download_file(self.bucket, key, path)
+        TRANSFER_BYTES.labels("object_store", "in").inc(os.path.getsize(path))
+
+    def presign_get(self, key: str, expires: int = PRESIGNED_URL_EXPIRY) -> str:
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=expires
+        )
+
+    def presign_put(self, key: str, content_type: str = "application/octet-stream",
+                    expires: int = PRESIGNED_URL_EXPIRY) -> str:
+        return self.client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type},
+            ExpiresIn=expires
+        )
+
+    def delete_prefix(self, job_id: str):
+        """Remove every object stored for a job."""
+        prefix = f"{OBJECT_STORE_PREFIX}/{job_id}/"
+        try:
+            listing = self.client.list_objects_v2(Bucket=self.bucket, Prefix=prefix)
+            objects = [{"Key": o["Key"]} for o in listing.get("Contents", [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+        except Exception as e:
+            logger.warning(f"Failed to delete stored objects for job {job_id}: {e}")
+
+
+_object_store = None
+
+
+def get_object_store() -> Optional[ObjectStore]:
+    """Return the configured object store, or None when inline transfer should be used."""
+    global _object_store
+    if not OBJECT_STORE_BUCKET:
+        return None
+    if _object_store is None:
+        _object_store = ObjectStore(
+            OBJECT_STORE_BUCKET,
+            endpoint_url=OBJECT_STORE_ENDPOINT_URL,
+            access_key=OBJECT_STORE_ACCESS_KEY,
+            secret_key=OBJECT_STORE_SECRET_KEY
+        )
+    return _object_store
+
+
+# ------------------------------------------------------------------------------
+# Handler-side helpers
+# ------------------------------------------------------------------------------
+def fetch_job_input_file(job_input: dict, kind: str, destination_dir: str) -> str:
+    """
+    Materialize the `image` or `audio` input of a RunPod job on local disk.
+    Accepts either a `<kind>_url` reference or inline `<kind>_base64` data.
+    """
+    path = os.path.join(destination_dir, os.path.basename(job_input[f"{kind}_filename"]))
+    if job_input.get(f"{kind}_url"):
+        download_url_to_file(job_input[f"{kind}_url"], path)
+    elif job_input.get(f"{kind}_base64"):
+        b64decode_to_file(job_input[f"{kind}_base64"], path)
+    else:
+        raise ValueError(f"Job input has neither {kind}_url nor {kind}_base64")
+    return path
+
+
+def deliver_output_file(job_input: dict, output_path: str) -> dict:
+    """
+    Return the rendered video to the caller: upload it to the presigned URL when
+    one was provided, otherwise fall back to inline base64.
+    """
+    if job_input.get("output_upload_url"):
+        upload_file_to_url(output_path, job_input["output_upload_url"], content_type="video/mp4")
+        return {"video_key": job_input.get("output_key")}
+    return {"video_base64": b64encode_file(output_path)}
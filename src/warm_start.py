@@ -0,0 +1,100 @@
+"""
+Warm start for RunPod handlers.
+
+`warm_up()` is meant to run once at handler import, before the first job is
+accepted: it imports the rendering core (without the web app in main.py),
+resolves and opens the caption font, and checks that ffmpeg can encode what
+render_video_from_plan writes. Each job then reports whether it paid for
+initialization (cold) or found the process ready (warm).
+"""
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_ENCODERS = ("libx264", "aac")
+# Informational only: reported so GPU images without NVENC are easy to spot
+OPTIONAL_ENCODERS = ("h264_nvenc",)
+PRELOAD_FONT_SIZES = (45,)
+
+_state = {
+    "ready": False,
+    "error": None,
+    "init_seconds": None,
+    "stages": {},
+    "encoders": {},
+    "font": None,
+    "jobs_started": 0,
+}
+
+
+def warm_up(process_started: Optional[float] = None, font_sizes=PRELOAD_FONT_SIZES) -> dict:
+    """
+    Run the initialization phase once and return its timings.
+    `process_started` is a time.perf_counter() value taken as early as possible
+    in the handler, so interpreter and import time count towards the cold start.
+    """
+    if _state["ready"] or _state["error"]:
+        return _state
+
+    started = time.perf_counter()
+    stages = _state["stages"]
+    try:
+        t = time.perf_counter()
+        import rendering.plan  # noqa: F401
+        from moviepy.video.VideoClip import ImageClip, TextClip  # noqa: F401
+        from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip  # noqa: F401
+        from moviepy.audio.io.AudioFileClip import AudioFileClip  # noqa: F401
+        stages["imports"] = round(time.perf_counter() - t, 3)
+
+        t = time.perf_counter()
+        from rendering.media import get_available_font, preload_font_faces
+        _state["font"] = get_available_font()
+        preload_font_faces(font_sizes)
+        # Draw one caption so the PIL text path is warm too
+        TextClip(text="warm up", font=_state["font"], font_size=font_sizes[0],
+                 size=(200, 60), method="caption").close()
+        stages["fonts"] = round(time.perf_counter() - t, 3)
+
+        t = time.perf_counter()
+        from rendering.media import probe_encoders
+        available = probe_encoders()
+        _state["encoders"] = {name: name in available for name in REQUIRED_ENCODERS + OPTIONAL_ENCODERS}
+        missing = [name for name in REQUIRED_ENCODERS if name not in available]
+        if missing:
+            raise RuntimeError(f"ffmpeg is missing required encoders: {', '.join(missing)}")
+        stages["encoder_probe"] = round(time.perf_counter() - t, 3)
+
+        _state["ready"] = True
+        logger.info(f"🔥 Warm start complete in {time.perf_counter() - started:.2f}s: {stages}, "
+                    f"encoders {_state['encoders']}, font {_state['font']}")
+    except Exception as e:
+        _state["error"] = str(e)
+        logger.error(f"❌ Warm start failed: {e}")
+    finally:
+        origin = process_started if process_started is not None else started
+        _state["init_seconds"] = round(time.perf_counter() - origin, 3)
+
+    return _state
+
+
+def warm_up_error() -> Optional[str]:
+    return _state["error"]
+
+
+def job_timing(job_started: float) -> dict:
+    """
+    Timing block for a job's output. The first job a process handles is the
+    cold one: it was waiting on (or queued behind) initialization.
+    """
+    _state["jobs_started"] += 1
+    cold = _state["jobs_started"] == 1
+    timing = {
+        "cold_start": cold,
+        "job_seconds": round(time.perf_counter() - job_started, 3),
+    }
+    if cold:
+        timing["init_seconds"] = _state["init_seconds"]
+        timing["init_stages"] = dict(_state["stages"])
+    return timing
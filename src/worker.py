@@ -2,26 +2,27 @@ import os
 import json
 import logging
 import time
+import threading
 import tempfile
-import base64
 from datetime import datetime
 from typing import Optional
 import redis
-import requests
 from sqlalchemy.orm import Session
 
 # Import the original video processing logic
-from main import (
-    transcribe_and_align_lyrics, optimize_subtitles_for_timing,
-    parse_time, seconds_to_srt_timestamp, get_available_font,
-    load_audio_with_fallback, preprocess_lyrics, align_lyrics_with_scribe
-)
+from rendering.media import probe_audio_duration
+from rendering.plan import build_render_plan, render_video_from_plan, window_render_plan
+from rendering.mux import render_soft_subtitled_video
+from rendering.artifacts import load_plan, save_plan, normalized_background, encoded_audio
+from rendering.stages import job_timings, stage
+from rendering.profiling import wants_profile, profiled_job
+from rendering.metrics import JOB_SECONDS, JOBS, WORKER_BUSY, WORKER_BUSY_SECONDS, start_exporter
 from models import VideoJob, JobStatus, SessionLocal, get_db, create_tables
-import webvtt
-from moviepy.video.io.VideoFileClip import VideoFileClip
-from moviepy.video.VideoClip import ImageClip, TextClip
-from moviepy.audio.io.AudioFileClip import AudioFileClip
-from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
+from runpod_dispatcher import (
+    RunPodClient, build_runpod_input, save_runpod_output, discard_runpod_objects, next_poll_interval,
+    RUNPOD_JOB_TIMEOUT, TERMINAL_STATUSES
+)
+from routing import RoutingPolicy, ROUTING_MODE, ROUTING_REMOTE_QUEUE
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -45,10 +46,15 @@ class VideoProcessor:
         self.use_runpod = bool(self.runpod_api_key and self.runpod_endpoint_id)
         
         if self.use_runpod:
-            logger.info(f"🚀 RunPod GPU acceleration enabled (endpoint: {self.runpod_endpoint_id})")
+            logger.info(f"🚀 RunPod GPU acceleration enabled (endpoint: {self.runpod_endpoint_id}, routing: {ROUTING_MODE})")
         else:
             logger.info("💻 Using local CPU processing")
         
+        self.router = RoutingPolicy(redis_client, remote_available=self.use_runpod)
+        self.busy = False
+        # Stage timings of the last local render (see rendering.stages)
+        self.last_timings = None
+        
     def update_job_progress(self, job_id: str, status: JobStatus, progress: int = 0, error_message: str = None):
         """Update job status and progress in database."""
         db = SessionLocal()
@@ -76,323 +82,209 @@ class VideoProcessor:
         finally:
             db.close()
     
-    def process_video_runpod(self, job_data: dict) -> bool:
-        """Process video job using RunPod GPU acceleration."""
+    def process_video_runpod(self, job_data: dict, final_attempt: bool = True) -> bool:
+        """
+        Process video job using RunPod GPU acceleration.
+        With final_attempt=False a failure is left for the caller to handle
+        instead of marking the job as failed.
+        """
         job_id = job_data["job_id"]
         
         try:
             logger.info(f"🚀 Processing job {job_id} with RunPod GPU")
             self.update_job_progress(job_id, JobStatus.PROCESSING, 10)
             
-            # Encode files as base64
-            with open(job_data["image_path"], "rb") as f:
-                image_base64 = base64.b64encode(f.read()).decode()
-            
-            with open(job_data["audio_path"], "rb") as f:
-                audio_base64 = base64.b64encode(f.read()).decode()
-            
-            # Prepare RunPod job input
-            runpod_input = {
-                "job_id": job_id,
-                "image_base64": image_base64,
-                "audio_base64": audio_base64,
-                "image_filename": os.path.basename(job_data["image_path"]),
-                "audio_filename": os.path.basename(job_data["audio_path"]),
-                "lyrics": job_data["lyrics"],
-                "language": job_data.get("language", "en"),
-                "font_size": job_data.get("font_size", 45),
-                "font_color": job_data.get("font_color", "yellow"),
-                "words_per_group": job_data.get("words_per_group", 3),
-                "timing_offset": job_data.get("timing_offset", 0.0),
-                "min_duration": job_data.get("min_duration", 1.0),
-                "alignment_mode": job_data.get("alignment_mode", "auto"),
-                "debug_mode": job_data.get("debug_mode", False)
-            }
-            
-            self.update_job_progress(job_id, JobStatus.PROCESSING, 30)
-            
-            # Submit to RunPod
-            headers = {
-                "Authorization": f"Bearer {self.runpod_api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            url = f"https://api.runpod.ai/v2/{self.runpod_endpoint_id}/runsync"
-            logger.info(f"Submitting to RunPod: {url}")
-            
-            response = requests.post(
-                url,
-                headers=headers,
-                json={"input": runpod_input},
-                timeout=900  # 15 minute timeout
+            # STT and alignment run here; RunPod only composites and encodes
+            stored = load_plan(job_id)
+            job_data["render_plan"] = build_render_plan(
+                job_data, job_data.get("audio_duration"),
+                alignment=stored.get("alignment") if stored else None
             )
+            save_plan(job_id, job_data["render_plan"])
+            self.update_job_progress(job_id, JobStatus.PROCESSING, 20)
             
-            if response.status_code != 200:
-                raise Exception(f"RunPod API error: {response.status_code} - {response.text}")
+            runpod_input = build_runpod_input(job_data)
             
-            result = response.json()
+            self.update_job_progress(job_id, JobStatus.PROCESSING, 30)
             
-            # Handle IN_PROGRESS status - poll for completion
-            if result.get('status') == 'IN_PROGRESS':
-                job_id_runpod = result.get('id')
-                logger.info(f"RunPod job {job_id_runpod} in progress, polling for completion...")
+            # Submit to the async /run endpoint and poll with an adaptive interval
+            client = RunPodClient(self.runpod_api_key, self.runpod_endpoint_id)
+            runpod_job_id = client.submit(runpod_input)
+            logger.info(f"Submitted job {job_id} to RunPod as {runpod_job_id}")
+            
+            started = time.monotonic()
+            last_status = None
+            attempt = 0
+            while True:
+                elapsed = time.monotonic() - started
+                if elapsed > RUNPOD_JOB_TIMEOUT:
+                    client.cancel(runpod_job_id)
+                    raise Exception(f"RunPod job timed out after {RUNPOD_JOB_TIMEOUT:.0f}s")
                 
-                # Poll for completion
-                poll_url = f"https://api.runpod.ai/v2/{self.runpod_endpoint_id}/status/{job_id_runpod}"
-                max_polls = 60  # 10 minutes max (10 second intervals)
+                time.sleep(next_poll_interval(attempt))
+                result = client.status(runpod_job_id)
+                status = result.get('status')
                 
-                for poll_count in range(max_polls):
-                    time.sleep(10)  # Wait 10 seconds between polls
-                    
-                    poll_response = requests.get(poll_url, headers=headers)
-                    if poll_response.status_code == 200:
-                        poll_result = poll_response.json()
-                        
-                        if poll_result.get('status') == 'COMPLETED':
-                            result = poll_result
-                            break
-                        elif poll_result.get('status') == 'FAILED':
-                            raise Exception(f"RunPod job failed during polling: {poll_result}")
-                        
-                        # Update progress during polling
-                        progress = 50 + (poll_count * 30 // max_polls)  # 50-80% during polling
-                        self.update_job_progress(job_id, JobStatus.PROCESSING, progress)
-                    
-                    logger.info(f"Polling RunPod job {job_id_runpod}... ({poll_count + 1}/{max_polls})")
+                if status == 'COMPLETED':
+                    break
+                if status in TERMINAL_STATUSES:
+                    raise Exception(f"RunPod job {status.lower()}: {result.get('error') or result}")
                 
-                if result.get('status') != 'COMPLETED':
-                    raise Exception(f"RunPod job timed out or failed: {result}")
-            
-            elif result.get('status') != 'COMPLETED' or not result.get('output'):
-                raise Exception(f"RunPod job failed: {result}")
-            
-            output = result['output']
-            
-            if output.get('status') != 'completed':
-                error_msg = output.get('error', 'Unknown RunPod error')
-                raise Exception(f"RunPod processing failed: {error_msg}")
+                # Restart the fast cadence when a queued job starts running
+                if status != last_status:
+                    attempt = 0
+                    last_status = status
+                else:
+                    attempt += 1
+                
+                progress = 50 + int(min(elapsed / RUNPOD_JOB_TIMEOUT, 1.0) * 30)  # 50-80% while running
+                self.update_job_progress(job_id, JobStatus.PROCESSING, progress)
             
             self.update_job_progress(job_id, JobStatus.PROCESSING, 90)
             
-            # Decode and save video
-            if not output.get('video_base64'):
-                raise Exception("No video data returned from RunPod")
-            
-            video_data = base64.b64decode(output['video_base64'])
-            output_filename = f"{job_id}.mp4"
-            output_path = os.path.join(OUTPUT_DIR, output_filename)
-            
-            with open(output_path, "wb") as f:
-                f.write(video_data)
+            output_filename = save_runpod_output(job_id, result.get('output') or {})
             
-            # Update job record with output filename
-            db = SessionLocal()
-            try:
-                job = db.query(VideoJob).filter(VideoJob.id == job_id).first()
-                if job:
-                    job.output_filename = output_filename
-                    db.commit()
-                    logger.info(f"Updated job {job_id} with output filename: {output_filename}")
-            finally:
-                db.close()
-            
-            logger.info(f"✅ RunPod job {job_id} completed: {output_path}")
+            logger.info(f"✅ RunPod job {job_id} completed: {os.path.join(OUTPUT_DIR, output_filename)}")
             self.update_job_progress(job_id, JobStatus.COMPLETED, 100)
             return True
             
         except Exception as e:
             logger.error(f"❌ RunPod job {job_id} failed: {e}")
-            self.update_job_progress(job_id, JobStatus.FAILED, 0, str(e))
+            discard_runpod_objects(job_id)
+            if final_attempt:
+                self.update_job_progress(job_id, JobStatus.FAILED, 0, str(e))
             return False
     
     def process_video_job(self, job_data: dict) -> bool:
-        """Process a single video job (with GPU acceleration if available)."""
+        """
+        Process a single video job, routing it to RunPod or the local CPU per job.
+        Remote failures fall back to local rendering. Jobs that asked for a
+        profile, or were sampled for one, run under the profiler
+        (see rendering.profiling).
+        """
+        if not wants_profile(job_data):
+            return self._process_video_job(job_data)
+        
+        job_data["profile"] = True
+        with profiled_job(job_data["job_id"], job_data.get("profile_dir")) as profiler:
+            try:
+                return self._process_video_job(job_data)
+            finally:
+                profiler.timings = self.last_timings
+    
+    def _process_video_job(self, job_data: dict) -> bool:
         job_id = job_data["job_id"]
         
-        # Use RunPod if available, otherwise fall back to local processing
-        if self.use_runpod:
-            return self.process_video_runpod(job_data)
+        audio_duration = job_data.get("audio_duration")
+        if not audio_duration:
+            with stage("probe"):
+                audio_duration = probe_audio_duration(job_data["audio_path"])
+        target = self.router.decide(job_data, audio_duration)
         
+        if target == "runpod":
+            if self.router.dispatcher_available():
+                # A dispatcher keeps many remote jobs in flight; don't block this slot on one
+                job_data["audio_duration"] = audio_duration
+                redis_client.lpush(ROUTING_REMOTE_QUEUE, json.dumps(job_data))
+                logger.info(f"Handed job {job_id} to the RunPod dispatcher")
+                return True
+            
+            started = time.monotonic()
+            if self.process_video_runpod(job_data, final_attempt=False):
+                elapsed = time.monotonic() - started
+                JOB_SECONDS.labels("runpod").observe(elapsed)
+                JOBS.labels("runpod", "completed").inc()
+                if audio_duration and not job_data.get("profile"):
+                    self.router.record_latency("runpod", audio_duration, elapsed)
+                return True
+            
+            JOBS.labels("runpod", "failed").inc()
+            self.router.record_remote_failure()
+            logger.warning(f"⚠️ RunPod failed for job {job_id}, falling back to local processing")
+        
+        self.busy = True
+        WORKER_BUSY.set(1)
+        started = time.monotonic()
         try:
-            logger.info(f"💻 Processing job {job_id} locally")
-            self.update_job_progress(job_id, JobStatus.PROCESSING, 10)
-            
-            # Extract parameters
-            image_path = job_data["image_path"]
-            audio_path = job_data["audio_path"]
-            lyrics = job_data["lyrics"]
-            language = job_data.get("language")
-            font_size = job_data.get("font_size", 45)
-            font_color = job_data.get("font_color", "yellow")
-            words_per_group = job_data.get("words_per_group", 3)
-            timing_offset = job_data.get("timing_offset", 0.0)
-            min_duration = job_data.get("min_duration", 1.0)
-            alignment_mode = job_data.get("alignment_mode", "auto")
-            debug_mode = job_data.get("debug_mode", False)
-            
-            # Validate input files exist
-            if not os.path.exists(image_path):
-                raise FileNotFoundError(f"Image file not found: {image_path}")
-            if not os.path.exists(audio_path):
-                raise FileNotFoundError(f"Audio file not found: {audio_path}")
-            
-            self.update_job_progress(job_id, JobStatus.PROCESSING, 20)
-            
-            # Load audio to get duration
-            logger.info("Loading audio file...")
-            audio_clip, duration = load_audio_with_fallback(audio_path)
-            logger.info(f"Audio duration: {duration:.2f} seconds")
-            
-            self.update_job_progress(job_id, JobStatus.PROCESSING, 30)
-            
-            # Create background image clip
-            logger.info("Creating background image clip...")
-            bg_clip = ImageClip(image_path).with_duration(duration)
-            
-            self.update_job_progress(job_id, JobStatus.PROCESSING, 40)
-            
-            # Process lyrics and create subtitles
-            logger.info("Processing lyrics and creating subtitles...")
-            
-            if alignment_mode == "even":
-                # Use even distribution
-                temp_audio_clip, audio_duration = load_audio_with_fallback(audio_path)
-                temp_audio_clip.close()
-                
-                lyrics_lines = preprocess_lyrics(lyrics)
-                aligned_segments = align_lyrics_with_scribe(lyrics_lines, audio_duration)
-                
-                # Convert to WebVTT
-                vtt = webvtt.WebVTT()
-                for s in aligned_segments:
-                    start_str = seconds_to_srt_timestamp(s["start"])
-                    end_str = seconds_to_srt_timestamp(s["end"])
-                    vtt.captions.append(webvtt.Caption(start_str, end_str, s["text"]))
-            else:
-                # Use automatic or ElevenLabs alignment
-                vtt = transcribe_and_align_lyrics(
-                    audio_path,
-                    lyrics,
-                    language=language,
-                    alignment_mode=alignment_mode,
-                    words_per_group=words_per_group
+            success = self.process_video_local(job_data)
+        finally:
+            self.busy = False
+            WORKER_BUSY.set(0)
+            elapsed = time.monotonic() - started
+            WORKER_BUSY_SECONDS.inc(elapsed)
+        JOB_SECONDS.labels("local").observe(elapsed)
+        JOBS.labels("local", "completed" if success else "failed").inc()
+        
+        # Previews, soft-subtitle and profiled renders would skew the full-render latency model
+        if (success and audio_duration and not job_data.get("preview") and not job_data.get("profile")
+                and job_data.get("output_mode") != "soft"):
+            self.router.record_latency("local", audio_duration, elapsed)
+        return success
+    
+    def _render_local(self, job_data: dict) -> str:
+        """Artifacts, plan and render of a local job; returns the output file name."""
+        job_id = job_data["job_id"]
+        logger.info(f"💻 Processing job {job_id} locally")
+        self.update_job_progress(job_id, JobStatus.PROCESSING, 10)
+        
+        image_path = job_data["image_path"]
+        audio_path = job_data["audio_path"]
+        
+        # Re-renders reuse the artifacts of the job they restyle; the first
+        # render of a job stores them
+        source_id = job_data.get("source_job_id")
+        artifact_id = source_id or job_id
+        with stage("artifacts"):
+            background = normalized_background(artifact_id, image_path)
+            audio_track = encoded_audio(artifact_id, audio_path)
+        if not os.path.exists(audio_path):
+            # Original upload cleaned up; realign from the stored track if needed
+            audio_path = audio_track
+        
+        self.update_job_progress(job_id, JobStatus.PROCESSING, 20)
+        
+        # Transcribe, align and optimize captions (skipped when a plan was
+        # provided, or when the stored alignment still matches)
+        with stage("plan"):
+            plan = job_data.get("render_plan")
+            if not plan:
+                stored = load_plan(job_id) or (load_plan(source_id) if source_id else None)
+                plan = build_render_plan(
+                    {**job_data, "audio_path": audio_path},
+                    stored["duration"] if stored else job_data.get("audio_duration"),
+                    alignment=stored.get("alignment") if stored else None
                 )
-            
-            logger.info(f"Generated {len(vtt.captions)} subtitle captions")
-            self.update_job_progress(job_id, JobStatus.PROCESSING, 60)
-            
-            # Optimize subtitles
-            logger.info("Optimizing subtitles...")
-            optimized = optimize_subtitles_for_timing(vtt.captions)
-            
-            # Apply minimum duration constraint
-            for i in range(len(optimized)):
-                start_obj = parse_time(optimized[i].start)
-                end_obj = parse_time(optimized[i].end)
-                
-                start_s = (start_obj.hour * 3600 + start_obj.minute * 60 + 
-                          start_obj.second + start_obj.microsecond / 1e6)
-                end_s = (end_obj.hour * 3600 + end_obj.minute * 60 + 
-                        end_obj.second + end_obj.microsecond / 1e6)
-                
-                if end_s - start_s < min_duration:
-                    end_s = start_s + min_duration
-                    optimized[i].end = seconds_to_srt_timestamp(end_s)
-                
-                # Fix overlaps
-                if i < len(optimized) - 1:
-                    next_start_obj = parse_time(optimized[i+1].start)
-                    next_start_s = (next_start_obj.hour * 3600 + next_start_obj.minute * 60 + 
-                                   next_start_obj.second + next_start_obj.microsecond / 1e6)
-                    
-                    if end_s > next_start_s:
-                        if next_start_s - start_s >= min_duration:
-                            optimized[i].end = seconds_to_srt_timestamp(next_start_s)
-                        else:
-                            optimized[i+1].start = seconds_to_srt_timestamp(end_s)
-            
-            self.update_job_progress(job_id, JobStatus.PROCESSING, 70)
-            
-            # Create subtitle text clips
-            logger.info("Creating subtitle text clips...")
-            subtitle_clips = []
-            
-            for cap in optimized:
-                start_obj = parse_time(cap.start)
-                end_obj = parse_time(cap.end)
-                if not start_obj or not end_obj:
-                    continue
-                
-                start_s = (start_obj.hour * 3600 + start_obj.minute * 60 + 
-                          start_obj.second + start_obj.microsecond / 1e6)
-                end_s = (end_obj.hour * 3600 + end_obj.minute * 60 + 
-                        end_obj.second + end_obj.microsecond / 1e6)
-                
-                # Apply timing offset
-                start_s += timing_offset
-                end_s += timing_offset
-                
-                start_s = max(0, start_s)
-                end_s = min(duration, end_s)
-                
-                sub_duration = end_s - start_s
-                if sub_duration <= 0:
-                    continue
-                
-                # Split into word groups
-                words = cap.text.split()
-                word_groups = []
-                
-                for i in range(0, len(words), words_per_group):
-                    group = words[i:min(i+words_per_group, len(words))]
-                    word_groups.append(" ".join(group))
-                
-                if word_groups:
-                    time_per_group = sub_duration / len(word_groups)
-                    
-                    for i, group_text in enumerate(word_groups):
-                        group_start = start_s + (i * time_per_group)
-                        
-                        if debug_mode:
-                            group_text = f"[{group_start:.1f}s] {group_text}"
-                        
-                        txt_clip = TextClip(
-                            text=group_text,
-                            font=get_available_font(),
-                            font_size=font_size,
-                            color=font_color,
-                            bg_color=(0, 0, 0, 120),
-                            size=(700, 100),
-                            stroke_color='black',
-                            stroke_width=2,
-                            method='caption'
-                        ).with_duration(time_per_group).with_start(group_start).with_position(("center", 0.8), relative=True)
-                        
-                        subtitle_clips.append(txt_clip)
-            
-            logger.info(f"Created {len(subtitle_clips)} text clips")
-            self.update_job_progress(job_id, JobStatus.PROCESSING, 80)
-            
-            # Combine everything
-            logger.info("Compositing final video...")
-            final_clip = CompositeVideoClip([bg_clip] + subtitle_clips)
-            final_clip.audio = audio_clip
-            
-            self.update_job_progress(job_id, JobStatus.PROCESSING, 90)
-            
-            # Write output video
-            output_filename = f"output_{job_id}.mp4"
-            output_path = os.path.join(OUTPUT_DIR, output_filename)
-            
-            logger.info(f"Writing video to {output_path}...")
-            final_clip.write_videofile(
-                output_path,
-                fps=25,
-                codec="libx264",
-                audio_codec="aac",
-                temp_audiofile=os.path.join(OUTPUT_DIR, f"temp-audio_{job_id}.m4a"),
-                remove_temp=True
-            )
+            save_plan(job_id, plan)
+        logger.info(f"Render plan has {len(plan['cues'])} captions for {plan['duration']:.2f}s of audio")
+        
+        preview = job_data.get("preview", False)
+        if preview and (job_data.get("preview_start") is not None or job_data.get("preview_end") is not None):
+            # Window the full-track alignment, so the draft matches the final render
+            plan = window_render_plan(plan, job_data.get("preview_start"), job_data.get("preview_end"))
+        
+        self.update_job_progress(job_id, JobStatus.PROCESSING, 70)
+        
+        # Composite and encode
+        output_filename = f"{'preview' if preview else 'output'}_{job_id}.mp4"
+        output_path = os.path.join(OUTPUT_DIR, output_filename)
+        with stage("render"):
+            if job_data.get("output_mode") == "soft":
+                render_soft_subtitled_video(plan, background, audio_track, output_path, preview=preview)
+            else:
+                render_video_from_plan(plan, background, audio_track, output_path, preview=preview,
+                                       audio_track=audio_track)
+        return output_filename
+    
+    def process_video_local(self, job_data: dict) -> bool:
+        """Render a video job on this machine."""
+        job_id = job_data["job_id"]
+        self.last_timings = None
+        
+        try:
+            with job_timings() as timings:
+                output_filename = self._render_local(job_data)
+            self.last_timings = timings.as_dict()
+            logger.info(f"⏱️ Job {job_id} stages: {timings.summary()}")
             
             # Update job as completed
             db = SessionLocal()
@@ -406,16 +298,6 @@ class VideoProcessor:
             
             self.update_job_progress(job_id, JobStatus.COMPLETED, 100)
             
-            # Cleanup clips
-            try:
-                audio_clip.close()
-                final_clip.close()
-                bg_clip.close()
-                for clip in subtitle_clips:
-                    clip.close()
-            except Exception:
-                pass
-            
             logger.info(f"✅ Job {job_id} completed successfully")
             return True
             
@@ -435,6 +317,14 @@ def run_worker():
     
     processor = VideoProcessor()
     logger.info(f"Starting worker {processor.worker_id}")
+    start_exporter()
+    
+    # Advertise this worker's slot to the routing policy
+    def heartbeat():
+        while True:
+            processor.router.heartbeat(processor.worker_id, processor.busy)
+            time.sleep(20)
+    threading.Thread(target=heartbeat, daemon=True).start()
     
     while True:
         try:
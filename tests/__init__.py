@@ -0,0 +1,11 @@
+"""
+Behaviour tests for the rendering package and the routing policy.
+
+Plain unittest, no services needed. From the repository root:
+    python -m unittest discover -s tests -t .      (or: python -m pytest tests)
+"""
+import os
+import sys
+
+# The application modules import each other from src/, as the entry points run them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,80 @@
+import os
+import wave
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from rendering import cache, fingerprint, pcm, stt
+from rendering.fingerprint import (FP_HOP, FP_SAMPLE_RATE, Fingerprint, find_matches, has_indexed_tracks,
+                                   index_fingerprint, landmark_hashes, spectral_peaks)
+
+
+def melody(seconds, seed=7):
+    """A few random tones every quarter second over quiet noise: plenty of spectral peaks."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(FP_SAMPLE_RATE // 4) / FP_SAMPLE_RATE
+    notes = [sum(np.sin(2 * np.pi * f * t) for f in rng.uniform(200, 3500, 3)) for _ in range(seconds * 4)]
+    samples = np.concatenate(notes)
+    return (samples + 0.01 * rng.standard_normal(len(samples))).astype(np.float32)
+
+
+def track_fingerprint(samples):
+    hashes, times = landmark_hashes(*spectral_peaks(samples))
+    return Fingerprint(hashes, times, len(samples) / FP_SAMPLE_RATE)
+
+
+class FingerprintIndexTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        patcher = mock.patch.object(fingerprint, "FINGERPRINT_DB", os.path.join(self.tmp, "fingerprints.db"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lookup_skipped_without_indexed_tracks(self):
+        with mock.patch.object(stt, "STT_FINGERPRINT", True), mock.patch.object(cache, "CACHE_ENABLED", True), \
+                mock.patch.object(fingerprint, "audio_fingerprint") as audio_fingerprint:
+            self.assertFalse(has_indexed_tracks())
+            self.assertIsNone(stt.reuse_transcription_by_fingerprint("song.mp3", "digest", None, "scribe_v1"))
+            # An index with no tracks in it yet
+            with fingerprint._index():
+                pass
+            self.assertFalse(has_indexed_tracks())
+            self.assertIsNone(stt.reuse_transcription_by_fingerprint("song.mp3", "digest", None, "scribe_v1"))
+        audio_fingerprint.assert_not_called()
+
+    def test_prefix_matches_and_whole_upload_must_fit(self):
+        track = melody(30)
+        index_fingerprint("original", track_fingerprint(track))
+        self.assertTrue(has_indexed_tracks())
+
+        # Only the first 10s of a copy trimmed 160 frames in are analysed
+        start = 160 * FP_HOP
+        query = track_fingerprint(track[start:start + 10 * FP_SAMPLE_RATE])
+        trimmed_length = (len(track) - start) / FP_SAMPLE_RATE
+        matches = find_matches(query, duration=trimmed_length)
+        self.assertEqual([m.digest for m in matches], ["original"])
+        self.assertAlmostEqual(matches[0].offset, start / FP_SAMPLE_RATE)
+
+        # The same start, but running well past the end of the original
+        self.assertEqual(find_matches(query, duration=trimmed_length + 10), [])
+
+
+class DecodedPrefixTests(unittest.TestCase):
+    def test_decodes_only_the_prefix(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(pcm, "PCM_CACHE_DIR", tmp):
+            path = os.path.join(tmp, "tone.wav")
+            tone = (np.sin(np.arange(10 * FP_SAMPLE_RATE) * 0.1) * 8000).astype(np.int16)
+            with wave.open(path, "wb") as out:
+                out.setnchannels(1)
+                out.setsampwidth(2)
+                out.setframerate(FP_SAMPLE_RATE)
+                out.writeframes(tone.tobytes())
+
+            samples = pcm.decoded_pcm_prefix(path, FP_SAMPLE_RATE, 2.0)
+            self.assertAlmostEqual(len(samples), 2 * FP_SAMPLE_RATE, delta=FP_HOP)
+            # Nothing is left in the scratch cache
+            self.assertEqual(os.listdir(tmp), ["tone.wav"])
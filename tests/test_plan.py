@@ -0,0 +1,90 @@
+import unittest
+
+from rendering.plan import window_render_plan, check_preview_window, display_cues, apply_min_duration
+
+
+def make_plan(cues, duration=20.0, timing_offset=0.0, words_per_group=2):
+    return {"duration": duration, "cues": cues,
+            "style": {"words_per_group": words_per_group, "timing_offset": timing_offset}}
+
+
+class WindowRenderPlanTests(unittest.TestCase):
+    def test_keeps_overlapping_cues_shifted_to_the_window(self):
+        plan = make_plan([
+            {"start": 1.0, "end": 4.0, "text": "before"},
+            {"start": 4.0, "end": 6.0, "text": "straddles"},
+            {"start": 8.0, "end": 9.0, "text": "inside"},
+            {"start": 12.0, "end": 13.0, "text": "after"},
+        ])
+        windowed = window_render_plan(plan, 5.0, 10.0)
+        self.assertEqual(windowed["duration"], 5.0)
+        self.assertEqual(windowed["window"], {"start": 5.0, "end": 10.0})
+        self.assertEqual([(c["text"], c["start"], c["end"]) for c in windowed["cues"]],
+                         [("straddles", -1.0, 1.0), ("inside", 3.0, 4.0)])
+        # The full plan is left alone
+        self.assertEqual(len(plan["cues"]), 4)
+
+    def test_filters_on_displayed_times(self):
+        # With a +2s offset the cue at 3-4s is shown at 5-6s
+        plan = make_plan([{"start": 3.0, "end": 4.0, "text": "late"}], timing_offset=2.0)
+        self.assertEqual(len(window_render_plan(plan, 5.0, 10.0)["cues"]), 1)
+        self.assertEqual(len(window_render_plan(plan, 0.0, 5.0)["cues"]), 0)
+
+    def test_open_ends_and_clamping(self):
+        plan = make_plan([{"start": 1.0, "end": 2.0, "text": "a"}], duration=8.0)
+        self.assertEqual(window_render_plan(plan, None, None)["window"], {"start": 0.0, "end": 8.0})
+        self.assertEqual(window_render_plan(plan, 2.0, 50.0)["duration"], 6.0)
+        with self.assertRaises(ValueError):
+            window_render_plan(plan, 9.0, 12.0)
+
+    def test_word_times_move_with_their_cue(self):
+        plan = make_plan([{"start": 6.0, "end": 7.0, "text": "hi there",
+                           "words": [{"text": "hi", "start": 6.0, "end": 6.25},
+                                     {"text": "there", "start": 6.5, "end": 7.0, "interpolated": True}]}])
+        words = window_render_plan(plan, 5.0)["cues"][0]["words"]
+        self.assertEqual(words, [{"text": "hi", "start": 1.0, "end": 1.25},
+                                 {"text": "there", "start": 1.5, "end": 2.0, "interpolated": True}])
+
+
+class PreviewWindowTests(unittest.TestCase):
+    def test_checks(self):
+        check_preview_window(True, None, None)
+        check_preview_window(True, 2.0, 5.0)
+        check_preview_window(False, None, None)
+        for args in ((False, 1.0, None), (True, -1.0, None), (True, 5.0, 5.0), (True, None, 0.0)):
+            with self.subTest(args=args), self.assertRaises(ValueError):
+                check_preview_window(*args)
+
+
+class DisplayCuesTests(unittest.TestCase):
+    def test_groups_offset_and_clamping(self):
+        plan = make_plan([{"start": 0.5, "end": 3.5, "text": "one two three"},
+                          {"start": 9.0, "end": 12.0, "text": "end"}], duration=10.0, timing_offset=-1.0)
+        first, last = display_cues(plan)
+        self.assertEqual((first["start"], first["end"]), (0, 2.5))
+        self.assertEqual([(g["text"], g["start"], g["end"]) for g in first["groups"]],
+                         [("one two", 0, 1.25), ("three", 1.25, 2.5)])
+        self.assertEqual((last["start"], last["end"]), (8.0, 10.0))
+
+    def test_drops_cues_outside_the_audio(self):
+        plan = make_plan([{"start": 11.0, "end": 12.0, "text": "gone"}, {"start": 1.0, "end": 2.0, "text": "   "}],
+                         duration=10.0)
+        self.assertEqual(display_cues(plan), [])
+
+    def test_words_are_clamped_to_the_cue(self):
+        plan = make_plan([{"start": 1.0, "end": 2.0, "text": "a b",
+                           "words": [{"text": "a", "start": 0.8, "end": 1.2}, {"text": "b", "start": 1.5, "end": 2.4}]}])
+        self.assertEqual([(w["start"], w["end"]) for w in display_cues(plan)[0]["words"]], [(1.0, 1.2), (1.5, 2.0)])
+
+
+class MinDurationTests(unittest.TestCase):
+    def test_stretches_and_resolves_overlaps(self):
+        captions = [{"start": 0.0, "end": 0.2, "text": "a"}, {"start": 0.5, "end": 3.0, "text": "b"},
+                    {"start": 3.0, "end": 3.1, "text": "c"}]
+        cues = apply_min_duration(captions, 1.0)
+        self.assertEqual([(c["start"], c["end"]) for c in cues], [(0.0, 1.0), (1.0, 3.0), (3.0, 4.0)])
+        self.assertEqual(captions[0]["end"], 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import json
+import time
+import unittest
+from unittest import mock
+
+import routing
+from routing import RoutingPolicy, fit_latency_model, local_only, LOCAL_PRIOR, REMOTE_PRIOR, MIN_SAMPLES_FOR_FIT
+
+
+class FakeRedis:
+    """The reads RoutingPolicy.decide makes, over plain dicts and lists."""
+
+    def __init__(self, samples=None, workers=None, queue=(), failures=0):
+        self.samples = samples or {}
+        self.workers = workers or {}
+        self.queue = list(queue)
+        self.failures = failures
+
+    def lrange(self, key, start, end):
+        return self.samples.get(key.rsplit(":", 1)[-1], [])[start:end + 1]
+
+    def hgetall(self, key):
+        return dict(self.workers)
+
+    def hdel(self, key, field):
+        self.workers.pop(field, None)
+
+    def llen(self, key):
+        return len(self.queue)
+
+    def lindex(self, key, index):
+        return self.queue[index] if self.queue else None
+
+    def zcount(self, key, low, high):
+        return self.failures
+
+
+def worker(busy):
+    return json.dumps({"busy": busy, "ts": time.time()})
+
+
+class FitLatencyModelTests(unittest.TestCase):
+    def test_prior_until_enough_samples(self):
+        samples = [(10.0, 20.0)] * (MIN_SAMPLES_FOR_FIT - 1)
+        self.assertEqual(fit_latency_model(samples, LOCAL_PRIOR), LOCAL_PRIOR)
+
+    def test_fits_overhead_and_rtf(self):
+        samples = [(d, 4.0 + 0.5 * d) for d in (10, 20, 30, 60, 120)]
+        overhead, rtf = fit_latency_model(samples, LOCAL_PRIOR)
+        self.assertAlmostEqual(overhead, 4.0)
+        self.assertAlmostEqual(rtf, 0.5)
+
+    def test_same_length_jobs_keep_the_prior_slope(self):
+        overhead, rtf = fit_latency_model([(30.0, 60.0)] * 5, REMOTE_PRIOR)
+        self.assertEqual(rtf, REMOTE_PRIOR[1])
+        self.assertAlmostEqual(overhead, 60.0 - REMOTE_PRIOR[1] * 30.0)
+
+    def test_never_negative(self):
+        # Longer jobs finishing faster must not predict negative latencies
+        overhead, rtf = fit_latency_model([(d, 100.0 - d) for d in (10, 20, 30, 40, 50)], LOCAL_PRIOR)
+        self.assertEqual(rtf, 0.0)
+        self.assertGreaterEqual(overhead, 0.0)
+
+
+class LocalOnlyTests(unittest.TestCase):
+    def test_predicates(self):
+        for job in ({"force_local": True}, {"preview": True}, {"output_mode": "soft"},
+                    {"source_job_id": "abc"}, {"profile": True}):
+            with self.subTest(job=job):
+                self.assertTrue(local_only(job))
+        self.assertFalse(local_only({"output_mode": "burn", "preview": False, "profile": False}))
+
+
+class DecideTests(unittest.TestCase):
+    def policy(self, **redis_state):
+        return RoutingPolicy(FakeRedis(**redis_state), remote_available=True)
+
+    def test_local_only_jobs_stay_local_even_when_pinned_remote(self):
+        with mock.patch.object(routing, "ROUTING_MODE", "runpod"):
+            self.assertEqual(self.policy().decide({"preview": True}, 600.0), "local")
+            self.assertEqual(self.policy().decide({"source_job_id": "abc"}, 600.0), "local")
+            self.assertEqual(self.policy().decide({}, 600.0), "runpod")
+
+    def test_no_remote_means_local(self):
+        policy = RoutingPolicy(FakeRedis(), remote_available=False)
+        with mock.patch.object(routing, "ROUTING_MODE", "runpod"):
+            self.assertEqual(policy.decide({}, 600.0), "local")
+
+    @mock.patch.object(routing, "ROUTING_MODE", "auto")
+    def test_short_jobs_stay_local_on_a_free_slot(self):
+        policy = self.policy(workers={"w1": worker(False)})
+        self.assertEqual(policy.decide({}, routing.ROUTING_SHORT_JOB_SECONDS), "local")
+
+    @mock.patch.object(routing, "ROUTING_MODE", "auto")
+    def test_long_jobs_compare_estimates(self):
+        # Priors: local 5 + 1.5x, remote 45 + 0.3x; an idle cluster of one slot
+        idle = {"workers": {"w1": worker(False)}}
+        self.assertEqual(self.policy(**idle).decide({}, 31.0), "local")
+        self.assertEqual(self.policy(**idle).decide({}, 600.0), "runpod")
+
+    @mock.patch.object(routing, "ROUTING_MODE", "auto")
+    def test_old_backlog_with_every_slot_busy_goes_remote(self):
+        # RunPod has been slow lately, so the estimates alone say local
+        slow_remote = {"runpod": [json.dumps([d, 500.0 + d]) for d in (10, 20, 30, 40, 50)]}
+        for age, target in ((1.0, "local"), (routing.ROUTING_MAX_BACKLOG_AGE + 10, "runpod")):
+            with self.subTest(age=age):
+                queued = json.dumps({"enqueued_at": time.time() - age})
+                policy = self.policy(samples=slow_remote, workers={"w1": worker(True)}, queue=[queued])
+                self.assertEqual(policy.decide({}, 40.0, own_slot_free=False), target)
+
+    @mock.patch.object(routing, "ROUTING_MODE", "auto")
+    def test_failing_remote_means_local(self):
+        policy = self.policy(failures=routing.ROUTING_REMOTE_FAILURE_LIMIT)
+        self.assertEqual(policy.decide({}, 600.0), "local")
+
+    @mock.patch.object(routing, "ROUTING_MODE", "auto")
+    def test_redis_errors_mean_local(self):
+        policy = self.policy()
+        policy.redis.zcount = mock.Mock(side_effect=ConnectionError("down"))
+        with self.assertLogs("routing", "WARNING"):
+            self.assertEqual(policy.decide({}, 600.0), "local")
+
+    @mock.patch.object(routing, "ROUTING_MODE", "auto")
+    def test_stale_workers_are_dropped(self):
+        stale = json.dumps({"busy": True, "ts": time.time() - routing.WORKER_HEARTBEAT_TTL - 1})
+        policy = self.policy(workers={"old": stale, "w1": worker(False)})
+        self.assertEqual(policy.local_slots(), (0, 1))
+        self.assertNotIn("old", policy.redis.workers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+from rendering.stt_chunks import stitch_chunk_responses, find_split_points
+
+
+def word(text, start, end):
+    return {"text": text, "start": start, "end": end, "type": "word"}
+
+
+def spacing(start, end):
+    return {"text": " ", "start": start, "end": end, "type": "spacing"}
+
+
+def texts(response):
+    return [w["text"] for w in response["words"] if w["type"] == "word"]
+
+
+class StitchTests(unittest.TestCase):
+    def test_overlap_kept_once_by_owning_chunk(self):
+        # Chunk 0 owns [0, 10), chunk 1 owns [10, 20) and starts 2s early
+        first = {"offset": 0.0, "response": {"language_code": "en", "words": [
+            word("one", 1.0, 1.5), spacing(1.5, 2.0), word("two", 8.0, 8.5), spacing(8.5, 9.0),
+            word("three", 10.5, 11.0),
+        ]}}
+        second = {"offset": 8.0, "response": {"language_code": "fr", "words": [
+            word("two", 0.0, 0.5), spacing(0.5, 2.4), word("three", 2.5, 3.0), spacing(3.0, 3.5),
+            word("four", 4.0, 4.5),
+        ]}}
+        stitched = stitch_chunk_responses([first, second], [0.0, 10.0, 20.0])
+
+        self.assertEqual(texts(stitched), ["one", "two", "three", "four"])
+        # Words from the second chunk are shifted to track time
+        self.assertEqual([(w["start"], w["end"]) for w in stitched["words"] if w["text"] == "four"], [(12.0, 12.5)])
+        self.assertEqual(stitched["text"], "one two three four")
+        self.assertEqual(stitched["language_code"], "en")
+        self.assertEqual(stitched["chunks"], 2)
+
+    def test_boundary_word_heard_twice_is_deduplicated(self):
+        # 'hey' straddles the split: its midpoint puts it in chunk 0 from one
+        # response and in chunk 1 from the other
+        first = {"offset": 0.0, "response": {"words": [word("Hey,", 9.6, 10.2)]}}
+        second = {"offset": 8.0, "response": {"words": [word("hey", 2.0, 2.4), spacing(2.4, 2.6), word("you", 2.6, 3.0)]}}
+        stitched = stitch_chunk_responses([first, second], [0.0, 10.0, 20.0])
+        self.assertEqual(texts(stitched), ["Hey,", "you"])
+
+    def test_spacing_between_chunks_and_trimmed_at_edges(self):
+        first = {"offset": 0.0, "response": {"words": [spacing(0.0, 0.5), word("a", 0.5, 1.0)]}}
+        second = {"offset": 8.0, "response": {"words": [spacing(1.0, 2.5), word("b", 2.5, 3.0), spacing(3.0, 4.0)]}}
+        words = stitch_chunk_responses([first, second], [0.0, 10.0, 20.0])["words"]
+        self.assertEqual([w["type"] for w in words], ["word", "spacing", "word"])
+        self.assertEqual((words[1]["start"], words[1]["end"]), (1.0, 10.5))
+
+    def test_last_chunk_keeps_words_past_the_end(self):
+        only = {"offset": 0.0, "response": {"words": [word("late", 10.2, 10.6)]}}
+        self.assertEqual(texts(stitch_chunk_responses([only], [0.0, 10.0])), ["late"])
+
+    def test_characters_are_shifted(self):
+        item = {**word("hi", 0.0, 0.4), "characters": [{"text": "h", "start": 0.0, "end": 0.2}]}
+        stitched = stitch_chunk_responses([{"offset": 5.0, "response": {"words": [item]}}], [0.0, 10.0])
+        self.assertEqual(stitched["words"][0]["characters"][0]["start"], 5.0)
+
+
+class SplitPointTests(unittest.TestCase):
+    def test_short_audio_is_one_chunk(self):
+        self.assertEqual(find_split_points("missing.wav", 30.0, chunk_seconds=60.0), [0.0, 30.0])
+
+    def test_even_split_when_audio_cannot_be_analysed(self):
+        with self.assertLogs("rendering.stt_chunks", "WARNING"):
+            points = find_split_points("missing.wav", 250.0, chunk_seconds=100.0)
+        self.assertEqual(len(points), 4)
+        self.assertAlmostEqual(points[1], 250.0 / 3)
+        self.assertEqual((points[0], points[-1]), (0.0, 250.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
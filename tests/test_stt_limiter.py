@@ -0,0 +1,107 @@
+import unittest
+from unittest import mock
+
+import redis
+
+from rendering import stt_limiter
+from rendering.stt_limiter import STTLimiter, LEASES_KEY
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401  (fakeredis runs Lua scripts with it)
+except ImportError:
+    fakeredis = None
+
+
+class FakeRedis:
+    """Just enough of a client: the acquire script answers from `replies` in turn."""
+
+    def __init__(self, replies=(), error=None):
+        self.replies = list(replies)
+        self.error = error
+        self.acquired = []
+        self.released = []
+
+    def register_script(self, script):
+        def acquire(keys, args):
+            if self.error:
+                raise self.error
+            self.acquired.append(args[3])
+            return str(self.replies.pop(0))
+        return acquire
+
+    def zrem(self, key, lease_id):
+        self.released.append(lease_id)
+
+
+@mock.patch.object(stt_limiter.time, "sleep", lambda seconds: None)
+class SlotTests(unittest.TestCase):
+    def test_disabled_limiter_never_calls_redis(self):
+        client = FakeRedis(error=AssertionError("called Redis"))
+        with STTLimiter(client, rate_per_minute=0, max_concurrent=0).slot():
+            pass
+
+    def test_waits_until_a_slot_is_free_and_releases_its_lease(self):
+        client = FakeRedis(replies=[-1, 0.2, 0])
+        limiter = STTLimiter(client, rate_per_minute=60, max_concurrent=2)
+        with limiter.slot():
+            self.assertEqual(len(client.acquired), 3)
+            self.assertEqual(client.released, [])
+        # Retries keep the same lease id, which is what gets released
+        self.assertEqual(set(client.acquired), set(client.released))
+
+    def test_gives_up_after_the_wait_limit(self):
+        limiter = STTLimiter(FakeRedis(replies=[5.0] * 10), rate_per_minute=1)
+        with mock.patch.object(stt_limiter, "STT_LIMIT_WAIT_MAX", -1), self.assertRaises(ValueError):
+            with limiter.slot():
+                self.fail("got a slot")
+
+    def test_redis_down_falls_back_to_a_process_local_cap(self):
+        client = FakeRedis(error=redis.exceptions.ConnectionError("down"))
+        limiter = STTLimiter(client, rate_per_minute=60, max_concurrent=1)
+        with self.assertLogs("rendering.stt_limiter", "WARNING") as logs:
+            with limiter.slot():
+                # The only local slot is taken
+                self.assertFalse(limiter._local.acquire(blocking=False))
+            with limiter.slot():
+                pass
+        # Warned once, not per request
+        self.assertEqual(len(logs.records), 1)
+        self.assertTrue(limiter._local.acquire(blocking=False))
+        self.assertEqual(client.released, [])
+
+    def test_recovers_when_redis_is_back(self):
+        client = FakeRedis(error=redis.exceptions.ConnectionError("down"))
+        limiter = STTLimiter(client, rate_per_minute=60)
+        with self.assertLogs("rendering.stt_limiter", "WARNING"), limiter.slot():
+            pass
+        client.error, client.replies = None, [0]
+        with limiter.slot():
+            pass
+        self.assertFalse(limiter._redis_down)
+
+
+@unittest.skipIf(fakeredis is None, "needs fakeredis and lupa to run the Lua script")
+class AcquireScriptTests(unittest.TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+
+    def test_token_bucket(self):
+        limiter = STTLimiter(self.redis, rate_per_minute=60, burst=2)
+        self.assertEqual(limiter.try_acquire("a"), 0)
+        self.assertEqual(limiter.try_acquire("b"), 0)
+        wait = limiter.try_acquire("c")
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 1.0)
+
+    def test_concurrency_leases(self):
+        limiter = STTLimiter(self.redis, rate_per_minute=0, max_concurrent=1)
+        self.assertEqual(limiter.try_acquire("a"), 0)
+        self.assertEqual(limiter.try_acquire("b"), -1)
+        limiter.release("a")
+        self.assertEqual(limiter.try_acquire("b"), 0)
+        self.assertEqual(self.redis.zcard(LEASES_KEY), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import unittest
+
+from rendering.subtitles import export_subtitles, export_entries
+from rendering.words import WordTable
+
+
+def make_plan(cues, words_per_group=2, timing_offset=0.0):
+    return {"duration": 10.0, "cues": cues,
+            "style": {"words_per_group": words_per_group, "timing_offset": timing_offset,
+                      "font_size": 45, "font_color": "yellow"}}
+
+
+PLAN = make_plan([{"start": 1.0, "end": 3.0, "text": "one two three"}])
+
+
+class ExportTests(unittest.TestCase):
+    def test_entries(self):
+        self.assertEqual(export_entries(PLAN, "line"), [{"start": 1.0, "end": 3.0, "text": "one two three"}])
+        self.assertEqual([(e["text"], e["start"], e["end"]) for e in export_entries(PLAN)],
+                         [("one two", 1.0, 2.0), ("three", 2.0, 3.0)])
+
+    def test_webvtt(self):
+        self.assertEqual(export_subtitles(PLAN, "vtt", "line"), "WEBVTT\n\n00:00:01.000 --> 00:00:03.000\none two three\n")
+
+    def test_srt(self):
+        self.assertEqual(export_subtitles(PLAN, "srt"),
+                         "1\n00:00:01,000 --> 00:00:02,000\none two\n\n2\n00:00:02,000 --> 00:00:03,000\nthree\n")
+
+    def test_ass(self):
+        ass = export_subtitles(PLAN, "ass", "line")
+        self.assertIn("Style: Default,Arial,45,&H0000FFFF,", ass)
+        self.assertTrue(ass.endswith("Dialogue: 0,0:00:01.00,0:00:03.00,Default,,0,0,0,,one two three\n"))
+
+    def test_offset_is_applied(self):
+        plan = make_plan(PLAN["cues"], timing_offset=0.5)
+        self.assertEqual(export_entries(plan, "line")[0]["start"], 1.5)
+
+    def test_rejects_unknown_format_and_granularity(self):
+        with self.assertRaises(ValueError):
+            export_subtitles(PLAN, "txt")
+        with self.assertRaises(ValueError):
+            export_subtitles(PLAN, "srt", "word")
+
+
+class JsonWordTimingTests(unittest.TestCase):
+    def test_without_transcription_words_are_interpolated(self):
+        line = json.loads(export_subtitles(PLAN, "json"))["lines"][0]
+        self.assertEqual(line["words"], [
+            {"text": "one", "start": 1.0, "end": 1.5, "interpolated": True},
+            {"text": "two", "start": 1.5, "end": 2.0, "interpolated": True},
+            {"text": "three", "start": 2.0, "end": 3.0, "interpolated": True},
+        ])
+
+    def test_transcribed_word_times_are_exported(self):
+        words = [{"text": "one", "start": 1.1, "end": 1.3}, {"text": "two", "start": 1.4, "end": 1.6},
+                 {"text": "three", "start": 2.6, "end": 2.9}]
+        plan = make_plan([{**PLAN["cues"][0], "words": words}])
+        self.assertEqual(json.loads(export_subtitles(plan, "json"))["lines"][0]["words"], words)
+
+
+class CaptionWordsTests(unittest.TestCase):
+    table = WordTable([
+        {"text": "Hello", "start": 1.0, "end": 1.4, "type": "word"},
+        {"text": " ", "start": 1.4, "end": 1.5, "type": "spacing"},
+        {"text": "bright", "start": 1.5, "end": 1.9, "type": "word"},
+        {"text": "world.", "start": 2.0, "end": 2.5, "type": "word"},
+        {"text": "again", "start": 5.0, "end": 5.5, "type": "word"},
+    ])
+
+    def test_matched_words_take_scribe_times(self):
+        self.assertEqual(self.table.caption_words(0.5, 3.0, "Hello, bright world"), [
+            {"text": "Hello,", "start": 1.0, "end": 1.4},
+            {"text": "bright", "start": 1.5, "end": 1.9},
+            {"text": "world", "start": 2.0, "end": 2.5},
+        ])
+
+    def test_unmatched_words_are_spread_between_neighbours(self):
+        words = self.table.caption_words(0.5, 3.0, "Hello my world tonight")
+        self.assertEqual([(w["text"], w["start"], w["end"], w.get("interpolated", False)) for w in words], [
+            ("Hello", 1.0, 1.4, False),
+            ("my", 1.4, 2.0, True),
+            ("world", 2.0, 2.5, False),
+            ("tonight", 2.5, 3.0, True),
+        ])
+
+    def test_only_words_heard_in_the_caption_count(self):
+        # 'again' is heard at 5s, outside this caption
+        self.assertEqual(self.table.caption_words(0.5, 3.0, "again and again"), [])
+        self.assertEqual(self.table.caption_words(0.5, 3.0, ""), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setUpModule():
+    global client
+    from fastapi.testclient import TestClient
+
+    # main mounts static/ relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    client = TestClient(main.app)
+
+
+def create_video(data=None, timings=None):
+    files = {"image": ("cover.png", b"not read", "image/png"), "audio": ("song.mp3", b"not read", "audio/mpeg")}
+    if timings:
+        files["timings"] = timings
+    return client.post("/create-video", files=files, data=data or {})
+
+
+class RequestValidationTests(unittest.TestCase):
+    """Client errors on the sync API come back as 400s, not as 500s wrapping them."""
+
+    def test_malformed_timing_file(self):
+        response = create_video({"lyrics": "la la"}, ("song.json", b'[{"start": 0', "application/json"))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Invalid JSON timing file", response.json()["detail"])
+
+    def test_non_finite_timings(self):
+        response = create_video(timings=("song.json", b'[{"start": NaN, "end": 1, "text": "a"}]', "application/json"))
+        self.assertEqual(response.status_code, 400)
+
+    def test_lyrics_or_timings_required(self):
+        response = create_video({"lyrics": "  "})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Lyrics text is required", response.json()["detail"])
+
+    def test_preview_window_checks(self):
+        cases = [
+            ({"preview_start": "1"}, "require preview=true"),
+            ({"preview": "true", "preview_start": "-1"}, "preview_start must be >= 0"),
+            ({"preview": "true", "preview_start": "5", "preview_end": "5"}, "greater than preview_start"),
+        ]
+        for fields, message in cases:
+            with self.subTest(fields=fields):
+                response = create_video({"lyrics": "la la", **fields})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, response.json()["detail"])
+
+
+if __name__ == "__main__":
+    unittest.main()
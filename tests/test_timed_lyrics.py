@@ -0,0 +1,106 @@
+import json
+import unittest
+
+from rendering.timed_lyrics import (
+    TIMING_FILE_MAX_BYTES, MAX_TIMED_CUES, LRC_LAST_LINE_SECONDS,
+    parse_srt_or_vtt, parse_lrc, parse_json_timings, validate_cues, parse_timings, decode_timing_file
+)
+
+
+class ParserTests(unittest.TestCase):
+    def test_srt(self):
+        text = "1\r\n00:00:01,500 --> 00:00:03,000\r\nFirst <i>line</i>\r\nwraps\r\n\r\n2\r\n00:00:03,000 --> 00:00:04,25\r\nSecond\r\n"
+        self.assertEqual(parse_srt_or_vtt(text), [
+            {"start": 1.5, "end": 3.0, "text": "First line wraps"},
+            {"start": 3.0, "end": 4.25, "text": "Second"},
+        ])
+
+    def test_vtt_ignores_header_and_cue_settings(self):
+        text = "WEBVTT\n\nintro\n00:01.000 --> 00:02.000 align:start position:10%\n{\\an8}Hello\n\n01:00:00.000 --> 01:00:01.000\nLate\n"
+        self.assertEqual(parse_srt_or_vtt(text), [
+            {"start": 1.0, "end": 2.0, "text": "Hello"},
+            {"start": 3600.0, "end": 3601.0, "text": "Late"},
+        ])
+
+    def test_srt_invalid_timestamp(self):
+        with self.assertRaises(ValueError):
+            parse_srt_or_vtt("1\n00:00:aa --> 00:00:02\nText\n")
+
+    def test_lrc(self):
+        text = "[ar:Someone]\n[00:01.00]<00:01.00>One <00:01.50>two\n[00:03.50][00:10.00]Chorus\n[00:05.00]\n"
+        self.assertEqual(parse_lrc(text), [
+            {"start": 1.0, "end": 3.5, "text": "One two"},
+            # The empty line at 5s ends the first chorus
+            {"start": 3.5, "end": 5.0, "text": "Chorus"},
+            {"start": 10.0, "end": 10.0 + LRC_LAST_LINE_SECONDS, "text": "Chorus"},
+        ])
+
+    def test_lrc_offset_shows_lyrics_earlier(self):
+        cues = parse_lrc("[offset:+500]\n[00:00.20]A\n[00:02.00]B\n")
+        self.assertEqual([(c["start"], c["text"]) for c in cues], [(0.0, "A"), (1.5, "B")])
+
+    def test_json_list_and_wrapped(self):
+        cues = [{"start": 0, "end": "1.5", "text": "a"}]
+        expected = [{"start": 0.0, "end": 1.5, "text": "a"}]
+        self.assertEqual(parse_json_timings(json.dumps(cues)), expected)
+        self.assertEqual(parse_json_timings(json.dumps({"cues": cues})), expected)
+        self.assertEqual(parse_json_timings(json.dumps({"lines": cues, "duration": 3})), expected)
+
+    def test_json_errors(self):
+        for text in ("{", '{"words": []}', '[{"start": 0, "text": "no end"}]', '[{"start": "x", "end": 1, "text": "a"}]'):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                parse_json_timings(text)
+
+
+class ValidateCuesTests(unittest.TestCase):
+    def test_sorts_strips_and_drops_empty(self):
+        cues = [{"start": 2, "end": 3, "text": " b "}, {"start": 0, "end": 1, "text": "a"}, {"start": 1, "end": 2, "text": "  "}]
+        self.assertEqual(validate_cues(cues), [
+            {"start": 0, "end": 1, "text": "a"},
+            {"start": 2, "end": 3, "text": "b"},
+        ])
+
+    def test_rejects_bad_ranges(self):
+        for start, end in ((-1, 1), (2, 2), (3, 1)):
+            with self.subTest(start=start, end=end), self.assertRaises(ValueError):
+                validate_cues([{"start": start, "end": end, "text": "a"}])
+
+    def test_rejects_non_finite_times(self):
+        for value in ("NaN", "Infinity", "-Infinity", "1e999"):
+            for cue in ('{"start": %s, "end": 2, "text": "a"}' % value, '{"start": 0, "end": %s, "text": "a"}' % value):
+                with self.subTest(cue=cue), self.assertRaisesRegex(ValueError, "non-finite|invalid time range"):
+                    validate_cues(parse_json_timings(f"[{cue}]"))
+
+    def test_duration_drops_and_clamps(self):
+        cues = [{"start": 0, "end": 4, "text": "a"}, {"start": 9, "end": 12, "text": "b"}, {"start": 10, "end": 11, "text": "c"}]
+        self.assertEqual(validate_cues(cues, duration=10), [
+            {"start": 0, "end": 4, "text": "a"},
+            {"start": 9, "end": 10, "text": "b"},
+        ])
+        with self.assertRaises(ValueError):
+            validate_cues(cues[2:], duration=10)
+
+    def test_limits(self):
+        with self.assertRaises(ValueError):
+            validate_cues([])
+        too_many = [{"start": i, "end": i + 0.5, "text": "x"} for i in range(MAX_TIMED_CUES + 1)]
+        with self.assertRaises(ValueError):
+            validate_cues(too_many)
+
+
+class TimingFileTests(unittest.TestCase):
+    def test_format_from_extension(self):
+        self.assertEqual(parse_timings("[00:01.00]Hi\n", "song.LRC"), [{"start": 1.0, "end": 1.0 + LRC_LAST_LINE_SECONDS, "text": "Hi"}])
+        with self.assertRaises(ValueError):
+            parse_timings("", "song.txt")
+
+    def test_decode(self):
+        self.assertEqual(decode_timing_file("\ufeffWEBVTT".encode("utf-8")), "WEBVTT")
+        with self.assertRaises(ValueError):
+            decode_timing_file(b"\xff\xfe\x00")
+        with self.assertRaises(ValueError):
+            decode_timing_file(b"x" * (TIMING_FILE_MAX_BYTES + 1))
+
+
+if __name__ == "__main__":
+    unittest.main()